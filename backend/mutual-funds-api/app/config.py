@@ -14,8 +14,80 @@ API_DESCRIPTION = "API for fetching Indian mutual fund data using Yahoo Finance"
 # CORS Settings
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000").split(",")
 
+# Response Settings
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"  # gzip (or brotli, if installed) for clients that accept it
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))  # Smaller responses are sent uncompressed
+COMPRESS_THREAD_MIN_BYTES = int(os.getenv("COMPRESS_THREAD_MIN_BYTES", "65536"))  # Larger bodies are compressed on a worker thread
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # Encoded response bodies kept for reuse
+
 # Cache Settings (in seconds)
-CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))  # 5 minutes default
+CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))  # 5 minutes default, for quotes
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", "3600"))  # NAV history changes once a day
+METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", "86400"))  # Fund name, family, expense ratio
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))  # Per cache; 0 for no limit
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", "0"))  # Approximate per-cache budget; 0 for no limit
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory" per process, or "shared" to add a tier all workers share
+SHARED_CACHE_LOCAL_ENTRIES = int(os.getenv("SHARED_CACHE_LOCAL_ENTRIES", "256"))  # Per-process entries in front of the shared tier
+SHARED_CACHE_READERS = int(os.getenv("SHARED_CACHE_READERS", "2"))  # Threads reading the shared tier, apart from the fetch pool
+
+# Upstream Fetch Settings
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))  # Max concurrent Yahoo Finance calls
+UPSTREAM_MIN_INTERVAL = float(os.getenv("UPSTREAM_MIN_INTERVAL", "0.5"))  # Average seconds between Yahoo Finance calls (0 = unlimited)
+UPSTREAM_BURST = float(os.getenv("UPSTREAM_BURST", "3"))  # Calls that may go out back to back after an idle spell
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "file")  # "file" shares the limit across worker processes, "local" is per process
+FANOUT_DEADLINE = float(os.getenv("FANOUT_DEADLINE", "3.0"))  # Seconds a multi-fund request waits on upstream
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "50"))  # Symbols per bulk Yahoo Finance download
+BATCH_MAX_SYMBOLS = int(os.getenv("BATCH_MAX_SYMBOLS", "200"))  # Max symbols accepted by batch endpoints
+BULK_MAX_PORTFOLIOS = int(os.getenv("BULK_MAX_PORTFOLIOS", "10000"))  # Max portfolios per bulk valuation request
+
+# Upstream Circuit Breaker Settings
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "60"))  # Seconds of call outcomes the error rate covers
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))  # Calls in the window before the error rate counts
+BREAKER_ERROR_THRESHOLD = float(os.getenv("BREAKER_ERROR_THRESHOLD", "0.5"))  # Error rate that opens the circuit
+BREAKER_BASE_BACKOFF = float(os.getenv("BREAKER_BASE_BACKOFF", "15"))  # Seconds open after the first trip; doubles
+BREAKER_MAX_BACKOFF = float(os.getenv("BREAKER_MAX_BACKOFF", "600"))  # Longest time the circuit stays open
+
+# History Store Settings
+DATA_DIR = os.getenv("DATA_DIR", "data")  # Local directory for persistent data
+HISTORY_STORE_ENABLED = os.getenv("HISTORY_STORE_ENABLED", "true").lower() == "true"
+
+# Data Provider Settings
+DATA_PROVIDER = os.getenv("DATA_PROVIDER", "yahoo")  # "yahoo", or "offline" to serve only replayed/synthesized data
+OFFLINE_SNAPSHOT_PATH = os.getenv("OFFLINE_SNAPSHOT_PATH", "")  # NAV history replayed offline: CSV (symbol,date,nav) or a history store .sqlite3
+
+# Catalogue Settings
+CATALOGUE_PATH = os.getenv("CATALOGUE_PATH", "")  # Scheme master file (CSV/JSON); empty for the built-in funds
+CATALOGUE_RELOAD_INTERVAL = float(os.getenv("CATALOGUE_RELOAD_INTERVAL", "30"))  # Seconds between file change checks
+LISTING_ORDER_TTL = float(os.getenv("LISTING_ORDER_TTL", "60"))  # Seconds a listing ordered by cached quotes is reused
+
+# Freshness Settings
+STALE_TTL = int(os.getenv("STALE_TTL", "3600"))  # Seconds past expiry an entry may be served while refreshing
+BACKGROUND_REFRESH_ENABLED = os.getenv("BACKGROUND_REFRESH_ENABLED", "false").lower() == "true"
+BACKGROUND_REFRESH_INTERVAL = int(os.getenv("BACKGROUND_REFRESH_INTERVAL", "240"))  # Keep below CACHE_TTL
+METADATA_REFRESH_BATCH = int(os.getenv("METADATA_REFRESH_BATCH", "20"))  # Funds whose .info metadata each refresh re-fetches
+
+# Startup Settings
+WARM_START_ENABLED = os.getenv("WARM_START_ENABLED", "false").lower() == "true"  # Restore cache contents saved by the last worker; the snapshot is unpickled, so only enable with a trusted path
+WARM_START_PATH = os.getenv("WARM_START_PATH", "")  # Snapshot file; empty for DATA_DIR/warm_start.pickle
+WARM_START_INTERVAL = float(os.getenv("WARM_START_INTERVAL", "300"))  # Seconds between snapshots while running; 0 = on shutdown only
+PRELOAD_IMPORTS = os.getenv("PRELOAD_IMPORTS", "true").lower() == "true"  # Import pandas/yfinance in the background once serving
+
+# Live NAV Stream Settings
+STREAM_INTERVAL = float(os.getenv("STREAM_INTERVAL", "60"))  # Seconds between re-fetches of every subscribed fund
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))  # Open streams per worker process
+STREAM_MAX_LAG = float(os.getenv("STREAM_MAX_LAG", "300"))  # Seconds a client may leave quotes unread before it is disconnected
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))  # Seconds between keepalive comments on an idle stream
+
+# Analytics Settings
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.065"))  # Annual rate used for the Sharpe ratio
+
+# Profiling Settings
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off")  # "off", "header" (requests sending PROFILE_HEADER), or "all"
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")  # Request header asking for a profile of that request
+PROFILE_SLOW_THRESHOLD = float(os.getenv("PROFILE_SLOW_THRESHOLD", "1.0"))  # Seconds; under "all", slower requests are kept
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # Seconds between stack samples; 0 = spans only
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")  # Directory profiles are written to; empty for DATA_DIR/profiles
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))  # Recent profiles served by /debug/profiles
 
 # Server Settings
 HOST = os.getenv("HOST", "0.0.0.0")
@@ -0,0 +1,64 @@
+"""
+Lazy imports - heavy modules are imported on first use, so worker processes start serving sooner
+"""
+import importlib
+import threading
+import time
+from types import ModuleType
+from typing import Any, Dict, Optional
+
+
+class LazyModule:
+    """Stands in for a module, importing it when one of its attributes is first read"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+        self.import_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    self.import_seconds = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r}{'' if self.loaded else ' (not imported)'}>"
+
+
+_modules: Dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> Any:
+    """A module that is imported the first time it is used"""
+    module = _modules.get(name)
+    if module is None:
+        module = _modules[name] = LazyModule(name)
+    return module
+
+
+def preload() -> Dict[str, float]:
+    """Import every lazily imported module now; seconds each import took"""
+    for module in list(_modules.values()):
+        try:
+            module.load()
+        except ImportError as e:
+            print(f"Error preloading {module._name}: {e}")
+    return import_stats()
+
+
+def import_stats() -> Dict[str, Optional[float]]:
+    """Seconds each lazily imported module took to import, or None if it has not been used yet"""
+    return {name: module.import_seconds for name, module in _modules.items()}
@@ -0,0 +1,293 @@
+"""
+Metrics - Prometheus text-format counters, gauges and histograms, request middleware and stage timing
+"""
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app import profiling
+
+# Seconds; covers a cache hit (sub-millisecond) up to a slow upstream fetch
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    """A named metric with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        ...
+
+
+class Counter(Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    """Value per label set that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: Any):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Observation counts in cumulative buckets, with their sum, per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * len(self.buckets)
+                self._sums[key] = 0.0
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the duration of the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        lines = []
+        names = self.labels + ("le",)
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics and scrape-time collectors rendered together in the text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], List[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func: Callable[[], List[Metric]]):
+        """Add a function building metrics from current state each time metrics are rendered"""
+        self._collectors.append(func)
+
+    def render(self) -> str:
+        metrics = list(self._metrics)
+        for collect in self._collectors:
+            try:
+                metrics.extend(collect())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status code", ("route", "method", "status")))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("route", "method")))
+IN_FLIGHT = REGISTRY.register(Gauge("http_requests_in_flight", "HTTP requests being served"))
+UPSTREAM_CALLS = REGISTRY.register(Counter(
+    "upstream_calls_total", "Upstream data provider calls by kind and outcome (ok, refused, or error code)",
+    ("provider", "kind", "outcome")))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "upstream_call_duration_seconds", "Upstream data provider call latency by kind", ("provider", "kind")))
+RATE_LIMIT_WAIT = REGISTRY.register(Histogram(
+    "upstream_rate_limit_wait_seconds", "Time spent waiting for an upstream rate-limit token", ("priority",)))
+FALLBACK_SERVED = REGISTRY.register(Counter(
+    "fallback_served_total", "Fund quotes served from offline fallback data"))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "stage_duration_seconds", "Time spent in each stage of a fund data operation", ("operation", "stage")))
+
+_operation: ContextVar[str] = ContextVar("metrics_operation", default="other")
+
+
+@contextmanager
+def operation(name: str) -> Iterator[None]:
+    """Label the stages timed inside the with block with an operation name; the outermost one wins"""
+    if _operation.get() != "other":
+        yield
+        return
+    token = _operation.set(name)
+    try:
+        with profiling.span(name):
+            yield
+    finally:
+        _operation.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the with block as a stage of the current operation, and as a span when profiling"""
+    with STAGE_SECONDS.time(operation=_operation.get(), stage=name), profiling.span(name):
+        yield
+
+
+def error_code(error: Exception) -> str:
+    """Short label for an upstream error: its HTTP status if the message has one, else its type"""
+    match = re.search(r"\b([45]\d\d)\b", str(error))
+    return match.group(1) if match else type(error).__name__
+
+
+def upstream_kind(func: Callable[..., Any]) -> str:
+    """Kind of upstream call from the fetch method name (_fetch_info -> info)"""
+    return getattr(func, "__name__", "call").replace("_fetch_", "", 1)
+
+
+def record_upstream(provider: str, kind: str, seconds: float, error: Optional[Exception] = None):
+    """Count an upstream call and observe its latency"""
+    UPSTREAM_SECONDS.observe(seconds, provider=provider, kind=kind)
+    UPSTREAM_CALLS.inc(provider=provider, kind=kind, outcome="ok" if error is None else error_code(error))
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests, in-flight requests and latency per route template"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; label by its template to bound cardinality
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route=path, method=method)
+            REQUESTS.inc(route=path, method=method, status=status["code"])
+
+
+def cache_metrics(stats: Callable[[], Dict[str, Dict[str, Any]]]) -> Callable[[], List[Metric]]:
+    """Collector exporting cache hit/miss/eviction counters from a cache_stats() function"""
+    fields = {"hits": "hits", "misses": "misses", "stale_hits": "stale hits", "evictions": "evictions"}
+
+    def collect() -> List[Metric]:
+        current = stats()
+        metrics = []
+        for field, description in fields.items():
+            counter = Counter(f"cache_{field}_total", f"Cache {description} per cache", ("cache",))
+            for name, cache in current.items():
+                if cache.get(field) is not None:
+                    counter.inc(cache[field], cache=name)
+            metrics.append(counter)
+        entries = Gauge("cache_entries", "Entries held per cache", ("cache",))
+        for name, cache in current.items():
+            entries.set(cache.get("entries", 0), cache=name)
+        metrics.append(entries)
+        return metrics
+
+    return collect
+
+
+def breaker_metrics(stats: Callable[[], Dict[str, Any]]) -> Callable[[], List[Metric]]:
+    """Collector exporting the upstream circuit state and counters from an upstream_stats() function"""
+    states = ("closed", "half_open", "open")
+
+    def collect() -> List[Metric]:
+        current = stats()
+        state = Gauge("upstream_circuit_state", "1 for the upstream circuit's current state", ("state",))
+        for name in states:
+            state.set(1 if current["state"] == name else 0, state=name)
+        opened = Counter("upstream_circuit_opened_total", "Times the upstream circuit opened")
+        opened.inc(current["opened"])
+        return [state, opened]
+
+    return collect
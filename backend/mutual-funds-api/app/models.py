@@ -1,9 +1,9 @@
 """
 Pydantic models for API request/response
 """
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Optional, List, Union
+from datetime import date, datetime
 
 
 class MutualFundInfo(BaseModel):
@@ -68,6 +68,35 @@ class PortfolioHolding(BaseModel):
     returns_percent: Optional[float] = None
 
 
+class HoldingLot(BaseModel):
+    """One purchase of a fund"""
+    date: date
+    units: float = Field(gt=0)
+    nav: float = Field(ge=0)
+
+
+class HoldingInput(BaseModel):
+    """A holding to value: units bought at an average NAV, or its purchase lots (checked when valued)"""
+    symbol: str = Field(min_length=1)
+    units: Optional[float] = Field(None, ge=0)
+    avg_nav: Optional[float] = Field(None, ge=0)
+    purchase_date: Optional[date] = None
+    lots: Optional[List[HoldingLot]] = None
+
+
+class PortfolioInput(BaseModel):
+    """A portfolio to value in a bulk request"""
+    id: Optional[Union[str, int]] = None
+    holdings: List[HoldingInput]
+
+
+class BulkPortfolioRequest(BaseModel):
+    """Portfolios to value in one request"""
+    portfolios: List[PortfolioInput]
+    as_of: Optional[date] = None
+    include_holdings: bool = False
+
+
 class SearchResult(BaseModel):
     """Search result for mutual funds"""
     symbol: str
@@ -76,6 +105,11 @@ class SearchResult(BaseModel):
     fund_family: Optional[str] = None
 
 
+class BatchQuoteRequest(BaseModel):
+    """Symbols to quote in one batch request"""
+    symbols: List[str]
+
+
 class APIResponse(BaseModel):
     """Standard API response wrapper"""
     success: bool
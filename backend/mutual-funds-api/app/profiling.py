@@ -0,0 +1,316 @@
+"""
+Profiling - opt-in per-request span timing trees and stack sampling, kept for slow requests
+"""
+import contextvars
+import functools
+import itertools
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from app.config import (
+    DATA_DIR,
+    PROFILE_DIR,
+    PROFILE_HEADER,
+    PROFILE_KEEP,
+    PROFILE_MODE,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_SLOW_THRESHOLD,
+)
+
+# Most frequent sampled stacks kept per profile
+MAX_STACKS = 200
+# Frames kept per sampled stack, innermost last
+MAX_STACK_DEPTH = 64
+
+
+class Span:
+    """A timed section of a request, with the sections timed inside it"""
+
+    __slots__ = ("name", "start", "end", "children", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self._token = None
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        if parent is not None:
+            parent.children.append(self)
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> bool:
+        self.end = time.perf_counter()
+        _current.reset(self._token)
+        return False
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        children = [child.to_dict(origin) for child in self.children]
+        node = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1e3, 3),
+            "ms": round((end - self.start) * 1e3, 3),
+        }
+        if children:
+            node["children"] = children
+            # Time not covered by any child: Python code between spans, or waiting on the event loop
+            covered = sum(child["ms"] for child in children)
+            node["self_ms"] = round(max(0.0, node["ms"] - covered), 3)
+        return node
+
+
+class _NoSpan:
+    """Stand-in returned by span() when the current request is not being profiled"""
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+# Innermost open span of the request being profiled, or None when not profiling
+_current: ContextVar[Optional[Span]] = ContextVar("profiling_span", default=None)
+
+
+def span(name: str):
+    """Time the with block as a span of the current profile; a no-op when not profiling"""
+    if _current.get() is None:
+        return _NO_SPAN
+    return Span(name)
+
+
+def bind(func: Callable[..., Any]) -> Callable[..., Any]:
+    """func to run in another thread; carries the current profile along when profiling"""
+    if _current.get() is None:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed interval while any profile is recording.
+
+    Samples are taken process-wide, so a profile of one request also
+    sees what concurrent requests were doing; threads are named at the
+    root of each stack to tell the event loop from the fetch pool.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._recording: List[Counter] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Counter:
+        """Start recording stacks into a new counter of folded stacks"""
+        stacks: Counter = Counter()
+        with self._lock:
+            self._recording.append(stacks)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        return stacks
+
+    def stop(self, stacks: Counter):
+        with self._lock:
+            self._recording.remove(stacks)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                recording = list(self._recording)
+                if not recording:
+                    self._thread = None
+                    return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                folded = _fold(names.get(ident, str(ident)), frame)
+                for stacks in recording:
+                    stacks[folded] += 1
+
+
+def _fold(thread: str, frame: Any) -> str:
+    """thread;outer frame;...;inner frame, the folded format read by flame graph tools"""
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join([thread] + frames[::-1])
+
+
+class Profiler:
+    """Profiles requests that ask for it (or all requests) and keeps those at or over a threshold.
+
+    Kept profiles are written as JSON to a directory, if one is set, and
+    the most recent ones are held in memory for the debug endpoint. Files
+    are written by a writer thread of the profiler's own, from a queue
+    bounded at keep profiles; profiles arriving while it is full are only
+    held in memory.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        header: str,
+        threshold: float,
+        sample_interval: float,
+        directory: Optional[str],
+        keep: int,
+    ):
+        self.mode = mode
+        self.header = header.lower().encode("latin-1")
+        self.threshold = threshold
+        self.directory = directory
+        self.sampler = StackSampler(sample_interval) if sample_interval > 0 else None
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._writes: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, keep))
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        if directory and self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("header", "all")
+
+    def requested(self, scope: Dict[str, Any]) -> Optional[float]:
+        """The threshold to keep this request's profile at, or None to not profile it.
+
+        A request that sends the header is always kept; under mode "all"
+        other requests are kept when slower than the threshold.
+        """
+        for name, value in scope.get("headers", ()):
+            if name == self.header and value not in (b"", b"0", b"false"):
+                return 0.0
+        return self.threshold if self.mode == "all" else None
+
+    def new_id(self) -> str:
+        return f"{int(time.time())}-{next(self._ids)}"
+
+    def keep(self, profile: Dict[str, Any]):
+        self._recent.append(profile)
+        if not self.directory:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_profiles, name="profile-writer", daemon=True)
+                self._writer.start()
+        try:
+            self._writes.put_nowait(profile)
+        except queue.Full:
+            print(f"Profile {profile['id']} not written: {self._writes.maxsize} profiles are waiting to be written")
+
+    def flush(self):
+        """Wait until every profile kept so far has been written"""
+        self._writes.join()
+
+    def _write_profiles(self):
+        while True:
+            profile = self._writes.get()
+            route = re.sub(r"[^A-Za-z0-9]+", "-", profile["route"]).strip("-") or "root"
+            path = os.path.join(self.directory, f"{profile['id']}-{profile['method']}-{route}.json")
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(profile, f, indent=1)
+            except OSError as e:
+                print(f"Error writing profile {path}: {e}")
+            finally:
+                self._writes.task_done()
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Summaries of the kept profiles, newest first"""
+        return [
+            {key: profile[key] for key in ("id", "method", "path", "route", "status", "ms", "started_at")}
+            for profile in reversed(self._recent)
+        ]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return next((profile for profile in self._recent if profile["id"] == profile_id), None)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware recording a span tree (and sampled stacks) for profiled requests"""
+
+    def __init__(self, app: Any, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        threshold = self.profiler.requested(scope) if scope["type"] == "http" else None
+        if threshold is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+        profile_id = self.profiler.new_id()
+        # Requests that asked for a profile learn where to fetch it
+        id_header = [(b"x-profile-id", profile_id.encode("latin-1"))] if threshold == 0 else []
+
+        async def send_with_status(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + id_header}
+            await send(message)
+
+        sampler = self.profiler.sampler
+        stacks = sampler.start() if sampler else None
+        started_at = time.time()
+        root = Span("request")
+        try:
+            with root:
+                await self.app(scope, receive, send_with_status)
+        finally:
+            if sampler:
+                sampler.stop(stacks)
+            elapsed = root.end - root.start
+            if elapsed >= threshold:
+                route = scope.get("route")
+                self.profiler.keep({
+                    "id": profile_id,
+                    "method": scope.get("method", ""),
+                    "path": scope.get("path", ""),
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "route": getattr(route, "path", None) or "unmatched",
+                    "status": status["code"],
+                    "ms": round(elapsed * 1e3, 3),
+                    "started_at": started_at,
+                    "spans": root.to_dict(root.start),
+                    "stacks": dict(stacks.most_common(MAX_STACKS)) if stacks else None,
+                    "samples": sum(stacks.values()) if stacks else 0,
+                })
+
+
+def build_profiler() -> Profiler:
+    """Profiler configured from app settings"""
+    return Profiler(
+        mode=PROFILE_MODE,
+        header=PROFILE_HEADER,
+        threshold=PROFILE_SLOW_THRESHOLD,
+        sample_interval=PROFILE_SAMPLE_INTERVAL,
+        directory=PROFILE_DIR or os.path.join(DATA_DIR, "profiles"),
+        keep=PROFILE_KEEP,
+    )
+
+
+profiler = build_profiler()
@@ -0,0 +1,241 @@
+"""
+Responses - fast JSON encoding, encoded bodies cached with their source data, ETags and compression
+"""
+import gzip
+import hashlib
+import json
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import anyio.to_thread
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from app.config import COMPRESS_MIN_BYTES, COMPRESS_THREAD_MIN_BYTES, COMPRESSION_ENABLED, RESPONSE_CACHE_MAX_BYTES
+from app.profiling import span
+from app.services.cache import TTLCache
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder is used without it
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional; responses are gzipped without it
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+# Encoded bodies are validated against their sources, so they never need to expire on their own
+RESPONSE_CACHE_TTL = 24 * 3600
+
+# ETag suffix per content coding; each coding is a different representation and needs its own strong tag
+ETAG_SUFFIXES = {None: "", "gzip": "-gz", "br": "-br"}
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes; numpy scalars and arrays are accepted when orjson is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        with span("render_json"):
+            return dumps(content)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+async def compress_body(body: bytes, encoding: str) -> bytes:
+    """compress(), on a worker thread for bodies large enough to hold up the event loop"""
+    if len(body) >= COMPRESS_THREAD_MIN_BYTES:
+        return await anyio.to_thread.run_sync(compress, body, encoding)
+    return compress(body, encoding)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Preferred content coding the client accepts: br when brotli is installed, else gzip"""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match comparison against the tag of the representation being sent.
+
+    Weak, so W/"x" matches "x"; * matches anything. A tag only matches the
+    content coding it was sent with: "x-gz" does not match the identity
+    body's "x".
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class EncodedBody:
+    """A response body encoded once, with strong ETags per content coding and compressed variants made on demand"""
+
+    __slots__ = ("body", "digest", "_variants")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        # From the bytes themselves, so every worker process gives the same body the same tag
+        self.digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self._variants: Dict[str, bytes] = {}
+
+    def etag(self, encoding: Optional[str]) -> str:
+        """Strong ETag of the body as sent with the given content coding (None for identity)"""
+        return f'"{self.digest}{ETAG_SUFFIXES[encoding]}"'
+
+    async def variant(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        compressed = self._variants.get(encoding)
+        if compressed is None:
+            with span("compress"):
+                compressed = self._variants[encoding] = await compress_body(self.body, encoding)
+        return compressed
+
+
+class ResponseCache:
+    """Encoded response bodies keyed by route and arguments.
+
+    Each body is stored with the cached values it was built from (the
+    fund info dict, the history columns, ...). Cache entries are replaced,
+    never mutated, when data is refreshed, so while every source is the
+    same object the stored body is still current; a refreshed source
+    means the body is built and encoded again.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self._cache = TTLCache(
+            "responses", RESPONSE_CACHE_TTL, max_bytes=max_bytes,
+            # Room for one compressed variant next to the body
+            sizeof=lambda record: 2 * len(record[1].body),
+        )
+
+    def encoded(self, key: Hashable, sources: Tuple[Any, ...], build: Callable[[], Any]) -> EncodedBody:
+        """The encoded body for key, built and encoded again if any source changed"""
+        record = self._cache.get(key)
+        if record is not None and len(record[0]) == len(sources) and all(
+            held is source for held, source in zip(record[0], sources)
+        ):
+            return record[1]
+        with span("encode_response"):
+            payload = build()
+            with span("render_json"):
+                encoded = EncodedBody(dumps(payload))
+        self._cache.set(key, (sources, encoded))
+        return encoded
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+response_cache = ResponseCache()
+
+
+async def encoded_response(
+    request: Request,
+    key: Hashable,
+    sources: Tuple[Any, ...],
+    build: Callable[[], Any],
+) -> Response:
+    """JSON response for a payload derived from cached values, or 304 if the client already has it.
+
+    build() is only called when the sources changed since the body was
+    last encoded. Bodies over COMPRESS_MIN_BYTES are sent compressed
+    when the client accepts it, and the compressed bytes are kept too.
+    """
+    encoded = response_cache.encoded(key, sources, build)
+    encoding = None
+    if COMPRESSION_ENABLED and len(encoded.body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate(request.headers.get("accept-encoding", ""))
+    etag = encoded.etag(encoding)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and request.method in ("GET", "HEAD") and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(await encoded.variant(encoding), media_type="application/json", headers=headers)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing single-message text and JSON responses over a size threshold.
+
+    Responses that already carry a Content-Encoding (such as the cached
+    variants from encoded_response) and streamed responses pass through.
+    """
+
+    def __init__(self, app: Any, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                encoding = negotiate(value.decode("latin-1"))
+                break
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Dict[str, Any] = {}
+
+        async def send_compressed(message: Dict[str, Any]):
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", ())}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    await send(message)
+                else:
+                    # Held until the body shows whether it is worth compressing
+                    start.update(message)
+                return
+            if not start:
+                await send(message)
+                return
+            head, body = dict(start), message.get("body", b"")
+            start.clear()
+            if message.get("more_body") or len(body) < self.minimum_size:
+                await send(head)
+                await send(message)
+                return
+            body = await compress_body(body, encoding)
+            headers = [(name, value) for name, value in head.get("headers", ()) if name.lower() != b"content-length"]
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**head, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,4 +1,5 @@
 # Routes Package
 from .funds import router as funds_router
+from .debug import router as debug_router
 
-__all__ = ["funds_router"]
+__all__ = ["funds_router", "debug_router"]
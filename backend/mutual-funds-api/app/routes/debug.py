@@ -0,0 +1,27 @@
+"""
+Debug Routes - recent request profiles
+"""
+from fastapi import APIRouter, HTTPException
+
+from app.profiling import profiler
+
+router = APIRouter(prefix="/debug", tags=["Debug"])
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Summaries of the most recent kept profiles, newest first"""
+    return {"mode": profiler.mode, "threshold": profiler.threshold, "profiles": profiler.recent()}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """
+    A kept profile: the request's span timing tree and, if sampling is
+    enabled, its sampled stacks in folded format (one "frames count" per
+    line for flame graph tools).
+    """
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return profile
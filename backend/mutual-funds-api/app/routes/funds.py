@@ -1,30 +1,64 @@
 """
 Mutual Fund API Routes
 """
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List
-from app.services import mutual_fund_service
-from app.models import APIResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import Any, Optional, List
+from app.metrics import operation
+from app.responses import dumps, encoded_response
+from app.services import async_mutual_fund_service, nav_stream
+from app.services.live import StreamFullError, nav_quote, sse_event
+from app.services.serialization import empty_history, format_history
+from app.services.catalogue import RECORD_SORT_FIELDS
+from app.services.downsampling import INTERVALS, MAX_POINTS, MIN_POINTS
+from app.services.fund_service import QUOTE_SORT_FIELDS
+from app.models import APIResponse, BatchQuoteRequest, BulkPortfolioRequest, HoldingInput
+from app.config import BATCH_MAX_SYMBOLS, BULK_MAX_PORTFOLIOS, STREAM_INTERVAL, STREAM_KEEPALIVE
 
 router = APIRouter(prefix="/api/mutual-funds", tags=["Mutual Funds"])
 
+SORT_FIELDS = RECORD_SORT_FIELDS + QUOTE_SORT_FIELDS
+
+POINTS_DESCRIPTION = "Downsample history to at most this many points, keeping the shape of the NAV line (for charts)"
+INTERVAL_DESCRIPTION = f"Aggregate history into weekly or monthly open/high/low/close points ({', '.join(INTERVALS)})"
+
+
+def _validate_symbols(symbols: List[str]) -> List[str]:
+    """Strip, de-duplicate and bound the symbols of a batch request"""
+    symbol_list = list(dict.fromkeys(symbol.strip() for symbol in symbols if symbol.strip()))
+    
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="At least one symbol is required")
+    if len(symbol_list) > BATCH_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_SYMBOLS} symbols are allowed")
+    return symbol_list
+
+
+def _success(data: Any) -> dict:
+    """APIResponse body for data, for routes that encode their own response"""
+    return {"success": True, "data": data, "error": None}
+
 
 @router.get("/", response_model=APIResponse)
 async def get_popular_funds(
-    category: Optional[str] = Query(None, description="Filter by category (Large Cap, Mid Cap, Small Cap, ELSS, Flexi Cap, Index Fund)")
+    category: Optional[str] = Query(None, description="Filter by category name or id (see /categories)"),
+    family: Optional[str] = Query(None, description="Filter by fund house"),
+    sort: Optional[str] = Query(None, pattern=f"^({'|'.join(SORT_FIELDS)})$", description=f"Sort by {', '.join(SORT_FIELDS)}"),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$", description="Sort order (default: asc for name, desc otherwise)"),
+    offset: int = Query(0, ge=0, description="Number of funds to skip"),
+    limit: int = Query(50, ge=1, le=BATCH_MAX_SYMBOLS, description="Maximum number of funds to return")
 ):
     """
-    Get list of popular Indian mutual funds.
-    Optionally filter by category.
+    Get a page of Indian mutual funds.
+    Without filters, lists the popular funds; with a category and/or fund
+    house, lists every fund in it. Only the funds on the page are quoted.
     """
     try:
-        funds = mutual_fund_service.get_popular_funds(category)
+        descending = order == "desc" if order else sort != "name"
+        data = await async_mutual_fund_service.list_funds(category, family, sort, descending, offset, limit)
         return APIResponse(
             success=True,
-            data={
-                "funds": funds,
-                "count": len(funds)
-            }
+            data=data
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -32,13 +66,15 @@ async def get_popular_funds(
 
 @router.get("/search", response_model=APIResponse)
 async def search_funds(
-    q: str = Query(..., description="Search query (fund name, category, or AMC)")
+    q: str = Query(..., description="Search query (fund name, category, or AMC)"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results")
 ):
     """
     Search mutual funds by name, category, or fund house.
+    Matches whole words, word prefixes and small typos; best matches first.
     """
     try:
-        results = mutual_fund_service.search_funds(q)
+        results = async_mutual_fund_service.search_funds(q, limit)
         return APIResponse(
             success=True,
             data={
@@ -53,16 +89,9 @@ async def search_funds(
 @router.get("/categories", response_model=APIResponse)
 async def get_categories():
     """
-    Get list of available mutual fund categories.
+    Get list of available mutual fund categories with their fund counts.
     """
-    categories = [
-        {"id": "large-cap", "name": "Large Cap", "description": "Invest in top 100 companies by market cap"},
-        {"id": "mid-cap", "name": "Mid Cap", "description": "Invest in 101-250 companies by market cap"},
-        {"id": "small-cap", "name": "Small Cap", "description": "Invest in companies beyond top 250"},
-        {"id": "flexi-cap", "name": "Flexi Cap", "description": "Flexible allocation across market caps"},
-        {"id": "elss", "name": "ELSS", "description": "Tax saving funds with 3-year lock-in"},
-        {"id": "index-fund", "name": "Index Fund", "description": "Track market indices like Nifty 50"},
-    ]
+    categories = async_mutual_fund_service.get_categories()
     
     return APIResponse(
         success=True,
@@ -70,24 +99,156 @@ async def get_categories():
     )
 
 
+@router.get("/stream")
+async def stream_navs(
+    symbols: str = Query(..., description="Comma-separated fund symbols")
+) -> StreamingResponse:
+    """
+    Stream NAV quotes for several mutual funds as server-sent events.
+    
+    Each `nav` event carries `{"quotes": [...]}`: first the quotes already
+    known, then only quotes that changed. Quotes are refreshed by one
+    server-side loop for all clients, so polling `/{symbol}/nav` is not needed.
+    """
+    symbol_list = _validate_symbols(symbols.split(","))
+    try:
+        subscription = nav_stream.subscribe(symbol_list)
+    except StreamFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events():
+        try:
+            # Tells EventSource clients to reconnect after one refresh interval if dropped
+            yield f"retry: {int(STREAM_INTERVAL * 1000)}\n\n".encode("utf-8")
+            while not subscription.closed:
+                quotes = await subscription.next(STREAM_KEEPALIVE)
+                if quotes:
+                    yield sse_event("nav", dumps({"quotes": quotes}))
+                elif not subscription.closed:
+                    yield b": keepalive\n\n"
+        finally:
+            nav_stream.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/history/batch", response_model=APIResponse)
+async def get_batch_history(
+    request: Request,
+    symbols: str = Query(..., description="Comma-separated fund symbols"),
+    period: str = Query("1y", description="Historical data period (1mo, 3mo, 6mo, 1y, 2y, 5y)"),
+    shape: str = Query("records", alias="format", pattern="^(records|columns)$", description="History shape: records ([{date, nav}]) or columns ({dates, nav})")
+) -> Response:
+    """
+    Get historical NAV data for several mutual funds in one request.
+    """
+    try:
+        symbol_list = _validate_symbols(symbols.split(","))
+        histories = await async_mutual_fund_service.get_batch_history_columns(symbol_list, period)
+        
+        return await encoded_response(
+            request,
+            ("history_batch", tuple(histories), period, shape),
+            tuple(histories.values()),
+            lambda: _success({
+                "period": period,
+                "histories": {
+                    symbol: format_history(columns or empty_history(), shape)
+                    for symbol, columns in histories.items()
+                },
+                "count": len(histories)
+            })
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _batch_quotes(request: Request, symbols: List[str]) -> Response:
+    symbol_list = _validate_symbols(symbols)
+    fund_infos = await async_mutual_fund_service.get_fund_infos(symbol_list)
+
+    def build() -> dict:
+        quotes = {symbol: nav_quote(fund) for symbol, fund in fund_infos.items() if fund}
+        return _success({
+            "quotes": quotes,
+            "missing": [symbol for symbol, fund in fund_infos.items() if not fund],
+            "count": len(quotes)
+        })
+
+    return await encoded_response(request, ("nav_batch", tuple(fund_infos)), tuple(fund_infos.values()), build)
+
+
+@router.get("/nav/batch", response_model=APIResponse)
+async def get_batch_quotes(
+    request: Request,
+    symbols: str = Query(..., description="Comma-separated fund symbols")
+) -> Response:
+    """
+    Get current NAV for several mutual funds in one request.
+    Cached quotes are served directly; only misses are fetched.
+    """
+    try:
+        return await _batch_quotes(request, symbols.split(","))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/nav/batch", response_model=APIResponse)
+async def post_batch_quotes(request: Request, body: BatchQuoteRequest) -> Response:
+    """
+    Get current NAV for several mutual funds in one request.
+    
+    Request body example:
+    ```json
+    {"symbols": ["0P0000XVHO.BO", "0P0000XW1B.BO"]}
+    ```
+    """
+    try:
+        return await _batch_quotes(request, body.symbols)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{symbol}", response_model=APIResponse)
 async def get_fund_detail(
+    request: Request,
     symbol: str,
-    period: str = Query("1y", description="Historical data period (1mo, 3mo, 6mo, 1y, 2y, 5y)")
-):
+    period: str = Query("1y", description="Historical data period (1mo, 3mo, 6mo, 1y, 2y, 5y)"),
+    shape: str = Query("records", alias="format", pattern="^(records|columns)$", description="History shape: records ([{date, nav}]) or columns ({dates, nav})"),
+    points: Optional[int] = Query(None, ge=MIN_POINTS, le=MAX_POINTS, description=POINTS_DESCRIPTION),
+    interval: Optional[str] = Query(None, pattern=f"^({'|'.join(INTERVALS)})$", description=INTERVAL_DESCRIPTION)
+) -> Response:
     """
     Get detailed information about a specific mutual fund including historical NAV.
+    Returns are computed over the full history, however it is downsampled.
     """
     try:
-        fund = mutual_fund_service.get_fund_detail(symbol, period)
-        
-        if not fund:
-            raise HTTPException(status_code=404, detail=f"Fund with symbol {symbol} not found")
-        
-        return APIResponse(
-            success=True,
-            data={"fund": fund}
-        )
+        with operation("fund_detail"):
+            fund_info, columns = await async_mutual_fund_service.get_fund_detail_parts(symbol, period)
+            
+            if not fund_info:
+                raise HTTPException(status_code=404, detail=f"Fund with symbol {symbol} not found")
+            
+            def build() -> dict:
+                chart = None
+                if columns is not None:
+                    chart = async_mutual_fund_service.downsample_history(symbol, period, columns, points, interval)
+                return _success({"fund": async_mutual_fund_service.build_fund_detail(fund_info, columns, shape, chart)})
+            
+            return await encoded_response(
+                request, ("detail", symbol, period, shape, points, interval), (fund_info, columns), build
+            )
     except HTTPException:
         raise
     except Exception as e:
@@ -95,27 +256,17 @@ async def get_fund_detail(
 
 
 @router.get("/{symbol}/nav", response_model=APIResponse)
-async def get_fund_nav(symbol: str):
+async def get_fund_nav(request: Request, symbol: str) -> Response:
     """
     Get current NAV for a mutual fund.
     """
     try:
-        fund = mutual_fund_service.get_fund_info(symbol)
+        fund = await async_mutual_fund_service.get_fund_info(symbol)
         
         if not fund:
             raise HTTPException(status_code=404, detail=f"Fund with symbol {symbol} not found")
         
-        return APIResponse(
-            success=True,
-            data={
-                "symbol": fund["symbol"],
-                "name": fund["name"],
-                "nav": fund["nav"],
-                "previous_close": fund["previous_close"],
-                "day_change": fund["day_change"],
-                "day_change_percent": fund["day_change_percent"]
-            }
-        )
+        return await encoded_response(request, ("nav", symbol), (fund,), lambda: _success(nav_quote(fund)))
     except HTTPException:
         raise
     except Exception as e:
@@ -124,26 +275,66 @@ async def get_fund_nav(symbol: str):
 
 @router.get("/{symbol}/history", response_model=APIResponse)
 async def get_fund_history(
+    request: Request,
     symbol: str,
-    period: str = Query("1y", description="Historical data period (1mo, 3mo, 6mo, 1y, 2y, 5y)")
-):
+    period: str = Query("1y", description="Historical data period (1mo, 3mo, 6mo, 1y, 2y, 5y)"),
+    shape: str = Query("records", alias="format", pattern="^(records|columns)$", description="History shape: records ([{date, nav}]) or columns ({dates, nav})"),
+    points: Optional[int] = Query(None, ge=MIN_POINTS, le=MAX_POINTS, description=POINTS_DESCRIPTION),
+    interval: Optional[str] = Query(None, pattern=f"^({'|'.join(INTERVALS)})$", description=INTERVAL_DESCRIPTION)
+) -> Response:
     """
     Get historical NAV data for a mutual fund.
+    With interval, each point also has open, high and low NAVs; nav is the close.
     """
     try:
-        history = mutual_fund_service.get_historical_nav(symbol, period)
+        columns = await async_mutual_fund_service.get_history_columns(symbol, period)
         
-        if not history:
+        if not columns or not columns["dates"]:
             raise HTTPException(status_code=404, detail=f"No historical data found for {symbol}")
         
-        return APIResponse(
-            success=True,
-            data={
+        def build() -> dict:
+            chart = async_mutual_fund_service.downsample_history(symbol, period, columns, points, interval)
+            return _success({
                 "symbol": symbol,
                 "period": period,
-                "history": history,
-                "count": len(history)
-            }
+                "history": format_history(chart, shape),
+                "count": len(chart["dates"]),
+                "source_count": len(columns["dates"])
+            })
+        
+        return await encoded_response(request, ("history", symbol, period, shape, points, interval), (columns,), build)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{symbol}/analytics", response_model=APIResponse)
+async def get_fund_analytics(
+    request: Request,
+    symbol: str,
+    period: str = Query("5y", description="Historical data period (1mo, 3mo, 6mo, 1y, 2y, 5y)"),
+    window: str = Query("1y", pattern="^(1m|3m|6m|1y|2y|3y|5y)$", description="Rolling return window (1m, 3m, 6m, 1y, 2y, 3y, 5y)")
+) -> Response:
+    """
+    Get trailing returns, CAGR, volatility, max drawdown, rolling returns
+    and Sharpe ratio for a mutual fund.
+    """
+    try:
+        analytics = await async_mutual_fund_service.get_fund_analytics(symbol, period, window)
+        
+        if not analytics:
+            raise HTTPException(status_code=404, detail=f"No historical data found for {symbol}")
+        
+        return await encoded_response(
+            request,
+            ("analytics", symbol, period, window),
+            (analytics,),
+            lambda: _success({
+                "symbol": symbol,
+                "period": period,
+                "analytics": analytics
+            })
         )
     except HTTPException:
         raise
@@ -152,15 +343,22 @@ async def get_fund_history(
 
 
 @router.post("/portfolio/calculate", response_model=APIResponse)
-async def calculate_portfolio(holdings: List[dict]):
+async def calculate_portfolio(holdings: List[HoldingInput]):
     """
     Calculate portfolio value and returns.
     
+    Each holding is units bought at an average NAV (optionally with a
+    purchase_date), or its purchase lots. XIRR is included when every
+    purchase is dated.
+    
     Request body example:
     ```json
     [
         {"symbol": "0P0000XVHO.BO", "units": 100, "avg_nav": 850.50},
-        {"symbol": "0P0000XW1B.BO", "units": 50, "avg_nav": 65.30}
+        {"symbol": "0P0000XW1B.BO", "lots": [
+            {"date": "2023-04-03", "units": 30, "nav": 58.10},
+            {"date": "2024-01-15", "units": 20, "nav": 65.30}
+        ]}
     ]
     ```
     """
@@ -168,7 +366,7 @@ async def calculate_portfolio(holdings: List[dict]):
         if not holdings:
             raise HTTPException(status_code=400, detail="Holdings list cannot be empty")
         
-        result = mutual_fund_service.calculate_portfolio_value(holdings)
+        result = await async_mutual_fund_service.calculate_portfolio_value(holdings)
         
         return APIResponse(
             success=True,
@@ -176,5 +374,52 @@ async def calculate_portfolio(holdings: List[dict]):
         )
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/portfolio/bulk", response_model=APIResponse)
+async def value_portfolios(request: BulkPortfolioRequest):
+    """
+    Value many portfolios at once.
+    
+    Every distinct fund is quoted once for the whole request. Returns a
+    summary (with XIRR where every purchase is dated) per portfolio, in
+    request order, and per-holding rows if include_holdings is set.
+    
+    Request body example:
+    ```json
+    {
+        "portfolios": [
+            {"id": "user-1", "holdings": [{"symbol": "0P0000XVHO.BO", "units": 100, "avg_nav": 850.50, "purchase_date": "2024-02-01"}]},
+            {"id": "user-2", "holdings": [{"symbol": "0P0000XW1B.BO", "lots": [{"date": "2023-04-03", "units": 30, "nav": 58.10}]}]}
+        ],
+        "include_holdings": false
+    }
+    ```
+    """
+    try:
+        if not request.portfolios:
+            raise HTTPException(status_code=400, detail="Portfolios list cannot be empty")
+        if len(request.portfolios) > BULK_MAX_PORTFOLIOS:
+            raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_PORTFOLIOS} portfolios are allowed")
+        
+        portfolios = await async_mutual_fund_service.value_portfolios(
+            request.portfolios, request.as_of, request.include_holdings
+        )
+        
+        return APIResponse(
+            success=True,
+            data={
+                "portfolios": portfolios,
+                "count": len(portfolios)
+            }
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,4 +1,18 @@
 # Services Package
 from .fund_service import mutual_fund_service, MutualFundService
+from .async_fund_service import async_mutual_fund_service, AsyncMutualFundService
+from .refresher import CatalogueRefresher
+from .live import nav_stream, NavStream
+from .warm_start import WarmStartSnapshot, build_warm_start
 
-__all__ = ["mutual_fund_service", "MutualFundService"]
+__all__ = [
+    "mutual_fund_service",
+    "MutualFundService",
+    "async_mutual_fund_service",
+    "AsyncMutualFundService",
+    "CatalogueRefresher",
+    "nav_stream",
+    "NavStream",
+    "WarmStartSnapshot",
+    "build_warm_start",
+]
@@ -0,0 +1,123 @@
+"""
+NAV analytics - vectorized returns and risk metrics over a NAV series
+"""
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from app.lazy import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+# Trailing windows, aligned by calendar date rather than row count; pd.DateOffset arguments
+WINDOWS = {
+    "1m": {"months": 1},
+    "3m": {"months": 3},
+    "6m": {"months": 6},
+    "1y": {"years": 1},
+    "2y": {"years": 2},
+    "3y": {"years": 3},
+    "5y": {"years": 5},
+}
+
+TRADING_DAYS = 252
+
+# A window still counts as covered if the series starts this soon after its start date
+# (the exact start date may be a weekend or market holiday)
+START_TOLERANCE = np.timedelta64(7, "D")
+
+
+def _nav_arrays(columns: Dict[str, list]) -> tuple:
+    dates = pd.to_datetime(columns["dates"]).to_numpy()
+    navs = np.asarray(columns["nav"], dtype=float)
+    return dates, navs
+
+
+def _base_positions(dates: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Index of the last point on or before each target date, -1 if not covered"""
+    positions = np.searchsorted(dates, targets, side="right") - 1
+    near_start = (positions < 0) & (dates[0] - targets <= START_TOLERANCE)
+    positions[near_start] = 0
+    return positions
+
+
+def _percent(value: float) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value) * 100, 2)
+
+
+def trailing_returns(columns: Dict[str, list], windows: Iterable[str]) -> Dict[str, Optional[float]]:
+    """Percent return over each trailing window ending at the last NAV"""
+    windows = list(windows)
+    if len(columns["nav"]) < 2:
+        return {window: None for window in windows}
+
+    dates, navs = _nav_arrays(columns)
+    last = pd.Timestamp(dates[-1])
+    targets = np.array([(last - pd.DateOffset(**WINDOWS[window])).to_datetime64() for window in windows], dtype=dates.dtype)
+    positions = _base_positions(dates, targets)
+    returns = navs[-1] / navs[np.maximum(positions, 0)] - 1
+    return {
+        window: _percent(ret) if position >= 0 and position < len(navs) - 1 else None
+        for window, position, ret in zip(windows, positions, returns)
+    }
+
+
+def rolling_returns(dates: np.ndarray, navs: np.ndarray, window: str) -> np.ndarray:
+    """Return over the trailing window ending at every point the window fully covers"""
+    targets = (pd.DatetimeIndex(dates) - pd.DateOffset(**WINDOWS[window])).to_numpy()
+    positions = np.searchsorted(dates, targets, side="right") - 1
+    covered = positions >= 0
+    return navs[covered] / navs[positions[covered]] - 1
+
+
+def compute_analytics(
+    columns: Dict[str, list],
+    risk_free_rate: float,
+    rolling_window: str = "1y",
+) -> Dict[str, Any]:
+    """Trailing returns, CAGR, volatility, max drawdown, Sharpe ratio and rolling-return stats"""
+    if len(columns["nav"]) < 2:
+        return {}
+
+    dates, navs = _nav_arrays(columns)
+    years = (dates[-1] - dates[0]) / np.timedelta64(1, "D") / 365.25
+
+    daily = navs[1:] / navs[:-1] - 1
+    volatility = daily.std(ddof=1) * np.sqrt(TRADING_DAYS) if len(daily) > 1 else np.nan
+    annual_return = daily.mean() * TRADING_DAYS
+    sharpe = (annual_return - risk_free_rate) / volatility if volatility and np.isfinite(volatility) else np.nan
+
+    peaks = np.maximum.accumulate(navs)
+    drawdowns = navs / peaks - 1
+    trough = int(drawdowns.argmin())
+    peak = int(navs[:trough + 1].argmax())
+
+    rolling = rolling_returns(dates, navs, rolling_window)
+
+    return {
+        "start_date": str(np.datetime_as_string(dates[0], unit="D")),
+        "end_date": str(np.datetime_as_string(dates[-1], unit="D")),
+        "points": int(len(navs)),
+        "trailing_returns": trailing_returns(columns, WINDOWS),
+        "cagr": _percent((navs[-1] / navs[0]) ** (1 / years) - 1) if years > 0 else None,
+        "volatility": _percent(volatility),
+        "sharpe_ratio": None if not np.isfinite(sharpe) else round(float(sharpe), 2),
+        "max_drawdown": {
+            "percent": _percent(drawdowns[trough]),
+            "peak_date": str(np.datetime_as_string(dates[peak], unit="D")),
+            "trough_date": str(np.datetime_as_string(dates[trough], unit="D")),
+        },
+        "rolling_returns": {
+            "window": rolling_window,
+            "count": int(len(rolling)),
+            "mean": _percent(rolling.mean()) if len(rolling) else None,
+            "median": _percent(np.median(rolling)) if len(rolling) else None,
+            "min": _percent(rolling.min()) if len(rolling) else None,
+            "max": _percent(rolling.max()) if len(rolling) else None,
+            "positive_percent": round(float((rolling > 0).mean() * 100), 2) if len(rolling) else None,
+        },
+        "risk_free_rate": round(risk_free_rate * 100, 2),
+    }
@@ -0,0 +1,523 @@
+"""
+Async Mutual Fund Service - Runs Yahoo Finance calls off the event loop
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Optional, List, Dict, Any, Awaitable, Callable, Hashable, Iterable, Set, Tuple
+
+from app import profiling
+from app.config import (
+    FETCH_MAX_WORKERS, FANOUT_DEADLINE, BATCH_CHUNK_SIZE, STALE_TTL, SHARED_CACHE_READERS, METADATA_REFRESH_BATCH
+)
+from app.metrics import RATE_LIMIT_WAIT, UPSTREAM_CALLS, operation, record_upstream, stage, upstream_kind
+from .fund_service import MutualFundService, mutual_fund_service, BATCH_QUOTE_PERIOD, QUOTE_SORT_FIELDS
+from .cache import Cache, TieredCache
+from .catalogue import sort_symbols
+from .portfolio import PortfolioBook, value_portfolios
+from .circuit_breaker import CircuitOpenError
+from .rate_limiter import AsyncRateLimiter, BACKGROUND, upstream_priority
+from .singleflight import SingleFlight
+from .serialization import empty_history, format_history
+
+
+async def _in_background(func: Callable[[], Awaitable[Any]]) -> Any:
+    """Run func with its upstream calls at background priority"""
+    upstream_priority.set(BACKGROUND)
+    return await func()
+
+
+class AsyncMutualFundService:
+    """Awaitable facade over MutualFundService.
+
+    Blocking yfinance calls run on a bounded thread pool and the upstream
+    rate limit is awaited rather than slept on, so a slow upstream never
+    stalls the event loop; background refreshes only use upstream tokens
+    that no request is waiting for. Concurrent cache misses for the
+    same quote or history share a single upstream fetch, and
+    recently expired entries are served immediately while they are
+    refreshed in the background. With a shared cache tier, only the
+    in-process tier is read on the event loop; the shared database is
+    read on a small pool of its own, so a shared-tier hit never queues
+    behind upstream fetches, and written from its own writer thread.
+    """
+
+    def __init__(
+        self,
+        service: MutualFundService,
+        max_workers: int = FETCH_MAX_WORKERS,
+        fanout_deadline: float = FANOUT_DEADLINE,
+        batch_chunk_size: int = BATCH_CHUNK_SIZE,
+        stale_ttl: float = STALE_TTL,
+    ):
+        self._service = service
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="yf-fetch")
+        self._cache_executor: Optional[ThreadPoolExecutor] = None
+        caches = (service._quotes, service._history, service._metadata, service._analytics, service._charts)
+        if any(isinstance(cache, TieredCache) for cache in caches):
+            self._cache_executor = ThreadPoolExecutor(
+                max_workers=SHARED_CACHE_READERS, thread_name_prefix="shared-cache-read"
+            )
+        self._limiter = AsyncRateLimiter(service._bucket)
+        self._fanout_deadline = fanout_deadline
+        self._batch_chunk_size = batch_chunk_size
+        self._stale_ttl = stale_ttl
+        # Fetches that outlived their request keep running to warm the cache
+        self._background: Set[asyncio.Task] = set()
+        self._flight = SingleFlight()
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking callable on the fetch pool, inside the current profile if there is one"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, profiling.bind(functools.partial(func, *args)))
+
+    async def _run_cached(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a callable that may read the shared cache tier; on the event loop when there is none"""
+        if self._cache_executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._cache_executor, profiling.bind(functools.partial(func, *args)))
+
+    async def _fetch_upstream(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Rate limit, then run an upstream fetch on the fetch pool, through the circuit breaker"""
+        provider = self._service._provider
+        kind, remote = upstream_kind(func), provider.remote
+        breaker = self._service._breaker
+        if remote:
+            if not breaker.allow():
+                UPSTREAM_CALLS.inc(provider=provider.name, kind=kind, outcome="refused")
+                raise CircuitOpenError("Upstream circuit is open")
+            with stage("rate_limit_wait"):
+                RATE_LIMIT_WAIT.observe(await self._limiter.acquire(), priority=upstream_priority.get())
+        start = time.perf_counter()
+        try:
+            with stage("upstream_fetch"):
+                result = await self._run(func, *args)
+        except Exception as e:
+            if remote:
+                breaker.record_failure(e)
+            record_upstream(provider.name, kind, time.perf_counter() - start, e)
+            raise
+        if remote:
+            breaker.record_success()
+        record_upstream(provider.name, kind, time.perf_counter() - start)
+        return result
+
+    async def _cached(
+        self,
+        cache: Cache,
+        keys: Iterable[Hashable],
+    ) -> Dict[Hashable, Tuple[Optional[Any], Optional[Any]]]:
+        """(fresh, stale) cached value per key, stale only if expired within the stale TTL.
+
+        Keys the in-process tier has no fresh value for are read from the
+        shared tier, if there is one, in a single hop to the shared-tier readers.
+        """
+        tiered = isinstance(cache, TieredCache)
+        local = cache.local if tiered else cache
+        results = {}
+        misses = []
+        for key in keys:
+            fresh = local.get(key)
+            if fresh is not None:
+                results[key] = (fresh, None)
+            elif tiered:
+                misses.append(key)
+            else:
+                results[key] = (None, cache.get_stale(key, self._stale_ttl))
+        if misses:
+            results.update(await self._run_cached(lambda: {key: cache.fall_through(key, self._stale_ttl) for key in misses}))
+        return results
+
+    def _keep_running(self, task: asyncio.Task):
+        """Hold a reference to a background task until it finishes"""
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _revalidate(self, key: Hashable, func: Callable[[], Awaitable[Any]]):
+        """Refresh a key in the background unless a fetch for it is already running"""
+        if key not in self._flight:
+            self._keep_running(asyncio.ensure_future(self._flight.do(key, functools.partial(_in_background, func))))
+
+    async def get_fund_info(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Get basic mutual fund information"""
+        with operation("fund_info"):
+            with stage("cache_lookup"):
+                cached, stale = (await self._cached(self._service._quotes, [symbol]))[symbol]
+            if cached:
+                return cached
+
+            load = functools.partial(self._load_fund_info, symbol)
+            if stale:
+                self._revalidate(("quote", symbol), load)
+                return stale
+
+            return await self._flight.do(("quote", symbol), load)
+
+    async def _load_fund_info(self, symbol: str) -> Optional[Dict[str, Any]]:
+        service = self._service
+        try:
+            info = await self._fetch_upstream(service._fetch_info, symbol)
+        except Exception as e:
+            return await self._run_cached(service._handle_info_error, symbol, e)
+
+        with stage("serialization"):
+            return service._build_fund_info(symbol, info)
+
+    def build_fund_detail(
+        self,
+        fund_info: Optional[Dict[str, Any]],
+        columns: Optional[Dict[str, list]],
+        shape: str = "records",
+        chart: Optional[Dict[str, list]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Fund detail from its parts: the fund info with its history (or chart of it) attached, if there is one"""
+        if not fund_info or columns is None:
+            return fund_info
+
+        with stage("serialization"):
+            return self._service._attach_history(fund_info, columns, shape, chart)
+
+    async def get_fund_detail_parts(
+        self,
+        symbol: str,
+        period: str = "1y",
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, list]]]:
+        """The cached fund info and columnar history a fund detail is built from"""
+        fund_info = await self.get_fund_info(symbol)
+        if not fund_info:
+            return None, None
+        return fund_info, await self._get_history(symbol, period)
+
+    async def get_historical_nav(self, symbol: str, period: str = "1y", shape: str = "records") -> Any:
+        """Get historical NAV data as records, or {"dates", "nav"} columns"""
+        return format_history(await self.get_history_columns(symbol, period) or empty_history(), shape)
+
+    async def get_history_columns(self, symbol: str, period: str = "1y") -> Optional[Dict[str, list]]:
+        """The cached columnar NAV history, or None if it could not be fetched"""
+        return await self._get_history(symbol, period)
+
+    def downsample_history(
+        self,
+        symbol: str,
+        period: str,
+        columns: Dict[str, list],
+        points: Optional[int] = None,
+        interval: Optional[str] = None,
+    ) -> Dict[str, list]:
+        """Columnar history aggregated to an interval and/or reduced to at most points points, for charts"""
+        with stage("downsampling"):
+            return self._service._chart_for(symbol, period, columns, points, interval)
+
+    async def get_fund_analytics(self, symbol: str, period: str = "5y", window: str = "1y") -> Dict[str, Any]:
+        """Get returns and risk metrics over a fund's NAV history"""
+        columns = await self._get_history(symbol, period)
+        if columns is None:
+            return {}
+        return self._service._analytics_for(symbol, period, columns, window)
+
+    async def _get_history(self, symbol: str, period: str) -> Optional[Dict[str, list]]:
+        """Cached or coalesced columnar NAV history, or None if the upstream fetch failed"""
+        with stage("cache_lookup"):
+            cached, stale = (await self._cached(self._service._history, [(symbol, period)]))[(symbol, period)]
+        if cached is not None:
+            return cached
+
+        load = functools.partial(self._load_history, symbol, period)
+        if stale is not None:
+            self._revalidate(("history", symbol, period), load)
+            return stale
+
+        return await self._flight.do(("history", symbol, period), load)
+
+    async def _load_history(self, symbol: str, period: str) -> Optional[Dict[str, list]]:
+        service = self._service
+        if service._uses_store(period):
+            await self._update_store([symbol])
+            return await self._run(service._read_history, symbol, period)
+
+        try:
+            hist = await self._fetch_upstream(service._fetch_history, symbol, period)
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                print(f"Error fetching historical data for {symbol}: {e}")
+            return None
+
+        return service._cache_history(symbol, period, service._history_columns(hist))
+
+    async def _update_store(self, symbols: List[str]):
+        """Fetch and store the missing history of symbols, one rate-limited call per group"""
+        service = self._service
+        for (period, start), group in await self._run(service._plan_history_fetches, symbols):
+            try:
+                closes = await self._fetch_upstream(service._fetch_history_closes, group, period, start)
+                await self._run(service._save_history, group, closes)
+            except CircuitOpenError:
+                return
+            except Exception as e:
+                # Stored history is still served if the tail update fails
+                print(f"Error updating stored history for {len(group)} symbols: {e}")
+
+    def _chunks(self, symbols: List[str]) -> List[List[str]]:
+        size = self._batch_chunk_size
+        return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+    async def _fetch_quote_chunk(self, symbols: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Fetch quotes for one chunk of symbols with a single bulk call"""
+        service = self._service
+        try:
+            closes = await self._fetch_upstream(service._fetch_batch_history, symbols, BATCH_QUOTE_PERIOD)
+        except Exception as e:
+            return await self._run_cached(service._handle_batch_error, symbols, e)
+
+        # Reads stored metadata, so it runs where a shared cache tier may be waited on
+        return await self._run_cached(service._build_batch_quotes, symbols, closes)
+
+    async def _gather_chunks(self, coros: List[Any], deadline: Optional[float]) -> List[Optional[Dict[str, Any]]]:
+        """Run chunk fetches concurrently, returning None for chunks that miss the deadline"""
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        if not tasks:
+            return []
+
+        timeout = self._fanout_deadline if deadline is None else deadline
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+
+        for task in pending:
+            self._keep_running(task)
+
+        return [task.result() if task in done and task.exception() is None else None for task in tasks]
+
+    async def get_fund_infos(
+        self,
+        symbols: Iterable[str],
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Fetch fund info for many symbols.
+
+        Cache hits are served directly, and recently expired entries are
+        served stale and refreshed in the background. Misses are split into
+        chunks that are each fetched with one bulk call, concurrently and
+        under the shared upstream rate limiter. Symbols whose chunk has not
+        returned when the deadline passes get their cached (possibly stale)
+        or fallback data; their fetches carry on in the background.
+        """
+        service = self._service
+        results = {}
+        misses = []
+        stale = []
+        with stage("cache_lookup"):
+            cached = await self._cached(service._quotes, dict.fromkeys(symbol for symbol in symbols if symbol))
+        for symbol, (fresh, expired) in cached.items():
+            if expired:
+                stale.append(symbol)
+            if fresh or expired:
+                results[symbol] = fresh or expired
+            else:
+                misses.append(symbol)
+
+        for chunk in self._chunks(stale):
+            self._revalidate(("quotes", tuple(chunk)), functools.partial(self._fetch_quote_chunk, chunk))
+
+        chunks = self._chunks(misses)
+        chunk_results = await self._gather_chunks(
+            [self._flight.do(("quotes", tuple(chunk)), functools.partial(self._fetch_quote_chunk, chunk))
+             for chunk in chunks],
+            deadline
+        )
+        late = []
+        for chunk, chunk_result in zip(chunks, chunk_results):
+            for symbol in chunk:
+                if chunk_result is not None:
+                    results[symbol] = chunk_result.get(symbol)
+                else:
+                    late.append(symbol)
+        if late:
+            results.update(await self._run_cached(lambda: {symbol: service._get_cached_or_fallback(symbol) for symbol in late}))
+        return results
+
+    async def _fetch_history_chunk(self, symbols: List[str], period: str) -> Dict[str, Dict[str, list]]:
+        """Fetch closing-price history for one chunk of symbols with a single bulk call"""
+        service = self._service
+        if service._uses_store(period):
+            await self._update_store(symbols)
+            return await self._run(
+                lambda: {symbol: service._read_history(symbol, period) for symbol in symbols}
+            )
+
+        try:
+            closes = await self._fetch_upstream(self._service._fetch_batch_history, symbols, period)
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                print(f"Error fetching batch historical data for {len(symbols)} symbols: {e}")
+            return {symbol: empty_history() for symbol in symbols}
+
+        return self._service._batch_history_columns(symbols, closes, period)
+
+    async def get_batch_history(
+        self,
+        symbols: Iterable[str],
+        period: str = "1y",
+        deadline: Optional[float] = None,
+        shape: str = "records",
+    ) -> Dict[str, Any]:
+        """Get historical NAV data for many symbols, fetching cache misses with bulk calls"""
+        return {
+            symbol: format_history(columns or empty_history(), shape)
+            for symbol, columns in (await self.get_batch_history_columns(symbols, period, deadline)).items()
+        }
+
+    async def get_batch_history_columns(
+        self,
+        symbols: Iterable[str],
+        period: str = "1y",
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Optional[Dict[str, list]]]:
+        """Cached columnar NAV history per symbol (None where it could not be fetched in time)"""
+        results = {}
+        misses = []
+        keys = [(symbol, period) for symbol in dict.fromkeys(symbol for symbol in symbols if symbol)]
+        with stage("cache_lookup"):
+            cached = await self._cached(self._service._history, keys)
+        for symbol, _ in keys:
+            fresh = cached[(symbol, period)][0]
+            if fresh is not None:
+                results[symbol] = fresh
+            else:
+                misses.append(symbol)
+
+        chunks = self._chunks(misses)
+        chunk_results = await self._gather_chunks(
+            [self._flight.do(("histories", period, tuple(chunk)),
+                             functools.partial(self._fetch_history_chunk, chunk, period))
+             for chunk in chunks],
+            deadline
+        )
+
+        for chunk, chunk_result in zip(chunks, chunk_results):
+            for symbol in chunk:
+                results[symbol] = chunk_result.get(symbol) if chunk_result is not None else None
+
+        return results
+
+    async def refresh_quotes(self, symbols: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Re-fetch quotes for symbols, cached or not, with one bulk call per chunk at background priority"""
+        token = upstream_priority.set(BACKGROUND)
+        try:
+            chunks = self._chunks(list(dict.fromkeys(symbol for symbol in symbols if symbol)))
+            chunk_results = await asyncio.gather(
+                *(self._flight.do(("quotes", tuple(chunk)), functools.partial(self._fetch_quote_chunk, chunk))
+                  for chunk in chunks)
+            )
+        finally:
+            upstream_priority.reset(token)
+        return {symbol: quote for chunk_result in chunk_results for symbol, quote in chunk_result.items()}
+
+    async def read_shared_quotes(self, symbols: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Quotes as any worker last stored them in the shared cache tier; empty without a shared tier"""
+        quotes = self._service._quotes
+        if not isinstance(quotes, TieredCache):
+            return {}
+        return await self._run_cached(lambda: {symbol: quotes.pull(symbol) for symbol in symbols})
+
+    async def refresh_catalogue(self, period: str = "1y", metadata_batch: int = METADATA_REFRESH_BATCH):
+        """Re-fetch quotes for every catalogue fund, any expired default-period history,
+        and the expired metadata of up to metadata_batch funds.
+
+        Bulk quotes carry only closing prices, so a fund's expense ratio,
+        total assets, YTD return and currency come from its .info metadata;
+        fetching it takes one upstream call per fund, so each pass refreshes
+        a few and the rest are picked up by later passes.
+        """
+        service = self._service
+        symbols = service.get_catalogue_symbols()
+        cached = await self._cached(service._history, [(symbol, period) for symbol in symbols])
+        expired = [symbol for symbol in symbols if cached[(symbol, period)][0] is None]
+        metadata = await self._cached(service._metadata, symbols)
+        stale_metadata = [symbol for symbol in symbols if metadata[symbol][0] is None][:metadata_batch]
+        token = upstream_priority.set(BACKGROUND)
+        try:
+            await asyncio.gather(
+                *(self._flight.do(("quotes", tuple(chunk)), functools.partial(self._fetch_quote_chunk, chunk))
+                  for chunk in self._chunks(symbols)),
+                *(self._flight.do(("histories", period, tuple(chunk)),
+                                  functools.partial(self._fetch_history_chunk, chunk, period))
+                  for chunk in self._chunks(expired)),
+            )
+            # After the bulk quotes, so the quotes built from .info are the ones left cached
+            await asyncio.gather(
+                *(self._flight.do(("quote", symbol), functools.partial(self._load_fund_info, symbol))
+                  for symbol in stale_metadata)
+            )
+        finally:
+            upstream_priority.reset(token)
+
+    async def get_popular_funds(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get list of popular Indian mutual funds"""
+        fund_infos = await self.get_fund_infos(self._service.get_catalogue_symbols(category))
+        return [fund_info for fund_info in fund_infos.values() if fund_info]
+
+    async def list_funds(
+        self,
+        category: Optional[str] = None,
+        family: Optional[str] = None,
+        sort: Optional[str] = None,
+        descending: bool = True,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """One page of a fund listing; only the funds on the page are quoted"""
+        service = self._service
+        symbols = service._listing_symbols(category, family, sort, descending)
+        page = symbols[offset:offset + limit]
+        fund_infos = await self.get_fund_infos(page)
+        if sort in QUOTE_SORT_FIELDS:
+            # The page was ordered by cached quotes; order it by the ones just fetched
+            page = sort_symbols(page, lambda symbol: (fund_infos.get(symbol) or {}).get(sort), descending)
+        funds = [fund_infos[symbol] for symbol in page if fund_infos.get(symbol)]
+        return {
+            "funds": funds,
+            "count": len(funds),
+            "total": len(symbols),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if offset + limit < len(symbols) else None,
+        }
+
+    def get_categories(self) -> List[Dict[str, Any]]:
+        """Catalogue categories with their fund counts"""
+        return self._service.get_catalogue_categories()
+
+    def search_funds(self, query: str, limit: Optional[int] = 20) -> List[Dict[str, Any]]:
+        """Search mutual funds by name, category or fund house, best matches first"""
+        return self._service.search_funds(query, limit)
+
+    async def calculate_portfolio_value(self, holdings: List[Any]) -> Dict[str, Any]:
+        """Calculate total portfolio value and returns"""
+        portfolio = (await self.value_portfolios([{"holdings": holdings}]))[0]
+        return {"holdings": portfolio["holdings"], "summary": portfolio["summary"]}
+
+    async def value_portfolios(
+        self,
+        portfolios: Iterable[Any],
+        as_of: Optional[date] = None,
+        include_holdings: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Value many portfolios, quoting each distinct fund once; the array work runs on the fetch pool"""
+        with operation("portfolio_valuation"):
+            with stage("portfolio_book"):
+                book = await self._run(PortfolioBook, portfolios)
+            fund_infos = await self.get_fund_infos(book.symbols)
+            with stage("valuation"):
+                return await self._run(value_portfolios, book, fund_infos, as_of, include_holdings)
+
+    def shutdown(self):
+        """Stop the fetch pool and shared-tier readers without waiting for in-flight calls"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._cache_executor is not None:
+            self._cache_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Singleton instance
+async_mutual_fund_service = AsyncMutualFundService(mutual_fund_service)
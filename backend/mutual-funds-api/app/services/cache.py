@@ -0,0 +1,506 @@
+"""
+Cache components for fund data
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.config import (
+    CACHE_TTL,
+    HISTORY_CACHE_TTL,
+    METADATA_CACHE_TTL,
+    CACHE_MAX_ENTRIES,
+    CACHE_MAX_BYTES,
+    CACHE_BACKEND,
+    SHARED_CACHE_LOCAL_ENTRIES,
+    DATA_DIR,
+    STALE_TTL,
+)
+
+try:
+    import orjson
+except ImportError:  # Optional; shared-tier values are encoded with the standard library without it
+    orjson = None
+
+
+@dataclass
+class CacheEntry:
+    """A cached value with its expiry time and approximate size"""
+    value: Any
+    expires_at: float
+    size: int = 0
+
+
+def approximate_size(value: Any) -> int:
+    """Approximate deep size in bytes of JSON-like data (dicts, lists, scalars)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class Cache(ABC):
+    """Interface for fund data caches.
+
+    get() returns only fresh values; get_stale() also returns expired
+    values that are still held (optionally no more than max_stale seconds
+    past expiry), for callers that prefer old data to none. peek() reads
+    any held value without counting as a hit or refreshing LRU order.
+    snapshot() and restore() carry in-process entries across a restart.
+    """
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def get_stale(self, key: Hashable, max_stale: Optional[float] = None) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def peek(self, key: Hashable) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def snapshot(self) -> List[Tuple[Hashable, CacheEntry]]:
+        """Entries held in this process, least recently used first"""
+        return []
+
+    def restore(self, entries: Iterable[Tuple[Hashable, CacheEntry]]) -> int:
+        """Load snapshot entries, keeping their expiry; returns how many were loaded"""
+        return 0
+
+
+class TTLCache(Cache):
+    """In-process LRU cache with per-entry TTL and an entry and/or byte budget.
+
+    Expired entries are kept (so they can be served stale) until they are
+    overwritten or pushed out by LRU eviction.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = approximate_size,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries or None
+        self.max_bytes = max_bytes or None
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.time():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def get_stale(self, key: Hashable, max_stale: Optional[float] = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            if max_stale is not None and now - entry.expires_at > max_stale:
+                return None
+            self._entries.move_to_end(key)
+            if entry.expires_at <= now:
+                self.stale_hits += 1
+            return entry.value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        return None if entry is None else entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        size = self._sizeof(value) if self.max_bytes else 0
+        entry = CacheEntry(value, time.time() + (self.ttl if ttl is None else ttl), size)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until within budget"""
+        while self._entries and (
+            (self.max_entries and len(self._entries) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes if self.max_bytes else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+        }
+
+    def snapshot(self) -> List[Tuple[Hashable, CacheEntry]]:
+        with self._lock:
+            return list(self._entries.items())
+
+    def restore(self, entries: Iterable[Tuple[Hashable, CacheEntry]]) -> int:
+        now = time.time()
+        count = 0
+        for key, entry in entries:
+            # Expired entries are restored too; they can still be served stale
+            self.set(key, entry.value, entry.expires_at - now)
+            count += 1
+        return count
+
+
+def _encode(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(data: bytes) -> Any:
+    # orjson.JSONDecodeError subclasses ValueError, like json's
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class SharedCache(Cache):
+    """Cache in a SQLite database (WAL mode) that every worker process on the host reads and writes.
+
+    Values are stored as JSON and keyed by repr(key), so values must be
+    JSON-shaped (dicts, lists, strings, numbers) and keys built from
+    strings and numbers. Unlike a pickle, a row written by another user
+    of the database cannot run code in the workers reading it; rows that
+    do not decode read as misses. Expired rows are kept for
+    stale_retention seconds (by default as long as they may be served
+    stale), then pruned as new values are written.
+    """
+
+    _PRUNE_EVERY = 256  # Writes between prunes of long-expired rows
+    # Seconds to wait on another process's write lock; a locked database reads as a miss (and a
+    # write is dropped) rather than holding a thread for long
+    _BUSY_TIMEOUT = 0.1
+
+    def __init__(self, name: str, path: str, ttl: float, stale_retention: Optional[float] = None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.name = name
+        self.path = path
+        self.ttl = ttl
+        self.stale_retention = max(ttl, STALE_TTL) if stale_retention is None else stale_retention
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per process; a connection must not be used across a fork
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=self._BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " cache TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (cache, key)) WITHOUT ROWID"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        """Run a statement, treating a database error as an empty result"""
+        try:
+            with self._lock:
+                return self._connection().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Error in shared cache {self.name}: {e}")
+            return []
+
+    def entry(self, key: Hashable, max_stale: Optional[float] = None) -> Optional[CacheEntry]:
+        """The held entry for a key, if it expired no more than max_stale seconds ago"""
+        rows = self._execute(
+            "SELECT value, expires_at FROM cache_entries WHERE cache = ? AND key = ?", (self.name, repr(key))
+        )
+        if not rows:
+            return None
+        value, expires_at = rows[0]
+        if max_stale is not None and time.time() - expires_at > max_stale:
+            return None
+        try:
+            return CacheEntry(_decode(value), expires_at)
+        except ValueError as e:
+            self.errors += 1
+            print(f"Error decoding shared cache {self.name} entry {key!r}: {e}")
+            return None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entry(key, max_stale=0)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.value
+
+    def get_stale(self, key: Hashable, max_stale: Optional[float] = None) -> Optional[Any]:
+        entry = self.entry(key, max_stale)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self.stale_hits += 1
+        return entry.value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        entry = self.entry(key)
+        return None if entry is None else entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self.set_entry(key, CacheEntry(value, time.time() + (self.ttl if ttl is None else ttl)))
+
+    def set_entry(self, key: Hashable, entry: CacheEntry):
+        try:
+            value = _encode(entry.value)
+        except TypeError as e:
+            self.errors += 1
+            print(f"Error encoding shared cache {self.name} entry {key!r}: {e}")
+            return
+        self._execute(
+            "INSERT OR REPLACE INTO cache_entries (cache, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.name, repr(key), value, entry.expires_at),
+        )
+        self._writes += 1
+        if self._writes % self._PRUNE_EVERY == 0:
+            self._execute(
+                "DELETE FROM cache_entries WHERE cache = ? AND expires_at < ?",
+                (self.name, time.time() - self.stale_retention),
+            )
+
+    def delete(self, key: Hashable):
+        self._execute("DELETE FROM cache_entries WHERE cache = ? AND key = ?", (self.name, repr(key)))
+
+    def clear(self):
+        self._execute("DELETE FROM cache_entries WHERE cache = ?", (self.name,))
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._execute("SELECT COUNT(*) FROM cache_entries WHERE cache = ?", (self.name,))
+        return {
+            "entries": rows[0][0] if rows else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "errors": self.errors,
+        }
+
+
+_shared_writer: Optional[ThreadPoolExecutor] = None
+_shared_writer_lock = threading.Lock()
+
+
+def _write_behind(func: Callable[..., Any], *args: Any):
+    """Run a shared-tier write on the one writer thread, in submission order"""
+    global _shared_writer
+    with _shared_writer_lock:
+        if _shared_writer is None:
+            _shared_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-cache-write")
+    _shared_writer.submit(func, *args)
+
+
+def flush_shared_writes():
+    """Wait until every shared-tier write submitted so far has been made"""
+    if _shared_writer is not None:
+        _shared_writer.submit(lambda: None).result()
+
+
+class TieredCache(Cache):
+    """In-process cache in front of a cache shared by all worker processes.
+
+    Reads try the local tier first and fall through to the shared tier,
+    copying what they find into the local tier with the same expiry, so
+    every worker agrees on when a value goes stale. Writes go to the local
+    tier at once and to the shared tier from a writer thread, so a value
+    fetched by one worker serves all of them without the writer waiting
+    on the database. peek() reads the local tier only, as it is used to
+    order whole listings.
+
+    Falling through blocks on the shared database; async callers try
+    local.get() on the event loop and run fall_through() off it.
+    """
+
+    def __init__(self, local: TTLCache, shared: SharedCache):
+        self.name = local.name
+        self.local = local
+        self.shared = shared
+
+    def _from_shared(self, key: Hashable, max_stale: Optional[float]) -> Optional[CacheEntry]:
+        entry = self.shared.entry(key, max_stale)
+        if entry is not None:
+            self.local.set(key, entry.value, entry.expires_at - time.time())
+        return entry
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        entry = self._from_shared(key, 0)
+        if entry is None:
+            self.shared.misses += 1
+            return None
+        self.shared.hits += 1
+        return entry.value
+
+    def get_stale(self, key: Hashable, max_stale: Optional[float] = None) -> Optional[Any]:
+        value = self.local.get_stale(key, max_stale)
+        if value is not None:
+            return value
+        entry = self._from_shared(key, max_stale)
+        return None if entry is None else entry.value
+
+    def fall_through(self, key: Hashable, max_stale: Optional[float] = None) -> Tuple[Optional[Any], Optional[Any]]:
+        """(fresh, stale) value of a key the local tier has no fresh value for, read from the shared tier.
+
+        fresh is set if another worker stored a current value; otherwise
+        stale is the locally held or shared value expired no more than
+        max_stale seconds ago, if there is one.
+        """
+        entry = self._from_shared(key, max_stale)
+        if entry is not None and entry.expires_at > time.time():
+            self.shared.hits += 1
+            return entry.value, None
+        self.shared.misses += 1
+        stale = self.local.get_stale(key, max_stale)
+        if stale is None and entry is not None:
+            stale = entry.value
+        return None, stale
+
+    def pull(self, key: Hashable) -> Optional[Any]:
+        """Fresh value in the shared tier, copied over whatever the local tier holds"""
+        entry = self._from_shared(key, 0)
+        return None if entry is None else entry.value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        return self.local.peek(key)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.local.ttl if ttl is None else ttl)
+        self.local.set(key, value, ttl)
+        _write_behind(self.shared.set_entry, key, CacheEntry(value, expires_at))
+
+    # Through the writer thread too, so they are not undone by writes submitted before them
+    def delete(self, key: Hashable):
+        self.local.delete(key)
+        _write_behind(self.shared.delete, key)
+
+    def clear(self):
+        self.local.clear()
+        _write_behind(self.shared.clear)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.local.stats(), "shared": self.shared.stats()}
+
+    def snapshot(self) -> List[Tuple[Hashable, CacheEntry]]:
+        # The shared tier outlives restarts already
+        return self.local.snapshot()
+
+    def restore(self, entries: Iterable[Tuple[Hashable, CacheEntry]]) -> int:
+        return self.local.restore(entries)
+
+
+# Derived from cached history and cheap to rebuild, so kept in process even with a shared tier
+LOCAL_ONLY = ("analytics", "charts")
+
+
+def build_default_caches(stale_retention: float = STALE_TTL) -> Dict[str, Cache]:
+    """Quote, history, metadata, analytics and chart caches configured from app settings.
+
+    A shared tier keeps expired rows for stale_retention seconds, so they
+    can still be served stale while they are refreshed.
+    """
+    ttls = {
+        "quotes": CACHE_TTL,
+        "history": HISTORY_CACHE_TTL,
+        "metadata": METADATA_CACHE_TTL,
+        # Keyed by the series' last date, so entries only need expiring to bound memory
+        "analytics": METADATA_CACHE_TTL,
+        "charts": METADATA_CACHE_TTL,
+    }
+    if CACHE_BACKEND != "shared":
+        return {name: TTLCache(name, ttl, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES) for name, ttl in ttls.items()}
+
+    # Each worker keeps only a small hot set; the shared tier holds the rest once per host
+    path = os.path.join(DATA_DIR, "shared_cache.sqlite3")
+    caches: Dict[str, Cache] = {
+        name: TieredCache(
+            TTLCache(name, ttl, SHARED_CACHE_LOCAL_ENTRIES, CACHE_MAX_BYTES),
+            SharedCache(name, path, ttl, stale_retention),
+        )
+        for name, ttl in ttls.items()
+        if name not in LOCAL_ONLY
+    }
+    caches.update(
+        (name, TTLCache(name, ttls[name], CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)) for name in LOCAL_ONLY
+    )
+    return caches
@@ -0,0 +1,273 @@
+"""
+Fund catalogue - compact scheme records loaded from a master file and reloaded when it changes
+"""
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .search_index import SearchIndex
+
+NUMERIC_FIELDS = ("fallback_nav", "one_year_return", "three_year_return", "five_year_return")
+
+# Catalogue fields funds can be listed in order of, without fetching quotes
+RECORD_SORT_FIELDS = ("name", "one_year_return", "three_year_return", "five_year_return")
+
+CATEGORY_DESCRIPTIONS = {
+    "Large Cap": "Invest in top 100 companies by market cap",
+    "Mid Cap": "Invest in 101-250 companies by market cap",
+    "Small Cap": "Invest in companies beyond top 250",
+    "Flexi Cap": "Flexible allocation across market caps",
+    "ELSS": "Tax saving funds with 3-year lock-in",
+    "Index Fund": "Track market indices like Nifty 50",
+}
+
+_TRUE_VALUES = {"1", "true", "yes", "y"}
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Share one string object per distinct category/family across all records"""
+    return sys.intern(value.strip()) if value else None
+
+
+def _float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def slugify(name: str) -> str:
+    """URL-friendly id of a category name ("Large Cap" -> "large-cap")"""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def _flag(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in _TRUE_VALUES
+    return bool(value)
+
+
+class FundRecord:
+    """One catalogue fund, stored without a per-instance dict"""
+
+    __slots__ = ("symbol", "name", "category", "family") + NUMERIC_FIELDS + ("popular",)
+
+    def __init__(
+        self,
+        symbol: str,
+        name: str,
+        category: Optional[str] = None,
+        family: Optional[str] = None,
+        fallback_nav: Optional[float] = None,
+        one_year_return: Optional[float] = None,
+        three_year_return: Optional[float] = None,
+        five_year_return: Optional[float] = None,
+        popular: bool = True,
+    ):
+        self.symbol = symbol
+        self.name = name
+        self.category = _intern(category)
+        self.family = _intern(family)
+        self.fallback_nav = fallback_nav
+        self.one_year_return = one_year_return
+        self.three_year_return = three_year_return
+        self.five_year_return = five_year_return
+        self.popular = popular
+
+    def get(self, field: str, default: Any = None) -> Any:
+        """Dict-style field access, so records read like the preset dicts they replace"""
+        value = getattr(self, field, None)
+        return default if value is None else value
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any], popular: bool = True) -> "FundRecord":
+        """Record from a master-file row, converting numeric and flag columns"""
+        return cls(
+            symbol=row["symbol"].strip(),
+            name=row.get("name") or row["symbol"],
+            category=row.get("category"),
+            family=row.get("family"),
+            popular=_flag(row["popular"]) if "popular" in row else popular,
+            **{field: _float(row.get(field)) for field in NUMERIC_FIELDS},
+        )
+
+
+def read_rows(path: str) -> List[Dict[str, Any]]:
+    """Rows of a CSV file, a JSON list of objects, or a JSON object keyed by symbol"""
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return [{"symbol": symbol, **fields} for symbol, fields in data.items()]
+        return data
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+class Catalogue:
+    """Fund records by symbol, with the indexes built over them.
+
+    Funds flagged popular make up the default fund list; a master file
+    without a popular column lists every fund. Category and family
+    indexes list every fund in them, in file order. A catalogue is never
+    modified after it is built; a reload builds a new one.
+    """
+
+    def __init__(self, records: Iterable[FundRecord]):
+        self._records: Dict[str, FundRecord] = {record.symbol: record for record in records}
+        self._popular: List[str] = []
+        self._by_category: Dict[str, List[str]] = {}
+        self._by_family: Dict[str, List[str]] = {}
+        for symbol, record in self._records.items():
+            if record.popular:
+                self._popular.append(symbol)
+            if record.category:
+                self._by_category.setdefault(record.category, []).append(symbol)
+            if record.family:
+                self._by_family.setdefault(record.family, []).append(symbol)
+        self._category_ids = {slugify(category): category for category in self._by_category}
+        self._orders: Dict[Tuple[Optional[str], Optional[str], str, bool], List[str]] = {}
+        self.search_index = SearchIndex(self._records)
+
+    @classmethod
+    def from_mapping(cls, entries: Mapping[str, Mapping[str, Any]]) -> "Catalogue":
+        return cls(FundRecord.from_row({"symbol": symbol, **fields}) for symbol, fields in entries.items())
+
+    @classmethod
+    def from_file(cls, path: str) -> "Catalogue":
+        return cls(FundRecord.from_row(row) for row in read_rows(path) if row.get("symbol"))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._records
+
+    def get(self, symbol: str) -> Optional[FundRecord]:
+        return self._records.get(symbol)
+
+    def symbols(self, category: Optional[str] = None, family: Optional[str] = None) -> List[str]:
+        """Symbols of the funds in a category and/or family, or the popular funds if neither is given.
+
+        category may be a category name or its id. The returned list is
+        shared; callers must not modify it.
+        """
+        category = self._category_ids.get(category, category)
+        if category and family:
+            in_family = set(self._by_family.get(family, ()))
+            return [symbol for symbol in self._by_category.get(category, ()) if symbol in in_family]
+        if category:
+            return self._by_category.get(category, [])
+        if family:
+            return self._by_family.get(family, [])
+        return self._popular
+
+    def sorted_symbols(
+        self,
+        category: Optional[str],
+        family: Optional[str],
+        field: str,
+        descending: bool = False,
+    ) -> List[str]:
+        """symbols() ordered by a record field, funds without a value last; computed once per catalogue"""
+        category = self._category_ids.get(category, category)
+        if (category and category not in self._by_category) or (family and family not in self._by_family):
+            return []
+        key = (category, family, field, descending)
+        order = self._orders.get(key)
+        if order is None:
+            order = sort_symbols(self.symbols(category, family), lambda symbol: self._records[symbol].get(field), descending)
+            self._orders[key] = order
+        return order
+
+    def categories(self) -> List[Dict[str, Any]]:
+        """Categories with their fund counts, in order of first appearance"""
+        return [
+            {
+                "id": slugify(category),
+                "name": category,
+                "description": CATEGORY_DESCRIPTIONS.get(category),
+                "count": len(symbols),
+            }
+            for category, symbols in self._by_category.items()
+        ]
+
+
+def sort_symbols(symbols: Iterable[str], value: Any, descending: bool = False) -> List[str]:
+    """Symbols ordered by value(symbol), with symbols whose value is None last"""
+    keyed = [(value(symbol), symbol) for symbol in symbols]
+    present = [item for item in keyed if item[0] is not None]
+    present.sort(key=lambda item: item[0], reverse=descending)
+    return [symbol for _, symbol in present] + [symbol for value, symbol in keyed if value is None]
+
+
+class CatalogueLoader:
+    """The current catalogue: built-in funds, or a master file reloaded when it changes.
+
+    The file's modification time is checked at most once per
+    check_interval. A changed file is loaded on a background thread
+    while the previous catalogue keeps serving; a file that fails to load
+    leaves the previous catalogue in place.
+    """
+
+    def __init__(self, path: Optional[str], builtin: Mapping[str, Mapping[str, Any]], check_interval: float):
+        self.path = path
+        self.check_interval = check_interval
+        self.loaded_at = time.time()
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._checked_at = time.monotonic()
+        self._mtime = None
+        if path:
+            self._mtime = os.path.getmtime(path)
+            self._catalogue = Catalogue.from_file(path)
+        else:
+            self._catalogue = Catalogue.from_mapping(builtin)
+
+    def current(self) -> Catalogue:
+        """The loaded catalogue, starting a reload if the master file has changed"""
+        if self.path and time.monotonic() - self._checked_at >= self.check_interval:
+            self._check()
+        return self._catalogue
+
+    def _check(self):
+        with self._lock:
+            if self._reloading:
+                return
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError as e:
+                print(f"Error checking fund catalogue {self.path}: {e}")
+                return
+            if mtime == self._mtime:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(mtime,), name="catalogue-reload", daemon=True).start()
+
+    def _reload(self, mtime: float):
+        try:
+            catalogue = Catalogue.from_file(self.path)
+        except Exception as e:
+            print(f"Error reloading fund catalogue {self.path}: {e}")
+            catalogue = None
+        with self._lock:
+            # Remember the mtime even on failure, so a broken file is not retried until it changes again
+            self._mtime = mtime
+            if catalogue is not None:
+                self._catalogue = catalogue
+                self.loaded_at = time.time()
+            self._reloading = False
+
+    def stats(self) -> Dict[str, Any]:
+        catalogue = self._catalogue
+        return {
+            "source": self.path or "builtin",
+            "funds": len(catalogue),
+            "popular": len(catalogue.symbols()),
+            "loaded_at": self.loaded_at,
+        }
@@ -0,0 +1,196 @@
+"""
+Circuit breaker for upstream Yahoo Finance calls
+"""
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit is open"""
+
+
+class UpstreamNoDataError(Exception):
+    """Raised when a bulk upstream call returned no data for any of its symbols.
+
+    yfinance reports each ticker's failure only as an empty column, so a
+    bulk result empty for every fund is how a failing upstream shows.
+    """
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """Whether an upstream error is a rate-limit response"""
+    message = str(error)
+    return "429" in message or "Too Many Requests" in message
+
+
+# Error type names of timeouts and network failures across requests, curl_cffi and the standard library
+_TRANSPORT_ERROR_NAMES = ("Timeout", "Connection", "Network", "Curl", "SSLError", "ProxyError")
+# A 5xx status in an error message ("HTTP Error 503", "500 Server Error: ..."), not any number in a fund name
+_SERVER_ERROR = re.compile(r"\bHTTP\D{0,12}5\d\d\b|\b5\d\d (?:Server Error|Service Unavailable|Bad Gateway|Gateway)",
+                           re.IGNORECASE)
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Whether an error says the upstream is unhealthy: rate limiting, a 5xx, a timeout or a network failure.
+
+    Errors about the request itself, such as an unknown symbol, a period
+    with no data or a malformed response for one fund, are not.
+    """
+    if is_rate_limit(error) or isinstance(error, (TimeoutError, ConnectionError, UpstreamNoDataError)):
+        return True
+    if any(name in type(error).__name__ for name in _TRANSPORT_ERROR_NAMES):
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status >= 500
+    return _SERVER_ERROR.search(str(error)) is not None
+
+
+class CircuitBreaker:
+    """Closed, open and half-open upstream circuit.
+
+    While closed, calls go upstream and their outcomes are kept for a
+    rolling window. The circuit opens when, within the window, at least
+    min_calls calls were made and the error rate reaches error_threshold,
+    or at once on a rate-limit error. Only errors that show the upstream
+    is unhealthy count as failures; an upstream that answered "no such
+    fund" is working, so such errors are recorded as successes. While open, calls are refused for a
+    backoff that doubles each time the circuit re-opens without
+    recovering (up to max_backoff), with random jitter so that processes
+    do not all retry together. After the backoff the circuit is half-open:
+    one probe call is let through; success closes the circuit and resets
+    the backoff, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float,
+        min_calls: int,
+        error_threshold: float,
+        base_backoff: float,
+        max_backoff: float,
+        jitter: float = 0.2,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[float, bool]] = deque()  # (time, failed)
+        self._state = CLOSED
+        self._open_until = 0.0
+        self._reopens = 0  # Consecutive openings without recovering
+        self._probe_started: Optional[float] = None
+        self.opened = 0
+        self.refused = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() >= self._open_until:
+            self._state = HALF_OPEN
+            self._probe_started = None
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; a caller that is allowed must record its outcome"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN:
+                now = self._clock()
+                # One probe at a time; a probe that never reported back is replaced after a window
+                if self._probe_started is None or now - self._probe_started > self.window:
+                    self._probe_started = now
+                    return True
+            self.refused += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                self._state = CLOSED
+                self._reopens = 0
+                self._outcomes.clear()
+                print(f"Circuit {self.name} closed: upstream recovered")
+                return
+            self._record(False)
+
+    def record_failure(self, error: Optional[Exception] = None):
+        if error is not None and not is_upstream_failure(error):
+            # The upstream answered; the request was at fault, and one client must not open the circuit for all
+            self.record_success()
+            return
+        with self._lock:
+            if error is not None:
+                self.last_error = str(error)[:200]
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._trip("probe failed")
+            elif state == CLOSED:
+                self._record(True)
+                if error is not None and is_rate_limit(error):
+                    self._trip("rate limited")
+                elif self._should_trip():
+                    self._trip("error rate too high")
+
+    def _record(self, failed: bool):
+        self._outcomes.append((self._clock(), failed))
+        self._prune()
+
+    def _prune(self):
+        """Drop outcomes older than the rolling window"""
+        now = self._clock()
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(failed for _, failed in self._outcomes) / len(self._outcomes)
+
+    def _should_trip(self) -> bool:
+        return len(self._outcomes) >= self.min_calls and self._error_rate() >= self.error_threshold
+
+    def _trip(self, reason: str):
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** self._reopens)
+        backoff *= 1 + random.uniform(-self.jitter, self.jitter)
+        self._state = OPEN
+        self._open_until = self._clock() + backoff
+        self._reopens += 1
+        self._probe_started = None
+        self.opened += 1
+        print(f"Circuit {self.name} open for {backoff:.1f}s: {reason}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            self._prune()
+            return {
+                "state": state,
+                "retry_in": round(max(0.0, self._open_until - self._clock()), 1) if state == OPEN else None,
+                "window_calls": len(self._outcomes),
+                "error_rate": round(self._error_rate(), 3),
+                "opened": self.opened,
+                "refused": self.refused,
+                "last_error": self.last_error,
+            }
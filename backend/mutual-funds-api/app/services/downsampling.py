@@ -0,0 +1,117 @@
+"""
+NAV history downsampling - fewer points for charts, by shape-preserving selection or calendar aggregation
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+# Calendar buckets a series can be aggregated into, with yfinance's interval names
+INTERVALS = ("1wk", "1mo")
+
+# Fewest points LTTB can return: the first and last point and one bucket between them
+MIN_POINTS = 3
+# Most points a chart may ask for; a 5y daily series has about 1,250
+MAX_POINTS = 5000
+
+
+def _day_numbers(dates: list) -> np.ndarray:
+    return np.array(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Positions of the points Largest-Triangle-Three-Buckets keeps to draw y over x with `points` points.
+
+    The first and last points are always kept. The points between are split
+    into points - 2 buckets, and from each bucket the point forming the
+    largest triangle with the point kept from the previous bucket and the
+    mean of the next bucket is kept. Bucket candidates and next-bucket
+    means are laid out as arrays up front; only the choice per bucket,
+    which depends on the previous one, is made bucket by bucket.
+    """
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points < MIN_POINTS:
+        return np.array([0, n - 1])
+
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    sizes = ends - starts
+    # (buckets x widest bucket) positions of each bucket's candidates; short buckets repeat their last one
+    candidates = starts[:, None] + np.minimum(np.arange(sizes.max()), sizes[:, None] - 1)
+    cand_x, cand_y = x[candidates], y[candidates]
+
+    # Mean of the following bucket; for the last bucket, the last point
+    next_starts = np.append(starts[1:], n - 1)
+    next_ends = np.append(ends[1:], n)
+    sum_x = np.concatenate(([0.0], np.cumsum(x, dtype=float)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y, dtype=float)))
+    counts = next_ends - next_starts
+    mean_x = (sum_x[next_ends] - sum_x[next_starts]) / counts
+    mean_y = (sum_y[next_ends] - sum_y[next_starts]) / counts
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    kept = 0
+    for bucket in range(len(starts)):
+        ax, ay = x[kept], y[kept]
+        # Twice the triangle area; the factor does not change which point is largest
+        areas = np.abs((ax - mean_x[bucket]) * (cand_y[bucket] - ay) - (ax - cand_x[bucket]) * (mean_y[bucket] - ay))
+        kept = candidates[bucket, areas.argmax()]
+        selected[bucket + 1] = kept
+    return selected
+
+
+def lttb(columns: Dict[str, list], points: int) -> Dict[str, list]:
+    """Columnar history reduced to at most `points` points that keep the shape of the NAV line"""
+    if len(columns["dates"]) <= points:
+        return columns
+    nav = np.asarray(columns["nav"], dtype=float)
+    keep = lttb_indices(_day_numbers(columns["dates"]).astype(float), nav, points)
+    dates = np.asarray(columns["dates"], dtype=object)
+    return {"dates": dates[keep].tolist(), "nav": nav[keep].tolist()}
+
+
+def resample_ohlc(columns: Dict[str, list], interval: str) -> Dict[str, list]:
+    """Columnar history aggregated per calendar week or month.
+
+    Each bucket is dated by its last trading day and carries the open,
+    high, low and closing NAV; nav is the close, so the result still
+    reads as a NAV series.
+    """
+    if not columns["dates"]:
+        return {"dates": [], "nav": [], "open": [], "high": [], "low": []}
+    days = _day_numbers(columns["dates"])
+    if interval == "1wk":
+        # Day 0 (1970-01-01) was a Thursday; shift so weeks run Monday to Sunday
+        buckets = (days + 3) // 7
+    elif interval == "1mo":
+        buckets = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    else:
+        raise ValueError(f"Unknown interval {interval!r}; use one of {', '.join(INTERVALS)}")
+
+    nav = np.asarray(columns["nav"], dtype=float)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    lasts = np.r_[starts[1:], len(nav)] - 1
+    dates = np.asarray(columns["dates"], dtype=object)
+    return {
+        "dates": dates[lasts].tolist(),
+        "nav": nav[lasts].tolist(),
+        "open": nav[starts].tolist(),
+        "high": np.maximum.reduceat(nav, starts).tolist(),
+        "low": np.minimum.reduceat(nav, starts).tolist(),
+    }
+
+
+def downsample(columns: Dict[str, list], points: Optional[int] = None, interval: Optional[str] = None) -> Dict[str, list]:
+    """Columnar history aggregated to an interval, and/or reduced to at most `points` points"""
+    if interval is not None:
+        columns = resample_ohlc(columns, interval)
+        if points is not None and len(columns["dates"]) > points:
+            # Keep the buckets LTTB picks from the closing line, with their OHLC values
+            keep = lttb_indices(_day_numbers(columns["dates"]).astype(float), np.asarray(columns["nav"]), points)
+            columns = {name: [values[i] for i in keep] for name, values in columns.items()}
+        return columns
+    if points is not None:
+        return lttb(columns, points)
+    return columns
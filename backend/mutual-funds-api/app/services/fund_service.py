@@ -1,15 +1,45 @@
 """
 Mutual Fund Service - Fetches data from Yahoo Finance
 """
-import yfinance as yf
-import pandas as pd
-from typing import Optional, List, Dict, Any
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from functools import lru_cache
-import time
-import random
+import os
 
-# Popular Indian Mutual Funds with their Yahoo Finance symbols and fallback NAV data
+from app.config import (
+    HISTORY_STORE_ENABLED,
+    HISTORY_CACHE_TTL,
+    DATA_DIR,
+    RISK_FREE_RATE,
+    CATALOGUE_PATH,
+    CATALOGUE_RELOAD_INTERVAL,
+    LISTING_ORDER_TTL,
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_ERROR_THRESHOLD,
+    BREAKER_BASE_BACKOFF,
+    BREAKER_MAX_BACKOFF,
+    STALE_TTL,
+)
+from app.lazy import lazy_import
+from app.metrics import FALLBACK_SERVED
+from .analytics import compute_analytics, trailing_returns
+from .downsampling import downsample
+from .cache import Cache, TTLCache, build_default_caches
+from .catalogue import Catalogue, CatalogueLoader, RECORD_SORT_FIELDS, sort_symbols
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, UpstreamNoDataError
+from .history_store import HistoryStore, FULL_HISTORY_PERIOD
+from .providers import DataProvider, OfflineProvider, build_providers
+from .rate_limiter import TokenBucket, build_upstream_bucket
+from .serialization import closes_to_columns, empty_history, format_history
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+# Popular Indian Mutual Funds with their Yahoo Finance symbols and fallback NAV data;
+# the built-in catalogue when CATALOGUE_PATH is not set
 POPULAR_INDIAN_MF = {
     # Large Cap
     "0P0000XVHO.BO": {"name": "HDFC Top 100 Fund", "category": "Large Cap", "family": "HDFC Mutual Fund", "fallback_nav": 982.45, "one_year_return": 18.5, "three_year_return": 14.2, "five_year_return": 16.8},
@@ -43,65 +73,108 @@ POPULAR_INDIAN_MF = {
     "0P0001BBZQ.BO": {"name": "HDFC Index Nifty 50 Fund", "category": "Index Fund", "family": "HDFC Mutual Fund", "fallback_nav": 198.23, "one_year_return": 14.5, "three_year_return": 12.1, "five_year_return": 13.8},
 }
 
+# Slow-changing Yahoo Finance info fields kept to enrich bulk-download quotes
+METADATA_FIELDS = (
+    "longName", "shortName", "fundFamily", "category", "annualReportExpenseRatio",
+    "totalAssets", "currency", "ytdReturn", "threeYearAverageReturn", "fiveYearAverageReturn",
+)
+
+# History window fetched for bulk quotes; enough to find the last two closes over holidays
+BATCH_QUOTE_PERIOD = "5d"
+
+# Quote fields funds can be listed in order of, using the last cached quotes
+QUOTE_SORT_FIELDS = ("nav", "day_change", "day_change_percent")
+
 
 class MutualFundService:
-    """Service for fetching mutual fund data from Yahoo Finance"""
+    """Service for fetching mutual fund data from Yahoo Finance.
+
+    Holds the caches, history store, upstream budget, circuit breaker and
+    catalogue, and the blocking fetch and build steps. Upstream calls are
+    driven by AsyncMutualFundService, the one implementation of caching,
+    coalescing and rate limiting around them.
+    """
     
-    def __init__(self):
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        self._cache_ttl = 300  # 5 minutes
-        self._last_api_call = 0
-        self._api_call_delay = 0.5  # 500ms between API calls to avoid rate limiting
-        self._use_fallback = False  # Set to True if rate limited
+    def __init__(
+        self,
+        caches: Optional[Dict[str, Cache]] = None,
+        history_store: Optional[HistoryStore] = None,
+        catalogue: Optional[CatalogueLoader] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        bucket: Optional[TokenBucket] = None,
+        provider: Optional[DataProvider] = None
+    ):
+        # Expired entries are kept as long as the async facade may serve them while refreshing
+        caches = caches or build_default_caches(STALE_TTL)
+        self._quotes = caches["quotes"]  # symbol -> fund info
+        self._history = caches["history"]  # (symbol, period) -> {"dates": [...], "nav": [...]}
+        self._metadata = caches["metadata"]  # symbol -> slow-changing Yahoo info fields
+        self._analytics = caches["analytics"]  # (symbol, period, last date, window) -> analytics
+        self._charts = caches["charts"]  # (symbol, period, last date, points, interval) -> downsampled history
+        if history_store is None and HISTORY_STORE_ENABLED:
+            history_store = HistoryStore(os.path.join(DATA_DIR, "nav_history.sqlite3"), HISTORY_CACHE_TTL)
+        self._store = history_store  # Persistent NAV history, extended incrementally
+        self._bucket = bucket or build_upstream_bucket()  # Upstream call budget, shared by all worker processes
+        if breaker is None:
+            breaker = CircuitBreaker(
+                "yahoo", BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_THRESHOLD,
+                BREAKER_BASE_BACKOFF, BREAKER_MAX_BACKOFF
+            )
+        self._breaker = breaker  # Stops upstream calls while Yahoo Finance is failing or rate limiting
+        if catalogue is None:
+            catalogue = CatalogueLoader(CATALOGUE_PATH or None, POPULAR_INDIAN_MF, CATALOGUE_RELOAD_INTERVAL)
+        self._catalogue = catalogue  # Fund records and their search index
+        # (category, family, field, descending) -> (catalogue, symbols ordered by a cached quote field)
+        self._quote_orders = TTLCache("quote_orders", LISTING_ORDER_TTL, max_entries=256)
+        providers = build_providers(lambda symbol: self._catalogue.current().get(symbol))
+        self._provider = provider or providers["primary"]  # Source of quotes and history
+        self._offline = providers["fallback"]  # Deterministic data served when the provider is unavailable
     
-    def _get_cache_key(self, symbol: str) -> str:
-        return f"mf_{symbol}"
+    def catalogue_stats(self) -> Dict[str, Any]:
+        """Source and size of the loaded fund catalogue"""
+        return self._catalogue.stats()
     
-    def _is_cache_valid(self, key: str) -> bool:
-        if key not in self._cache:
-            return False
-        cache_time = self._cache[key].get("timestamp", 0)
-        return (time.time() - cache_time) < self._cache_ttl
+    def upstream_stats(self) -> Dict[str, Any]:
+        """Data provider and upstream circuit breaker state"""
+        return {"provider": self._provider.name, **self._breaker.stats()}
     
-    def _set_cache(self, key: str, data: Any):
-        self._cache[key] = {
-            "data": data,
-            "timestamp": time.time()
+    def caches(self) -> Dict[str, Cache]:
+        """The service's caches by name"""
+        return {
+            "quotes": self._quotes,
+            "history": self._history,
+            "metadata": self._metadata,
+            "analytics": self._analytics,
+            "charts": self._charts,
         }
     
-    def _get_cache(self, key: str) -> Optional[Any]:
-        if self._is_cache_valid(key):
-            return self._cache[key]["data"]
-        return None
-    
-    def _rate_limit(self):
-        """Simple rate limiting"""
-        now = time.time()
-        elapsed = now - self._last_api_call
-        if elapsed < self._api_call_delay:
-            time.sleep(self._api_call_delay - elapsed)
-        self._last_api_call = time.time()
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hit/miss/eviction counters for each cache"""
+        return {name: cache.stats() for name, cache in self.caches().items()}
     
     def _get_fallback_data(self, symbol: str) -> Optional[Dict[str, Any]]:
         """Return fallback data when API is unavailable"""
-        preset = POPULAR_INDIAN_MF.get(symbol)
+        preset = self._catalogue.current().get(symbol)
         if not preset:
             return None
         
-        # Add some small random variation to make it look more realistic
-        nav_variation = preset.get("fallback_nav", 100) * (1 + random.uniform(-0.02, 0.02))
-        day_change = random.uniform(-2.0, 2.0)
+        # Offline data is deterministic, so every worker serves the same fallback for a fund
+        FALLBACK_SERVED.inc()
+        info = self._offline.info(symbol)
+        nav = info["regularMarketPrice"]
+        previous_close = info["previousClose"] or nav
+        day_change = nav - previous_close
         
         return {
             "symbol": symbol,
             "name": preset.get("name", symbol),
             "fund_family": preset.get("family"),
             "category": preset.get("category"),
-            "nav": round(nav_variation, 2),
-            "previous_close": round(nav_variation - (nav_variation * day_change / 100), 2),
-            "day_change": round(nav_variation * day_change / 100, 2),
-            "day_change_percent": round(day_change, 2),
-            "expense_ratio": round(random.uniform(0.5, 2.0), 2),
+            "nav": round(nav, 2),
+            "previous_close": round(previous_close, 2),
+            "day_change": round(day_change, 2),
+            "day_change_percent": round(day_change / previous_close * 100, 2) if previous_close else 0.0,
+            "expense_ratio": info.get("annualReportExpenseRatio"),
             "total_assets": None,
             "currency": "INR",
             "ytd_return": round(preset.get("one_year_return", 0) * 0.3, 1),
@@ -111,222 +184,292 @@ class MutualFundService:
             "is_fallback": True  # Flag to indicate this is fallback data
         }
     
-    def get_fund_info(self, symbol: str) -> Optional[Dict[str, Any]]:
-        """Get basic mutual fund information"""
-        cache_key = self._get_cache_key(symbol)
-        cached = self._get_cache(cache_key)
+    def _fetch_info(self, symbol: str) -> Dict[str, Any]:
+        """Blocking upstream call for a ticker's info dict"""
+        return self._provider.info(symbol)
+
+    def _fetch_history(self, symbol: str, period: Optional[str] = None, start: Optional[str] = None) -> "pd.DataFrame":
+        """Blocking upstream call for a ticker's price history, by period or from a start date"""
+        return self._provider.history(symbol, period, start)
+
+    def _fetch_batch_history(
+        self,
+        symbols: List[str],
+        period: Optional[str] = None,
+        start: Optional[str] = None
+    ) -> "pd.DataFrame":
+        """Blocking bulk upstream call for many symbols' closing prices.
+
+        Returns a frame indexed by date with one column of closes per symbol.
+        Raises UpstreamNoDataError when a period has no close for any symbol,
+        which is how per-ticker failures swallowed by yfinance show; a
+        tail update from a start date may legitimately find nothing new.
+        """
+        closes = self._provider.closes(symbols, period, start)
+        if symbols and start is None and self._provider.remote and closes.dropna(how="all").empty:
+            raise UpstreamNoDataError(f"No closes returned for any of {len(symbols)} symbols")
+        return closes
+
+    def _cache_fallback(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Cache and return fallback data for a symbol"""
+        fallback = self._get_fallback_data(symbol)
+        if fallback:
+            self._quotes.set(symbol, fallback)
+        return fallback
+
+    def _get_cached_or_fallback(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Best available data without going upstream: cached (even stale), else fallback"""
+        cached = self._quotes.get_stale(symbol)
         if cached:
             return cached
+        return self._get_fallback_data(symbol)
+
+    def _handle_info_error(self, symbol: str, error: Exception) -> Optional[Dict[str, Any]]:
+        """Serve cached (even stale) or fallback data after an upstream failure"""
+        # Refused calls are expected while the circuit is open; the breaker logs the trip itself
+        if not isinstance(error, CircuitOpenError):
+            print(f"Error fetching fund info for {symbol}: {error}")
+        return self._get_cached_or_fallback(symbol)
+
+    def _handle_batch_error(self, symbols: List[str], error: Exception) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Serve cached (even stale) or fallback data per symbol after a bulk upstream failure"""
+        if not isinstance(error, CircuitOpenError):
+            print(f"Error fetching batch quotes for {len(symbols)} symbols: {error}")
+        return {symbol: self._get_cached_or_fallback(symbol) for symbol in symbols}
+
+    def _build_fund_info(self, symbol: str, info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Build and cache fund data from a Yahoo Finance info dict"""
+        # Check if we got valid data
+        if not info or info.get("regularMarketPrice") is None:
+            return self._cache_fallback(symbol)
         
-        # If we're in fallback mode due to rate limiting, use fallback data
-        if self._use_fallback:
-            fallback = self._get_fallback_data(symbol)
-            if fallback:
-                self._set_cache(cache_key, fallback)
-            return fallback
+        # Get predefined info if available
+        preset = self._catalogue.current().get(symbol) or {}
         
-        try:
-            self._rate_limit()  # Rate limit API calls
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            
-            # Check if we got valid data
-            if not info or info.get("regularMarketPrice") is None:
-                # Try fallback
-                fallback = self._get_fallback_data(symbol)
-                if fallback:
-                    self._set_cache(cache_key, fallback)
-                return fallback
-            
-            # Get predefined info if available
-            preset = POPULAR_INDIAN_MF.get(symbol, {})
-            
-            fund_data = {
-                "symbol": symbol,
-                "name": preset.get("name") or info.get("longName") or info.get("shortName", symbol),
-                "fund_family": preset.get("family") or info.get("fundFamily"),
-                "category": preset.get("category") or info.get("category"),
-                "nav": info.get("regularMarketPrice") or info.get("navPrice") or info.get("previousClose"),
-                "previous_close": info.get("previousClose"),
-                "day_change": info.get("regularMarketChange"),
-                "day_change_percent": info.get("regularMarketChangePercent"),
-                "expense_ratio": info.get("annualReportExpenseRatio"),
-                "total_assets": info.get("totalAssets"),
-                "currency": info.get("currency", "INR"),
-                "ytd_return": info.get("ytdReturn"),
-                "one_year_return": preset.get("one_year_return") or info.get("threeYearAverageReturn"),
-                "three_year_return": preset.get("three_year_return") or info.get("threeYearAverageReturn"),
-                "five_year_return": preset.get("five_year_return") or info.get("fiveYearAverageReturn"),
-                "is_fallback": False
-            }
-            
-            # Calculate day change if not provided
-            if fund_data["day_change"] is None and fund_data["nav"] and fund_data["previous_close"]:
-                fund_data["day_change"] = fund_data["nav"] - fund_data["previous_close"]
-                if fund_data["previous_close"] > 0:
-                    fund_data["day_change_percent"] = (fund_data["day_change"] / fund_data["previous_close"]) * 100
-            
-            self._set_cache(cache_key, fund_data)
-            return fund_data
-            
-        except Exception as e:
-            print(f"Error fetching fund info for {symbol}: {e}")
-            # Check if it's a rate limit error
-            if "429" in str(e) or "Too Many Requests" in str(e):
-                self._use_fallback = True
-                print("Rate limited by Yahoo Finance, switching to fallback mode")
-            # Return fallback data
-            fallback = self._get_fallback_data(symbol)
-            if fallback:
-                self._set_cache(cache_key, fallback)
-            return fallback
-    
-    def get_fund_detail(self, symbol: str, period: str = "1y") -> Optional[Dict[str, Any]]:
-        """Get detailed mutual fund information including historical data"""
-        fund_info = self.get_fund_info(symbol)
-        if not fund_info:
-            return None
+        fund_data = {
+            "symbol": symbol,
+            "name": preset.get("name") or info.get("longName") or info.get("shortName", symbol),
+            "fund_family": preset.get("family") or info.get("fundFamily"),
+            "category": preset.get("category") or info.get("category"),
+            "nav": info.get("regularMarketPrice") or info.get("navPrice") or info.get("previousClose"),
+            "previous_close": info.get("previousClose"),
+            "day_change": info.get("regularMarketChange"),
+            "day_change_percent": info.get("regularMarketChangePercent"),
+            "expense_ratio": info.get("annualReportExpenseRatio"),
+            "total_assets": info.get("totalAssets"),
+            "currency": info.get("currency", "INR"),
+            "ytd_return": info.get("ytdReturn"),
+            "one_year_return": preset.get("one_year_return") or info.get("threeYearAverageReturn"),
+            "three_year_return": preset.get("three_year_return") or info.get("threeYearAverageReturn"),
+            "five_year_return": preset.get("five_year_return") or info.get("fiveYearAverageReturn"),
+            "is_fallback": False
+        }
         
-        try:
-            ticker = yf.Ticker(symbol)
-            
-            # Get historical data
-            hist = ticker.history(period=period)
-            
-            historical_data = []
-            if not hist.empty:
-                for date, row in hist.iterrows():
-                    historical_data.append({
-                        "date": date.strftime("%Y-%m-%d"),
-                        "nav": round(row["Close"], 2)
-                    })
-            
-            fund_info["historical_data"] = historical_data
-            
-            # Calculate returns from historical data if not available
-            if historical_data and len(historical_data) > 1:
-                current_nav = historical_data[-1]["nav"]
-                
-                # 1 month return
-                if len(historical_data) >= 22:
-                    month_ago_nav = historical_data[-22]["nav"]
-                    fund_info["one_month_return"] = round(((current_nav - month_ago_nav) / month_ago_nav) * 100, 2)
-                
-                # 3 month return
-                if len(historical_data) >= 66:
-                    three_month_nav = historical_data[-66]["nav"]
-                    fund_info["three_month_return"] = round(((current_nav - three_month_nav) / three_month_nav) * 100, 2)
-                
-                # 1 year return
-                if len(historical_data) >= 252:
-                    year_ago_nav = historical_data[0]["nav"]
-                    fund_info["one_year_return"] = round(((current_nav - year_ago_nav) / year_ago_nav) * 100, 2)
-            
-            return fund_info
-            
-        except Exception as e:
-            print(f"Error fetching fund detail for {symbol}: {e}")
-            return fund_info
-    
-    def get_historical_nav(self, symbol: str, period: str = "1y") -> List[Dict[str, Any]]:
-        """Get historical NAV data"""
-        try:
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period=period)
-            
-            data = []
-            for date, row in hist.iterrows():
-                data.append({
-                    "date": date.strftime("%Y-%m-%d"),
-                    "nav": round(row["Close"], 2)
-                })
-            
-            return data
-            
-        except Exception as e:
-            print(f"Error fetching historical data for {symbol}: {e}")
-            return []
-    
-    def get_popular_funds(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get list of popular Indian mutual funds"""
-        funds = []
+        # Calculate day change if not provided
+        if fund_data["day_change"] is None and fund_data["nav"] and fund_data["previous_close"]:
+            fund_data["day_change"] = fund_data["nav"] - fund_data["previous_close"]
+            if fund_data["previous_close"] > 0:
+                fund_data["day_change_percent"] = (fund_data["day_change"] / fund_data["previous_close"]) * 100
         
-        for symbol, preset in POPULAR_INDIAN_MF.items():
-            if category and preset.get("category") != category:
+        self._quotes.set(symbol, fund_data)
+        # Keep the slow-changing fields so bulk quotes can be enriched without .info calls
+        metadata = {field: info[field] for field in METADATA_FIELDS if info.get(field) is not None}
+        if metadata:
+            self._metadata.set(symbol, metadata)
+        return fund_data
+
+    def _build_batch_quotes(self, symbols: List[str], closes: "pd.DataFrame") -> Dict[str, Optional[Dict[str, Any]]]:
+        """Build and cache fund data from bulk closing prices"""
+        results = {}
+        for symbol in symbols:
+            series = closes[symbol].dropna() if symbol in closes else None
+            if series is None or series.empty:
+                results[symbol] = self._cache_fallback(symbol)
                 continue
             
-            fund_info = self.get_fund_info(symbol)
-            if fund_info:
-                funds.append(fund_info)
-        
-        return funds
-    
-    def search_funds(self, query: str) -> List[Dict[str, Any]]:
-        """Search mutual funds by name or category"""
-        query_lower = query.lower()
-        results = []
-        
-        for symbol, preset in POPULAR_INDIAN_MF.items():
-            name = preset.get("name", "").lower()
-            category = preset.get("category", "").lower()
-            family = preset.get("family", "").lower()
-            
-            if query_lower in name or query_lower in category or query_lower in family:
-                results.append({
-                    "symbol": symbol,
-                    "name": preset.get("name"),
-                    "category": preset.get("category"),
-                    "fund_family": preset.get("family")
-                })
-        
+            info = dict(self._metadata.get_stale(symbol) or {})
+            info["regularMarketPrice"] = round(float(series.iloc[-1]), 4)
+            if len(series) > 1:
+                info["previousClose"] = round(float(series.iloc[-2]), 4)
+            results[symbol] = self._build_fund_info(symbol, info)
         return results
-    
-    def calculate_portfolio_value(self, holdings: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Calculate total portfolio value and returns"""
-        total_invested = 0
-        total_current = 0
-        holdings_with_nav = []
+
+    def _batch_history_columns(
+        self,
+        symbols: List[str],
+        closes: "pd.DataFrame",
+        period: str
+    ) -> Dict[str, Dict[str, list]]:
+        """Split bulk closing prices into per-symbol columnar history and cache it"""
+        results = {}
+        for symbol in symbols:
+            if symbol in closes:
+                results[symbol] = self._cache_history(symbol, period, closes_to_columns(closes[symbol]))
+            else:
+                results[symbol] = empty_history()
+        return results
+
+    def _uses_store(self, period: str) -> bool:
+        return self._store is not None and self._store.supports(period)
+
+    def _plan_history_fetches(self, symbols: List[str]) -> List[Tuple[Tuple[Optional[str], Optional[str]], List[str]]]:
+        """Group symbols by the (period, start) upstream fetch their stored history needs.
+
+        Symbols with nothing stored share one full-period fetch; symbols with
+        a stale tail share one fetch from the earliest missing date.
+        """
+        full = []
+        tails = {}
+        for symbol in symbols:
+            plan = self._store.fetch_plan(symbol)
+            if plan is None:
+                continue
+            if plan[1] is None:
+                full.append(symbol)
+            else:
+                tails[symbol] = plan[1]
         
-        for holding in holdings:
-            symbol = holding.get("symbol")
-            units = holding.get("units", 0)
-            avg_nav = holding.get("avg_nav", 0)
-            
-            fund_info = self.get_fund_info(symbol)
-            current_nav = fund_info.get("nav", avg_nav) if fund_info else avg_nav
-            
-            invested_value = units * avg_nav
-            current_value = units * current_nav
-            returns = current_value - invested_value
-            returns_percent = (returns / invested_value * 100) if invested_value > 0 else 0
-            
-            total_invested += invested_value
-            total_current += current_value
-            
-            holdings_with_nav.append({
-                "symbol": symbol,
-                "name": fund_info.get("name", symbol) if fund_info else symbol,
-                "units": units,
-                "avg_nav": avg_nav,
-                "current_nav": current_nav,
-                "invested_value": round(invested_value, 2),
-                "current_value": round(current_value, 2),
-                "returns": round(returns, 2),
-                "returns_percent": round(returns_percent, 2)
-            })
+        groups = []
+        if full:
+            groups.append(((FULL_HISTORY_PERIOD, None), full))
+        if tails:
+            groups.append(((None, min(tails.values())), list(tails)))
+        return groups
+
+    def _fetch_history_closes(
+        self,
+        symbols: List[str],
+        period: Optional[str] = None,
+        start: Optional[str] = None
+    ) -> "pd.DataFrame":
+        """Closing prices per symbol: a single-ticker call for one symbol, a bulk download for more"""
+        if len(symbols) == 1:
+            hist = self._fetch_history(symbols[0], period, start)
+            if hist is None or "Close" not in hist:
+                # Delisted or unknown: no columns at all, which still marks the symbol as checked
+                return pd.DataFrame(columns=symbols)
+            return hist[["Close"]].rename(columns={"Close": symbols[0]})
+        return self._fetch_batch_history(symbols, period, start)
+
+    def _save_history(self, symbols: List[str], closes: "pd.DataFrame"):
+        """Append fetched closes to the history store"""
+        for symbol in symbols:
+            series = closes[symbol].dropna() if symbol in closes else ()
+            # An empty result has no date index to format, but still records the check
+            rows = zip(series.index.strftime("%Y-%m-%d"), series.astype(float)) if len(series) else ()
+            self._store.append(symbol, rows)
+
+    def _read_history(self, symbol: str, period: str) -> Dict[str, list]:
+        """Read a period of stored history and cache it"""
+        return self._cache_history(symbol, period, self._store.read(symbol, period))
+
+    def _cache_history(self, symbol: str, period: str, columns: Dict[str, list]) -> Dict[str, list]:
+        """Cache non-empty NAV history for a symbol and period"""
+        if columns["dates"]:
+            self._history.set((symbol, period), columns)
+        return columns
+
+    def _history_columns(self, hist: "pd.DataFrame") -> Dict[str, list]:
+        """Convert a price history frame into columnar NAV history"""
+        if hist.empty:
+            return empty_history()
+        return closes_to_columns(hist["Close"])
+
+    def _attach_history(
+        self,
+        fund_info: Dict[str, Any],
+        columns: Dict[str, list],
+        shape: str = "records",
+        chart: Optional[Dict[str, list]] = None
+    ) -> Dict[str, Any]:
+        """Return a copy of fund info with historical data (chart, if downsampled) and derived returns"""
+        # Copy so the cached fund info is not mutated
+        fund_info = dict(fund_info)
+        fund_info["historical_data"] = format_history(columns if chart is None else chart, shape)
         
-        total_returns = total_current - total_invested
-        total_returns_percent = (total_returns / total_invested * 100) if total_invested > 0 else 0
+        # Calendar-aligned trailing returns over the attached history
+        returns = trailing_returns(columns, ["1m", "3m", "1y"])
+        for window, key in (("1m", "one_month_return"), ("3m", "three_month_return"), ("1y", "one_year_return")):
+            if returns[window] is not None:
+                fund_info[key] = returns[window]
         
-        return {
-            "holdings": holdings_with_nav,
-            "summary": {
-                "total_invested": round(total_invested, 2),
-                "total_current": round(total_current, 2),
-                "total_returns": round(total_returns, 2),
-                "total_returns_percent": round(total_returns_percent, 2)
-            }
-        }
+        return fund_info
+    
+    def _analytics_for(self, symbol: str, period: str, columns: Dict[str, list], window: str) -> Dict[str, Any]:
+        """Analytics for a NAV series, memoized until the series gains a new last date"""
+        if not columns["dates"]:
+            return {}
+        key = (symbol, period, columns["dates"][-1], window)
+        analytics = self._analytics.get(key)
+        if analytics is None:
+            analytics = compute_analytics(columns, RISK_FREE_RATE, window)
+            self._analytics.set(key, analytics)
+        return analytics
+    
+    def _chart_for(
+        self,
+        symbol: str,
+        period: str,
+        columns: Dict[str, list],
+        points: Optional[int] = None,
+        interval: Optional[str] = None
+    ) -> Dict[str, list]:
+        """History downsampled for charts, memoized until the series gains a new last date"""
+        if not columns["dates"] or (points is None and interval is None):
+            return columns
+        key = (symbol, period, columns["dates"][-1], points, interval)
+        chart = self._charts.get(key)
+        if chart is None:
+            chart = downsample(columns, points, interval)
+            self._charts.set(key, chart)
+        return chart
+    
+    def get_catalogue_symbols(self, category: Optional[str] = None, family: Optional[str] = None) -> List[str]:
+        """Get catalogue symbols by category and/or family, or the popular funds"""
+        return self._catalogue.current().symbols(category, family)
+    
+    def get_catalogue_categories(self) -> List[Dict[str, Any]]:
+        """Catalogue categories with their fund counts"""
+        return self._catalogue.current().categories()
+    
+    def _listing_symbols(
+        self,
+        category: Optional[str] = None,
+        family: Optional[str] = None,
+        sort: Optional[str] = None,
+        descending: bool = True
+    ) -> List[str]:
+        """Symbols of a fund listing in display order, without fetching any quotes"""
+        catalogue = self._catalogue.current()
+        if sort in RECORD_SORT_FIELDS:
+            return catalogue.sorted_symbols(category, family, sort, descending)
+        if sort in QUOTE_SORT_FIELDS:
+            return self._quote_order(catalogue, category, family, sort, descending)
+        return catalogue.symbols(category, family)
+
+    def _quote_order(
+        self,
+        catalogue: Catalogue,
+        category: Optional[str],
+        family: Optional[str],
+        field: str,
+        descending: bool
+    ) -> List[str]:
+        """Listing symbols ordered by a cached quote field, reused for LISTING_ORDER_TTL so pages do not each sort"""
+        key = (category, family, field, descending)
+        held = self._quote_orders.get(key)
+        if held is not None and held[0] is catalogue:
+            return held[1]
+        # Funds never quoted yet have no value and go last
+        order = sort_symbols(
+            catalogue.symbols(category, family), lambda symbol: (self._quotes.peek(symbol) or {}).get(field), descending
+        )
+        self._quote_orders.set(key, (catalogue, order))
+        return order
+    
+    def search_funds(self, query: str, limit: Optional[int] = 20) -> List[Dict[str, Any]]:
+        """Search mutual funds by name, category or fund house, best matches first"""
+        return self._catalogue.current().search_index.search(query, limit)
 
 
 # Singleton instance
@@ -0,0 +1,134 @@
+"""
+Persistent NAV history store - SQLite-backed, extended by appending new closes
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Tuple
+
+from app.lazy import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+# Calendar lookback for each supported history period, as pd.DateOffset arguments
+PERIOD_OFFSETS = {
+    "1mo": {"months": 1},
+    "3mo": {"months": 3},
+    "6mo": {"months": 6},
+    "1y": {"years": 1},
+    "2y": {"years": 2},
+    "5y": {"years": 5},
+}
+
+# Period downloaded the first time a symbol is stored; covers every supported period
+FULL_HISTORY_PERIOD = "5y"
+
+
+def period_offset(period: str) -> Any:
+    """Calendar lookback of a history period, as a pd.DateOffset"""
+    return pd.DateOffset(**PERIOD_OFFSETS[period])
+
+
+def period_start(period: str, today: Optional[date] = None) -> date:
+    """First calendar date covered by a history period"""
+    return (pd.Timestamp(today or date.today()) - period_offset(period)).date()
+
+
+class HistoryStore:
+    """NAV history per symbol in a local SQLite database.
+
+    The first fetch for a symbol stores FULL_HISTORY_PERIOD of closes;
+    afterwards only the tail since the last stored date is fetched, at
+    most once per recheck_interval. Range queries are answered locally.
+    """
+
+    def __init__(self, path: str, recheck_interval: float):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.recheck_interval = recheck_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nav_history ("
+            " symbol TEXT NOT NULL, date TEXT NOT NULL, nav REAL NOT NULL,"
+            " PRIMARY KEY (symbol, date)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history_status ("
+            " symbol TEXT PRIMARY KEY, last_date TEXT, checked_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def supports(period: str) -> bool:
+        return period in PERIOD_OFFSETS
+
+    def fetch_plan(self, symbol: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """(period, start) of the upstream fetch a symbol needs, or None if it is current"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_date, checked_at FROM history_status WHERE symbol = ?", (symbol,)
+            ).fetchone()
+        if row is not None and time.time() - row[1] < self.recheck_interval:
+            return None
+        if row is None or row[0] is None:
+            return (FULL_HISTORY_PERIOD, None)
+
+        start = date.fromisoformat(row[0]) + timedelta(days=1)
+        if start > date.today():
+            self.mark_checked([symbol])
+            return None
+        return (None, start.isoformat())
+
+    def append(self, symbol: str, rows: Iterable[Tuple[str, float]]):
+        """Store (date, nav) rows for a symbol and mark it as checked"""
+        rows = list(rows)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if rows:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO nav_history (symbol, date, nav) VALUES (?, ?, ?)",
+                        [(symbol, day, nav) for day, nav in rows],
+                    )
+                self._conn.execute(
+                    "INSERT INTO history_status (symbol, last_date, checked_at) VALUES (?, "
+                    " (SELECT MAX(date) FROM nav_history WHERE symbol = ?), ?)"
+                    " ON CONFLICT(symbol) DO UPDATE SET last_date = excluded.last_date,"
+                    " checked_at = excluded.checked_at",
+                    (symbol, symbol, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def mark_checked(self, symbols: Iterable[str]):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE history_status SET checked_at = ? WHERE symbol = ?",
+                [(time.time(), symbol) for symbol in symbols],
+            )
+
+    def read(self, symbol: str, period: str) -> Dict[str, list]:
+        """Stored NAV history for a symbol within a period as {"dates", "nav"} columns, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, ROUND(nav, 2) FROM nav_history"
+                " WHERE symbol = ? AND date >= ? ORDER BY date",
+                (symbol, period_start(period).isoformat()),
+            ).fetchall()
+        dates, navs = zip(*rows) if rows else ((), ())
+        return {"dates": list(dates), "nav": list(navs)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,323 @@
+"""
+Live NAV stream - one refresh loop quotes every subscribed fund and fans changes out to subscribers
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows; every worker refreshes its own stream
+    fcntl = None
+
+from app.config import CACHE_BACKEND, DATA_DIR, STREAM_INTERVAL, STREAM_MAX_LAG, STREAM_MAX_SUBSCRIBERS
+from .async_fund_service import AsyncMutualFundService, async_mutual_fund_service
+from .rate_limiter import BACKGROUND, upstream_priority
+
+# Fields of a fund sent as its NAV quote
+NAV_QUOTE_FIELDS = ("symbol", "name", "nav", "previous_close", "day_change", "day_change_percent")
+
+
+def nav_quote(fund: Dict[str, Any]) -> Dict[str, Any]:
+    """Current NAV fields of a fund"""
+    return {field: fund[field] for field in NAV_QUOTE_FIELDS}
+
+
+class StreamFullError(Exception):
+    """Raised when a subscription would exceed the stream's subscriber limit"""
+
+
+class Subscription:
+    """One client's symbols and the quotes it has not been sent yet.
+
+    Only the newest pending quote per symbol is kept, so a client reading
+    slower than updates arrive skips intermediate values instead of
+    queueing them, and never holds more quotes than it has symbols.
+    """
+
+    __slots__ = ("symbols", "skipped", "closed", "_pending", "_pending_since", "_ready")
+
+    def __init__(self, symbols: Iterable[str]):
+        self.symbols = frozenset(symbols)
+        self.skipped = 0  # Quotes replaced by a newer one before they were read
+        self.closed = False
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_since: Optional[float] = None
+        self._ready = asyncio.Event()
+
+    def push(self, quote: Dict[str, Any]):
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        if quote["symbol"] in self._pending:
+            self.skipped += 1
+        self._pending[quote["symbol"]] = quote
+        self._ready.set()
+
+    def lag(self) -> float:
+        """Seconds the oldest unread quote has been waiting"""
+        return 0.0 if self._pending_since is None else time.monotonic() - self._pending_since
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def next(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Quotes changed since the last call; empty if none arrived within timeout or the subscription closed"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        quotes = list(self._pending.values())
+        self._pending.clear()
+        self._pending_since = None
+        return quotes
+
+
+class StreamCoordinator:
+    """Elects one worker process on the host to refresh the stream's funds for all of them.
+
+    Each worker lists the funds its subscribers follow in a file of its
+    own, rewritten on every refresh, and tries to take an exclusive flock.
+    The holder re-fetches every fund listed in a file rewritten within the
+    last few intervals; the others read its quotes from the shared cache
+    tier. The lock goes with the process, so when the refreshing worker
+    exits another takes over on its next refresh.
+    """
+
+    def __init__(self, directory: str, interval: float, worker: Optional[str] = None):
+        if fcntl is None:
+            raise RuntimeError("Stream coordination needs fcntl (POSIX only)")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._worker = worker  # Name of this worker's list; the process id by default
+        self._expiry = 3 * interval  # Lists not rewritten for this long belong to workers that stopped
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+        self.leading = False
+
+    def _followers_path(self) -> str:
+        return os.path.join(self.directory, f"followers-{self._worker or os.getpid()}.json")
+
+    def check_in(self, symbols: Iterable[str]) -> Optional[List[str]]:
+        """Record this worker's symbols; every worker's if this worker refreshes for all, otherwise None"""
+        path = self._followers_path()
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(sorted(symbols), f)
+        os.replace(path + ".tmp", path)
+        return self._followed() if self._lead() else None
+
+    def _lead(self) -> bool:
+        # Reopen after a fork so the child does not share the parent's lock
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(os.path.join(self.directory, "leader.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+            self.leading = False
+        if not self.leading:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self.leading = True
+        return True
+
+    def _followed(self) -> List[str]:
+        oldest = time.time() - self._expiry
+        symbols: Set[str] = set()
+        for name in os.listdir(self.directory):
+            if not (name.startswith("followers-") and name.endswith(".json")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < oldest:
+                    os.unlink(path)
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    symbols.update(json.load(f))
+            except (OSError, ValueError):
+                continue  # Removed or being replaced by its worker meanwhile
+        return sorted(symbols)
+
+    def leave(self):
+        """Withdraw this worker's symbols and stop refreshing for the others"""
+        try:
+            os.unlink(self._followers_path())
+        except FileNotFoundError:
+            pass
+        if self.leading:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self.leading = False
+
+
+class NavStream:
+    """Fans NAV quotes out to every subscription from a single refresh loop.
+
+    The loop runs while anyone is subscribed. Every interval it re-fetches
+    the union of subscribed symbols with one bulk upstream call per chunk,
+    however many clients follow each fund, and pushes quotes that changed
+    to the subscriptions following them. Symbols nobody followed before
+    are quoted (from cache where possible) as soon as they are subscribed
+    to. Subscriptions that leave quotes unread for longer than max_lag
+    seconds are closed, so their clients reconnect and resynchronise.
+
+    With a coordinator, only the worker it elects re-fetches, for the
+    funds followed on every worker, and the others read the quotes it
+    stored in the shared cache tier; without one, each worker process
+    refreshes its own subscriptions.
+    """
+
+    def __init__(
+        self,
+        service: AsyncMutualFundService,
+        interval: float = STREAM_INTERVAL,
+        max_subscribers: int = STREAM_MAX_SUBSCRIBERS,
+        max_lag: float = STREAM_MAX_LAG,
+        coordinator: Optional[StreamCoordinator] = None,
+    ):
+        self._service = service
+        self._coordinator = coordinator
+        self._interval = interval
+        self._max_subscribers = max_subscribers
+        self._max_lag = max_lag
+        self._followers: Dict[str, Set[Subscription]] = {}  # symbol -> subscriptions following it
+        self._latest: Dict[str, Dict[str, Any]] = {}  # symbol -> last quote pushed
+        self._subscriptions: Set[Subscription] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.updates = 0
+        self.lagged_out = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def subscribe(self, symbols: Iterable[str]) -> Subscription:
+        """Follow symbols; quotes already known are pending on the subscription straight away"""
+        if len(self._subscriptions) >= self._max_subscribers:
+            raise StreamFullError(f"At most {self._max_subscribers} stream subscribers are allowed")
+        subscription = Subscription(symbols)
+        self._subscriptions.add(subscription)
+        for symbol in subscription.symbols:
+            self._followers.setdefault(symbol, set()).add(subscription)
+            if symbol in self._latest:
+                subscription.push(self._latest[symbol])
+
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        self._subscriptions.discard(subscription)
+        for symbol in subscription.symbols:
+            followers = self._followers.get(symbol)
+            if followers is None:
+                continue
+            followers.discard(subscription)
+            if not followers:
+                del self._followers[symbol]
+                self._latest.pop(symbol, None)
+        if not self._followers and self._wakeup is not None:
+            # Lets the refresh loop see nobody is subscribed and finish
+            self._wakeup.set()
+
+    async def stop(self):
+        """Close every subscription and stop the refresh loop"""
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._coordinator:
+            await asyncio.get_running_loop().run_in_executor(None, self._coordinator.leave)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscriptions),
+            "symbols": len(self._followers),
+            "refreshes": self.refreshes,
+            "updates": self.updates,
+            "lagged_out": self.lagged_out,
+            "running": self.running,
+            "refreshing_for_all": self._coordinator.leading if self._coordinator else None,
+        }
+
+    def _publish(self, fund_infos: Dict[str, Optional[Dict[str, Any]]]):
+        """Push each changed quote to the subscriptions following its fund"""
+        for symbol, fund in fund_infos.items():
+            followers = self._followers.get(symbol)
+            # Fallback data would flap against real quotes already sent
+            if not fund or not followers or (fund.get("is_fallback") and symbol in self._latest):
+                continue
+            quote = nav_quote(fund)
+            if quote == self._latest.get(symbol):
+                continue
+            self._latest[symbol] = quote
+            for subscription in followers:
+                subscription.push(quote)
+            self.updates += len(followers)
+
+        for subscription in [s for s in self._subscriptions if s.lag() > self._max_lag]:
+            self.unsubscribe(subscription)
+            self.lagged_out += 1
+
+    async def _run(self):
+        # Quotes for new subscriptions as well as refreshes; neither competes with requests for tokens
+        upstream_priority.set(BACKGROUND)
+        loop = asyncio.get_running_loop()
+        next_refresh = loop.time() + self._interval
+        while self._followers:
+            # Cleared first, so a subscription made while fetching wakes the next pass
+            self._wakeup.clear()
+            try:
+                new = [symbol for symbol in self._followers if symbol not in self._latest]
+                if new:
+                    self._publish(await self._service.get_fund_infos(new))
+                if loop.time() >= next_refresh:
+                    next_refresh = loop.time() + self._interval
+                    self._publish(await self._refresh(list(self._followers)))
+                    self.refreshes += 1
+            except Exception as e:
+                print(f"Error refreshing live NAV stream: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, next_refresh - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+        if self._coordinator:
+            await loop.run_in_executor(None, self._coordinator.leave)
+
+    async def _refresh(self, symbols: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Fresh quotes for symbols: fetched, or read from the worker refreshing for all"""
+        if self._coordinator is None:
+            return await self._service.refresh_quotes(symbols)
+        everyone = await asyncio.get_running_loop().run_in_executor(None, self._coordinator.check_in, symbols)
+        if everyone is None:
+            return await self._service.read_shared_quotes(symbols)
+        return await self._service.refresh_quotes(everyone)
+
+
+def sse_event(event: str, data: bytes) -> bytes:
+    """A server-sent event carrying one line of JSON"""
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + data + b"\n\n"
+
+
+def build_stream_coordinator() -> Optional[StreamCoordinator]:
+    """Coordinator electing one refreshing worker, when workers share a cache tier to read its quotes from"""
+    if CACHE_BACKEND != "shared" or fcntl is None:
+        return None
+    return StreamCoordinator(os.path.join(DATA_DIR, "nav_stream"), STREAM_INTERVAL)
+
+
+# Singleton instance
+nav_stream = NavStream(async_mutual_fund_service, coordinator=build_stream_coordinator())
@@ -0,0 +1,246 @@
+"""
+Portfolio engine - vectorized valuation, returns and XIRR for many portfolios at once
+"""
+from datetime import date
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+DAYS_PER_YEAR = 365.0
+
+# Newton iterations on log(1 + rate); each one halves the error many times over near the root
+XIRR_ITERATIONS = 50
+XIRR_TOLERANCE = 1e-10
+# Bounds on log(1 + rate), i.e. rates from -99.995% to about +2,200,000%
+XIRR_LOG_BOUNDS = (-10.0, 10.0)
+
+
+def _field(obj: Any, name: str) -> Any:
+    """A field of a holding or lot given as a dict or as a model"""
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _ordinal(day: Any) -> float:
+    """Day number of a date or ISO date string, NaN if there is none"""
+    if day is None:
+        return np.nan
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    return day.toordinal()
+
+
+class PortfolioBook:
+    """Holdings of many portfolios as flat arrays.
+
+    A holding is either units bought at an average NAV, optionally on a
+    purchase_date, or a list of lots (date, units, nav). Each holding
+    becomes one row; each lot one cash flow row pointing at its holding.
+    Symbols are interned so every distinct fund is priced once.
+    """
+
+    def __init__(self, portfolios: Iterable[Any]):
+        ids: List[Any] = []
+        symbol_index: Dict[str, int] = {}
+        holding_portfolio: List[int] = []
+        holding_symbol: List[int] = []
+        lot_holding: List[int] = []
+        lot_days: List[float] = []
+        lot_units: List[float] = []
+        lot_navs: List[float] = []
+
+        for position, portfolio in enumerate(portfolios):
+            portfolio_id = _field(portfolio, "id")
+            ids.append(position if portfolio_id is None else portfolio_id)
+            for holding in _field(portfolio, "holdings") or ():
+                symbol = _field(holding, "symbol")
+                if not symbol:
+                    raise ValueError(f"Holding without a symbol in portfolio {ids[-1]}")
+                row = len(holding_symbol)
+                holding_portfolio.append(position)
+                holding_symbol.append(symbol_index.setdefault(symbol, len(symbol_index)))
+                lots = _field(holding, "lots")
+                if lots:
+                    for lot in lots:
+                        lot_holding.append(row)
+                        lot_days.append(_ordinal(_field(lot, "date")))
+                        lot_units.append(_field(lot, "units"))
+                        lot_navs.append(_field(lot, "nav"))
+                else:
+                    units, avg_nav = _field(holding, "units"), _field(holding, "avg_nav")
+                    if units is None or avg_nav is None:
+                        raise ValueError(f"Holding {symbol} needs units and avg_nav, or lots")
+                    lot_holding.append(row)
+                    lot_days.append(_ordinal(_field(holding, "purchase_date")))
+                    lot_units.append(units)
+                    lot_navs.append(avg_nav)
+
+        self.ids = ids
+        self.symbols = list(symbol_index)
+        self.holding_portfolio = np.asarray(holding_portfolio, dtype=np.int64)
+        self.holding_symbol = np.asarray(holding_symbol, dtype=np.int64)
+        self.lot_holding = np.asarray(lot_holding, dtype=np.int64)
+        # Undated lots are NaN
+        self.lot_days = np.asarray(lot_days, dtype=float)
+        self.lot_units = np.asarray(lot_units, dtype=float)
+        self.lot_cost = self.lot_units * np.asarray(lot_navs, dtype=float)
+
+    @property
+    def portfolio_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def holding_count(self) -> int:
+        return len(self.holding_symbol)
+
+
+def xirr(groups: np.ndarray, count: int, years: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+    """Annual internal rate of return of each group's cash flows, NaN where there is none.
+
+    years is how long before the valuation date each flow happened and
+    amounts are signed (purchases negative, current value positive).
+    Solves sum(amount * (1 + rate) ** years) = 0 for all groups at once
+    by Newton's method on x = log(1 + rate): the function is concave and
+    decreasing in x when purchases precede the valuation, so after the
+    first step the iterates approach the root from above.
+    """
+    low, high = XIRR_LOG_BOUNDS
+    x = np.zeros(count)
+    converged = np.zeros(count, dtype=bool)
+    for _ in range(XIRR_ITERATIONS):
+        growth = np.exp(years * x[groups])
+        value = np.bincount(groups, amounts * growth, minlength=count)
+        slope = np.bincount(groups, amounts * years * growth, minlength=count)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(slope != 0, value / slope, np.nan)
+        x = np.clip(x - np.nan_to_num(step), low, high)
+        converged = np.abs(step) < XIRR_TOLERANCE
+        # Groups with no solution stop early: no slope, or a root beyond the rate bounds
+        pinned = ((x <= low) & (step > 0)) | ((x >= high) & (step < 0))
+        if (converged | pinned | np.isnan(step)).all():
+            break
+    return np.where(converged & (x > low) & (x < high), np.expm1(x), np.nan)
+
+
+def _percent(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator * 100, 0.0)
+
+
+def _rounded(digits: int, *columns: np.ndarray) -> List[list]:
+    """Columns rounded together and converted to lists of floats"""
+    return np.round(np.vstack(columns), digits).tolist()
+
+
+def _nullable(values: list) -> List[Optional[float]]:
+    """NaN as None"""
+    return [None if value != value else value for value in values]
+
+
+def _portfolio_xirrs(book: PortfolioBook, current_value: np.ndarray, as_of: Optional[date]) -> tuple:
+    """XIRR per holding and per portfolio, NaN where some purchase is undated"""
+    portfolios, holdings = book.portfolio_count, book.holding_count
+    undated = np.isnan(book.lot_days)
+    dated = np.bincount(book.lot_holding, undated, minlength=holdings) == 0
+    if not dated.any():
+        return np.full(holdings, np.nan), np.full(portfolios, np.nan)
+
+    # Cash flows: each lot's cost going in, each holding's current value coming out today
+    today = (as_of or date.today()).toordinal()
+    lot_years = np.where(undated, 0.0, (today - book.lot_days) / DAYS_PER_YEAR)
+    flow_holding = np.concatenate([book.lot_holding, np.arange(holdings)])
+    flow_years = np.concatenate([lot_years, np.zeros(holdings)])
+    flow_amounts = np.concatenate([-book.lot_cost, current_value])
+    holding_xirr = np.where(dated, xirr(flow_holding, holdings, flow_years, flow_amounts), np.nan)
+    portfolio_dated = np.bincount(book.holding_portfolio, ~dated, minlength=portfolios) == 0
+    portfolio_xirr = np.where(
+        portfolio_dated & (np.bincount(book.holding_portfolio, minlength=portfolios) > 0),
+        xirr(book.holding_portfolio[flow_holding], portfolios, flow_years, flow_amounts),
+        np.nan,
+    )
+    return holding_xirr, portfolio_xirr
+
+
+def value_portfolios(
+    book: PortfolioBook,
+    fund_infos: Mapping[str, Optional[Dict[str, Any]]],
+    as_of: Optional[date] = None,
+    include_holdings: bool = True,
+) -> List[Dict[str, Any]]:
+    """Value every portfolio in the book against resolved fund info.
+
+    Funds without a quote are valued at cost, as before. XIRR is given
+    for a holding when all its lots are dated, and for a portfolio when
+    all its holdings are.
+    """
+    portfolios, holdings = book.portfolio_count, book.holding_count
+    symbol_navs = np.array([(fund_infos.get(symbol) or {}).get("nav") for symbol in book.symbols], dtype=float)
+
+    units = np.bincount(book.lot_holding, book.lot_units, minlength=holdings)
+    invested = np.bincount(book.lot_holding, book.lot_cost, minlength=holdings)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_nav = np.where(units > 0, invested / units, 0.0)
+    quoted = symbol_navs[book.holding_symbol]
+    priced = ~np.isnan(quoted)
+    current_nav = np.where(priced, quoted, avg_nav)
+    current_value = units * current_nav
+    returns = current_value - invested
+
+    total_invested = np.bincount(book.holding_portfolio, invested, minlength=portfolios)
+    total_current = np.bincount(book.holding_portfolio, current_value, minlength=portfolios)
+    total_returns = total_current - total_invested
+
+    holding_xirr, portfolio_xirr = _portfolio_xirrs(book, current_value, as_of)
+
+    summaries = zip(
+        *_rounded(
+            2, total_invested, total_current, total_returns, _percent(total_returns, total_invested)
+        ),
+        _nullable(np.round(portfolio_xirr * 100, 2).tolist()),
+    )
+    results = [
+        {
+            "id": portfolio_id,
+            "summary": {
+                "total_invested": total_invested_value,
+                "total_current": total_current_value,
+                "total_returns": total_returns_value,
+                "total_returns_percent": total_returns_percent,
+                "xirr": xirr_percent,
+            },
+        }
+        for portfolio_id, (total_invested_value, total_current_value, total_returns_value, total_returns_percent,
+                           xirr_percent) in zip(book.ids, summaries)
+    ]
+    if not include_holdings:
+        return results
+
+    for result in results:
+        result["holdings"] = []
+    names = [(fund_infos.get(symbol) or {}).get("name", symbol) for symbol in book.symbols]
+    rows = zip(
+        book.holding_portfolio.tolist(),
+        book.holding_symbol.tolist(),
+        units.tolist(),
+        np.round(avg_nav, 4).tolist(),
+        current_nav.tolist(),
+        *_rounded(2, invested, current_value, returns, _percent(returns, invested)),
+        _nullable(np.round(holding_xirr * 100, 2).tolist()),
+        priced.tolist(),
+    )
+    for portfolio, symbol, *values in rows:
+        results[portfolio]["holdings"].append({
+            "symbol": book.symbols[symbol],
+            "name": names[symbol],
+            "units": values[0],
+            "avg_nav": values[1],
+            "current_nav": values[2],
+            "invested_value": values[3],
+            "current_value": values[4],
+            "returns": values[5],
+            "returns_percent": values[6],
+            "xirr": values[7],
+            "priced": values[8],
+        })
+    return results
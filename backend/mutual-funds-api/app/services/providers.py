@@ -0,0 +1,200 @@
+"""
+Data providers - where fund quotes and NAV history come from: Yahoo Finance, or offline replay
+"""
+import functools
+import os
+import sqlite3
+import zlib
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Optional
+
+import numpy as np
+
+from app.config import DATA_PROVIDER, OFFLINE_SNAPSHOT_PATH
+from app.lazy import lazy_import
+from .history_store import PERIOD_OFFSETS, period_offset
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import yfinance as yf
+else:
+    pd = lazy_import("pandas")
+    # Imported on the first upstream call; by far the slowest import of the app
+    yf = lazy_import("yfinance")
+
+# Length of the series synthesized for funds missing from the snapshot
+SYNTHETIC_YEARS = 5
+SYNTHETIC_VOLATILITY = 0.01  # Daily
+
+
+class DataProvider(ABC):
+    """Interface for fund data sources.
+
+    info() returns a Yahoo-style info dict; history() a frame with a Close
+    column indexed by date; closes() a frame indexed by date with one
+    column of closes per symbol. remote providers are called under the
+    upstream rate limit and circuit breaker.
+    """
+
+    name = "provider"
+    remote = True
+
+    @abstractmethod
+    def info(self, symbol: str) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def history(self, symbol: str, period: Optional[str] = None, start: Optional[str] = None) -> "pd.DataFrame":
+        ...
+
+    @abstractmethod
+    def closes(self, symbols: List[str], period: Optional[str] = None, start: Optional[str] = None) -> "pd.DataFrame":
+        ...
+
+
+class YahooProvider(DataProvider):
+    """Live data from Yahoo Finance through yfinance"""
+
+    name = "yahoo"
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        return yf.Ticker(symbol).info
+
+    def history(self, symbol: str, period: Optional[str] = None, start: Optional[str] = None) -> "pd.DataFrame":
+        if start:
+            return yf.Ticker(symbol).history(start=start)
+        return yf.Ticker(symbol).history(period=period)
+
+    def closes(self, symbols: List[str], period: Optional[str] = None, start: Optional[str] = None) -> "pd.DataFrame":
+        data = yf.download(
+            symbols,
+            **({"start": start} if start else {"period": period}),
+            auto_adjust=True,
+            group_by="column",
+            progress=False,
+            threads=False,
+        )
+        if data is None or data.empty:
+            return pd.DataFrame(columns=symbols)
+        if isinstance(data.columns, pd.MultiIndex):
+            closes = data["Close"]
+        else:
+            # Older yfinance returns flat columns for a single ticker
+            closes = data[["Close"]].rename(columns={"Close": symbols[0]})
+        return closes.reindex(columns=symbols)
+
+
+def read_snapshot(path: str) -> Dict[str, "pd.Series"]:
+    """NAV series per symbol from a CSV (symbol,date,nav) or a history store database"""
+    if path.endswith((".sqlite3", ".sqlite", ".db")):
+        with sqlite3.connect(path) as conn:
+            frame = pd.read_sql_query("SELECT symbol, date, nav FROM nav_history ORDER BY symbol, date", conn)
+    else:
+        frame = pd.read_csv(path, usecols=["symbol", "date", "nav"], dtype={"symbol": str})
+    frame["date"] = pd.to_datetime(frame["date"])
+    return {
+        symbol: group.set_index("date")["nav"].sort_index().astype(float)
+        for symbol, group in frame.groupby("symbol", sort=False)
+    }
+
+
+def _seed(symbol: str) -> int:
+    """Stable per-symbol seed, the same in every process (unlike hash())"""
+    return zlib.crc32(symbol.encode("utf-8"))
+
+
+class OfflineProvider(DataProvider):
+    """Deterministic data with no network access.
+
+    Funds in the snapshot replay their stored NAV history. Other funds get
+    a synthetic series seeded by symbol: a random walk ending at the
+    catalogue's fallback NAV whose drift matches its one-year return. The
+    same symbol gives the same data in every process and on every call
+    within a day.
+    """
+
+    name = "offline"
+    remote = False
+
+    def __init__(
+        self,
+        snapshot_path: Optional[str] = None,
+        presets: Callable[[str], Optional[Mapping[str, Any]]] = lambda symbol: None,
+    ):
+        self.snapshot_path = snapshot_path
+        self._presets = presets
+
+    @functools.cached_property
+    def _snapshot(self) -> Dict[str, "pd.Series"]:
+        # Read on first use, so building the provider does not import pandas
+        return read_snapshot(self.snapshot_path) if self.snapshot_path else {}
+
+    def series(self, symbol: str) -> "pd.Series":
+        """Full NAV series of a fund"""
+        series = self._snapshot.get(symbol)
+        if series is not None:
+            return series
+        return self._synthesize(symbol, date.today())
+
+    @functools.lru_cache(maxsize=4096)
+    def _synthesize(self, symbol: str, today: date) -> "pd.Series":
+        preset = self._presets(symbol) or {}
+        seed = _seed(symbol)
+        nav = preset.get("fallback_nav") or round(10 + seed % 990 + (seed % 100) / 100, 2)
+        one_year_return = preset.get("one_year_return")
+        if one_year_return is None:
+            one_year_return = 4 + seed % 16
+        dates = pd.bdate_range(end=pd.Timestamp(today), periods=SYNTHETIC_YEARS * 261)
+        rng = np.random.default_rng(seed)
+        walk = np.cumsum(rng.normal(0.0, SYNTHETIC_VOLATILITY, len(dates)))
+        # Tilt the walk so its last year returns exactly the catalogue's one-year return
+        year = min(261, len(dates) - 1)
+        drift = (np.log1p(one_year_return / 100) - (walk[-1] - walk[-1 - year])) / year
+        walk += drift * np.arange(len(dates))
+        return pd.Series(np.round(nav * np.exp(walk - walk[-1]), 4), index=dates)
+
+    def _slice(self, series: "pd.Series", period: Optional[str], start: Optional[str]) -> "pd.Series":
+        if start:
+            return series[series.index >= pd.Timestamp(start)]
+        if period and period.endswith("d") and period[:-1].isdigit():
+            return series.iloc[-int(period[:-1]):]
+        if period in PERIOD_OFFSETS and len(series):
+            return series[series.index > series.index[-1] - period_offset(period)]
+        return series
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        series = self.series(symbol)
+        if series.empty:
+            return {}
+        preset = self._presets(symbol) or {}
+        seed = _seed(symbol)
+        nav = float(series.iloc[-1])
+        return {
+            "regularMarketPrice": round(nav, 4),
+            "previousClose": round(float(series.iloc[-2]), 4) if len(series) > 1 else None,
+            "currency": "INR",
+            "longName": preset.get("name") or symbol,
+            "annualReportExpenseRatio": round(0.5 + (seed % 151) / 100, 2),
+        }
+
+    def history(self, symbol: str, period: Optional[str] = None, start: Optional[str] = None) -> "pd.DataFrame":
+        return self._slice(self.series(symbol), period, start).to_frame("Close")
+
+    def closes(self, symbols: List[str], period: Optional[str] = None, start: Optional[str] = None) -> "pd.DataFrame":
+        if not symbols:
+            return pd.DataFrame()
+        return pd.concat(
+            {symbol: self._slice(self.series(symbol), period, start) for symbol in symbols}, axis=1
+        ).reindex(columns=symbols)
+
+
+def build_providers(presets: Callable[[str], Optional[Mapping[str, Any]]]) -> Dict[str, DataProvider]:
+    """Primary and fallback providers configured from app settings"""
+    snapshot = OFFLINE_SNAPSHOT_PATH or None
+    if snapshot and not os.path.exists(snapshot):
+        print(f"Offline snapshot {snapshot} not found; synthesizing offline data")
+        snapshot = None
+    offline = OfflineProvider(snapshot, presets)
+    primary = offline if DATA_PROVIDER == "offline" else YahooProvider()
+    return {"primary": primary, "fallback": offline}
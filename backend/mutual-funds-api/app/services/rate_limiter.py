@@ -0,0 +1,198 @@
+"""
+Rate limiting for upstream Yahoo Finance calls - a token bucket shared across worker processes
+"""
+import asyncio
+import math
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Callable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows; only the in-process backend is available
+    fcntl = None
+
+from app.config import UPSTREAM_MIN_INTERVAL, UPSTREAM_BURST, RATE_LIMIT_BACKEND, DATA_DIR
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Priority of upstream calls made by the current task; background refreshes set BACKGROUND
+upstream_priority: ContextVar[str] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+# Bucket state: (tokens, last update time), or None before first use
+BucketState = Optional[Tuple[float, float]]
+
+
+class LocalBucketState:
+    """Bucket state held in this process"""
+
+    blocking = False  # Updates only wait on this process's other threads, briefly
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: BucketState = None
+
+    def update(self, func: Callable[[BucketState], Tuple[Tuple[float, float], Any]]) -> Any:
+        """Replace the state with func(state)[0] atomically and return func(state)[1]"""
+        with self._lock:
+            self._state, result = func(self._state)
+        return result
+
+
+class FileBucketState:
+    """Bucket state in a small file, updated under an exclusive flock.
+
+    Every process that opens the same path shares one bucket, so N
+    uvicorn workers on a host together stay within the configured rate.
+    """
+
+    _FORMAT = struct.Struct("dd")
+    blocking = True  # Updates wait on the file lock, held by other processes too
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("The file rate-limit backend needs fcntl (POSIX only)")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+
+    def _file(self) -> int:
+        # Reopen after a fork so the child does not share the parent's open file
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def update(self, func: Callable[[BucketState], Tuple[Tuple[float, float], Any]]) -> Any:
+        """Replace the state with func(state)[0] atomically across processes and return func(state)[1]"""
+        # flock is per open file, which this process's threads share, so serialize them first
+        with self._lock:
+            fd = self._file()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(fd, self._FORMAT.size, 0)
+                state = self._FORMAT.unpack(data) if len(data) == self._FORMAT.size else None
+                state, result = func(state)
+                os.pwrite(fd, self._FORMAT.pack(*state), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        return result
+
+
+class TokenBucket:
+    """Token bucket allowing rate calls per second on average, in bursts of up to burst.
+
+    Interactive callers always get a token: when the bucket is empty they
+    reserve the next one (taking the bucket into debt) and wait for it,
+    so they are served in order. Background callers only take a token
+    that is available now and otherwise wait and retry, so they never
+    queue ahead of an interactive caller.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        state: Optional[Any] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._state = state or LocalBucketState()
+        # Wall-clock time, so every process reads the same clock
+        self._clock = clock
+
+    @property
+    def blocking(self) -> bool:
+        """Whether reserve() can wait on I/O or on other processes"""
+        return not math.isinf(self.rate) and self._state.blocking
+
+    def reserve(self, priority: str = INTERACTIVE) -> Tuple[bool, float]:
+        """Try to take a token: (taken, seconds to wait).
+
+        A taken token is usable once the wait has passed; a caller that
+        was not given one should retry after the wait.
+        """
+        if math.isinf(self.rate):
+            return (True, 0.0)
+
+        def take(state: BucketState):
+            now = self._clock()
+            if state is None:
+                tokens = self.burst
+            else:
+                tokens, updated = state
+                tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+            if priority == BACKGROUND and tokens < 1:
+                return (tokens, now), (False, (1 - tokens) / self.rate)
+            tokens -= 1
+            return (tokens, now), (True, max(0.0, -tokens / self.rate))
+
+        return self._state.update(take)
+
+    def acquire(self, priority: str = INTERACTIVE) -> float:
+        """Block until a token is ours and return the time spent waiting"""
+        waited = 0.0
+        while True:
+            taken, delay = self.reserve(priority)
+            if delay > 0:
+                time.sleep(delay)
+                waited += delay
+            if taken:
+                return waited
+
+
+class AsyncRateLimiter:
+    """Non-blocking limiter over a token bucket.
+
+    A bucket shared through a file is reserved from on a thread of the
+    limiter's own, so the event loop never waits on the file lock while
+    other workers hold it. One thread is enough, as this process's
+    reservations are serialized anyway, and being separate from the fetch
+    pool means slow upstream calls never delay a reservation.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self._bucket = bucket
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if bucket.blocking:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit")
+
+    async def _reserve(self, priority: str) -> Tuple[bool, float]:
+        if self._executor is None:
+            return self._bucket.reserve(priority)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._bucket.reserve, priority)
+
+    async def acquire(self, priority: Optional[str] = None) -> float:
+        """Wait for an upstream token and return the time spent waiting.
+
+        priority defaults to the current task's upstream_priority.
+        """
+        priority = priority or upstream_priority.get()
+        waited = 0.0
+        while True:
+            taken, delay = await self._reserve(priority)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+            if taken:
+                return waited
+
+
+def build_upstream_bucket() -> TokenBucket:
+    """Upstream token bucket configured from app settings"""
+    rate = 1 / UPSTREAM_MIN_INTERVAL if UPSTREAM_MIN_INTERVAL > 0 else math.inf
+    if RATE_LIMIT_BACKEND == "file" and fcntl is not None:
+        state = FileBucketState(os.path.join(DATA_DIR, "upstream_rate.bucket"))
+    else:
+        state = LocalBucketState()
+    return TokenBucket(rate, UPSTREAM_BURST, state)
@@ -0,0 +1,42 @@
+"""
+Background refresh of the popular fund catalogue
+"""
+import asyncio
+from typing import Optional
+
+from .async_fund_service import AsyncMutualFundService
+
+
+class CatalogueRefresher:
+    """Periodically re-fetches every catalogue fund so hot endpoints stay warm, and their metadata a few funds at a time"""
+
+    def __init__(self, service: AsyncMutualFundService, interval: float):
+        self._service = service
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self._service.refresh_catalogue()
+            except Exception as e:
+                print(f"Error refreshing fund catalogue: {e}")
+            await asyncio.sleep(self._interval)
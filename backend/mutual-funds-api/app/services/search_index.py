@@ -0,0 +1,189 @@
+"""
+Fund search index - token inverted index, prefix trie and bounded fuzzy matching
+"""
+import re
+import unicodedata
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+# Relative weight of a query token matching each field
+FIELD_WEIGHTS = {"name": 3.0, "family": 2.0, "category": 1.5}
+
+# Match quality by how a query token matched an indexed token
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+FUZZY_MATCH = 0.6
+
+# Query tokens shorter than this are never fuzzy-matched
+FUZZY_MIN_LENGTH = 4
+
+# Query tokens beyond this many are ignored
+MAX_QUERY_TOKENS = 10
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Trie node keys that are not characters: the token ending at the node,
+# and the [first, last) range of vocabulary positions under the node
+_END = "\0"
+_RANGE = "\1"
+
+
+def normalize(text: Optional[str]) -> List[str]:
+    """Lowercase ASCII tokens of text, with accents stripped"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _TOKEN_RE.findall(text.lower())
+
+
+def max_edits(token: str) -> int:
+    """Edit distance tolerated for a query token of this length"""
+    if len(token) < FUZZY_MIN_LENGTH:
+        return 0
+    return 1 if len(token) < 8 else 2
+
+
+class SearchIndex:
+    """Ranked search over fund name, category and family.
+
+    Postings for the sorted vocabulary are packed into flat arrays, so
+    every token, and every run of tokens sharing a prefix, is one
+    contiguous slice. Each trie node records the slice of the tokens
+    below it, which makes a type-ahead prefix one lookup.
+
+    Each query token is matched exactly, as a prefix of indexed tokens,
+    or, when neither finds anything, within a small edit distance. Funds
+    are ranked by how many query tokens they match, then by weighted
+    match quality, then by shorter name.
+    """
+
+    def __init__(self, entries: Mapping[str, Mapping[str, Any]]):
+        # References to the entries themselves; result dicts are only built for hits
+        self._docs: List[Tuple[str, Mapping[str, Any]]] = list(entries.items())
+        postings: Dict[str, Dict[int, float]] = {}
+        for doc_id, (symbol, entry) in enumerate(self._docs):
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in normalize(entry.get(field)):
+                    token_postings = postings.setdefault(token, {})
+                    if token_postings.get(doc_id, 0) < weight:
+                        token_postings[doc_id] = weight
+
+        vocabulary = sorted(postings)
+        self._positions = {token: position for position, token in enumerate(vocabulary)}
+        self._offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        self._offsets[1:] = np.cumsum([len(postings[token]) for token in vocabulary])
+        self._doc_ids = np.fromiter(
+            (doc_id for token in vocabulary for doc_id in postings[token]), dtype=np.int32, count=self._offsets[-1]
+        )
+        self._weights = np.fromiter(
+            (weight for token in vocabulary for weight in postings[token].values()), dtype=np.float32,
+            count=self._offsets[-1]
+        )
+        self._name_lengths = np.array([len(entry.get("name") or "") for _, entry in self._docs], dtype=np.int64)
+
+        self._trie: Dict[str, Any] = {}
+        for position, token in enumerate(vocabulary):
+            node = self._trie
+            for char in token:
+                node = node.setdefault(char, {_RANGE: [position, position]})
+                node[_RANGE][1] = position + 1
+            node[_END] = token
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _slice(self, first: int, last: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Doc ids and field weights of vocabulary positions [first, last)"""
+        start, stop = self._offsets[first], self._offsets[last]
+        return self._doc_ids[start:stop], self._weights[start:stop]
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Vocabulary positions of tokens that extend prefix, excluding prefix itself"""
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return (0, 0)
+        first, last = node[_RANGE]
+        # prefix sorts before all of its extensions
+        return (first + 1 if _END in node else first, last)
+
+    def _fuzzy_tokens(self, token: str, limit: int) -> List[Tuple[str, int]]:
+        """Indexed tokens within limit edits of token, walking the trie with one DP row per node"""
+        matches = []
+
+        def walk(node: Dict[str, Any], char: str, previous_row: List[int]):
+            row = [previous_row[0] + 1]
+            for column in range(1, len(token) + 1):
+                row.append(min(
+                    row[column - 1] + 1,
+                    previous_row[column] + 1,
+                    previous_row[column - 1] + (token[column - 1] != char),
+                ))
+            if row[-1] <= limit and _END in node:
+                matches.append((node[_END], row[-1]))
+            # Every extension of this node costs at least min(row) edits
+            if min(row) <= limit:
+                for next_char, child in node.items():
+                    if next_char not in (_END, _RANGE):
+                        walk(child, next_char, row)
+
+        first_row = list(range(len(token) + 1))
+        for char, child in self._trie.items():
+            walk(child, char, first_row)
+        return matches
+
+    def _token_scores(self, token: str) -> np.ndarray:
+        """Best match score per document for one query token"""
+        scores = np.zeros(len(self._docs), dtype=np.float32)
+        found = False
+
+        position = self._positions.get(token)
+        if position is not None:
+            doc_ids, weights = self._slice(position, position + 1)
+            scores[doc_ids] = weights * EXACT_MATCH
+            found = True
+
+        first, last = self._prefix_range(token)
+        if first < last:
+            doc_ids, weights = self._slice(first, last)
+            np.maximum.at(scores, doc_ids, weights * PREFIX_MATCH)
+            found = True
+
+        if not found and max_edits(token):
+            for indexed, distance in self._fuzzy_tokens(token, max_edits(token)):
+                position = self._positions[indexed]
+                doc_ids, weights = self._slice(position, position + 1)
+                np.maximum.at(scores, doc_ids, weights * (FUZZY_MATCH / distance))
+        return scores
+
+    def search(self, query: str, limit: Optional[int] = 20) -> List[Dict[str, Any]]:
+        """Funds matching query, best first"""
+        tokens = list(dict.fromkeys(normalize(query)))[:MAX_QUERY_TOKENS]
+        if not tokens or not self._docs:
+            return []
+
+        matched = np.zeros(len(self._docs), dtype=np.float64)
+        totals = np.zeros(len(self._docs), dtype=np.float64)
+        for token in tokens:
+            scores = self._token_scores(token)
+            matched += scores > 0
+            totals += scores
+
+        candidates = np.flatnonzero(matched)
+        if limit is not None and limit < len(candidates):
+            # Totals stay far below 1e3, so this key orders by tokens matched, then total score, exactly
+            keys = matched[candidates] * 1e3 + totals[candidates]
+            cutoff = np.partition(keys, len(keys) - limit)[len(keys) - limit]
+            # Everything tied with the last place stays in, for name length to decide between them
+            candidates = candidates[keys >= cutoff]
+        order = np.lexsort((candidates, self._name_lengths[candidates], -totals[candidates], -matched[candidates]))
+        return [self._result(doc_id) for doc_id in candidates[order][:limit]]
+
+    def _result(self, doc_id: int) -> Dict[str, Any]:
+        symbol, entry = self._docs[doc_id]
+        return {
+            "symbol": symbol,
+            "name": entry.get("name"),
+            "category": entry.get("category"),
+            "fund_family": entry.get("family"),
+        }
@@ -0,0 +1,42 @@
+"""
+NAV history serialization - column-wise conversion between frames and response shapes
+
+History is held internally in the columnar shape {"dates": [...], "nav": [...]}
+and only expanded into per-day records at the response edge.
+"""
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from app.lazy import lazy_import
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+def empty_history() -> Dict[str, list]:
+    return {"dates": [], "nav": []}
+
+
+def closes_to_columns(closes: "pd.Series") -> Dict[str, list]:
+    """Format dates and round NAVs over whole columns, without a per-row Python loop"""
+    closes = closes.dropna()
+    return {
+        "dates": closes.index.strftime("%Y-%m-%d").tolist(),
+        "nav": closes.round(2).tolist(),
+    }
+
+
+def columns_to_records(columns: Dict[str, list]) -> List[Dict[str, Any]]:
+    """Expand columnar history into [{"date": ..., "nav": ...}, ...], with any further columns (open, high, low)"""
+    if len(columns) == 2:
+        return [{"date": day, "nav": nav} for day, nav in zip(columns["dates"], columns["nav"])]
+    names = ["date" if name == "dates" else name for name in columns]
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def format_history(columns: Dict[str, list], shape: str = "records") -> Any:
+    """Columnar history in the requested response shape"""
+    if shape == "columns":
+        return columns
+    return columns_to_records(columns)
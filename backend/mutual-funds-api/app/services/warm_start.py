@@ -0,0 +1,120 @@
+"""
+Warm-start snapshot - cache contents saved to disk and reloaded when a worker starts
+"""
+import asyncio
+import os
+import pickle
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from app.config import DATA_DIR, STALE_TTL, WARM_START_ENABLED, WARM_START_INTERVAL, WARM_START_PATH
+from .cache import Cache, CacheEntry
+
+SNAPSHOT_VERSION = 1
+
+
+class WarmStartSnapshot:
+    """Saves the in-process caches to one file and restores them on the next start.
+
+    The file is replaced atomically, so a worker stopping mid-save never
+    leaves a partial snapshot, and concurrent workers saving to the same
+    path simply leave the last one written. Entries that expired more than
+    max_stale seconds ago are not restored, as they could not be served.
+
+    The snapshot is pickled, and unpickling can run arbitrary code, so the
+    file must only be writable by the service itself; this is why warm
+    start is off unless WARM_START_ENABLED is set.
+    """
+
+    def __init__(self, path: str, caches: Dict[str, Cache], interval: float = 0, max_stale: float = STALE_TTL):
+        self.path = path
+        self._caches = caches
+        self._interval = interval
+        self._max_stale = max_stale
+        self._task: Optional[asyncio.Task] = None
+        self.saved_at: Optional[float] = None
+        self.loaded: Dict[str, int] = {}  # Entries restored per cache at startup
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def save(self) -> int:
+        """Write every cache's entries to the snapshot file; returns how many were written"""
+        caches = {
+            name: [(key, entry.value, entry.expires_at) for key, entry in cache.snapshot()]
+            for name, cache in self._caches.items()
+        }
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".warm-start-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(
+                    {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "caches": caches},
+                    f, pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.saved_at = time.time()
+        return sum(len(entries) for entries in caches.values())
+
+    def load(self) -> int:
+        """Restore cache entries from the snapshot file, if there is a usable one; returns how many"""
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print(f"Error reading warm-start snapshot {self.path}: {e}")
+            return 0
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            return 0
+
+        oldest = time.time() - self._max_stale
+        for name, entries in snapshot["caches"].items():
+            cache = self._caches.get(name)
+            if cache is None:
+                continue
+            self.loaded[name] = cache.restore(
+                (key, CacheEntry(value, expires_at)) for key, value, expires_at in entries if expires_at >= oldest
+            )
+        return sum(self.loaded.values())
+
+    def start(self):
+        """Save periodically, if an interval is set, so a crashed worker still leaves a recent snapshot"""
+        if self._interval > 0 and not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.save)
+            except Exception as e:
+                print(f"Error saving warm-start snapshot: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "loaded": self.loaded, "saved_at": self.saved_at}
+
+
+def build_warm_start(caches: Dict[str, Cache]) -> Optional[WarmStartSnapshot]:
+    """Warm-start snapshot of caches configured from app settings, or None if disabled"""
+    if not WARM_START_ENABLED:
+        return None
+    path = WARM_START_PATH or os.path.join(DATA_DIR, "warm_start.pickle")
+    return WarmStartSnapshot(path, caches, WARM_START_INTERVAL)
@@ -0,0 +1,6 @@
+# Benchmarks Package
+import os
+import tempfile
+
+# Keep benchmark runs from reading or writing the real persistent history store
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="mf-bench-"))
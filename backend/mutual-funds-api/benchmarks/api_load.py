@@ -0,0 +1,219 @@
+"""
+Load test: every fund route at increasing concurrency against a stubbed upstream, plus service microbenchmarks
+
+Runs the FastAPI app from main.py in process with yfinance replaced by a stub with
+injected latency and an optional 429 rate, over a synthetic catalogue. For each
+route and concurrency level it reports throughput, p50/p95/p99 latency, upstream
+calls and peak RSS; then times search_funds, history serialization and
+calculate_portfolio_value on their own. --json writes the results for comparing
+runs.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.api_load --levels 1,10,50,100,500 --latency 0.05 --error-rate 0.01
+    python -m benchmarks.api_load --routes nav,history --levels 100 --cold
+    python -m benchmarks.api_load --micro-only
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.catalogue_memory import write_master_file
+from benchmarks.common import percentiles
+from tests.helpers import install_stub_upstream
+
+API = "/api/mutual-funds"
+
+# Request for each route: (method, path, JSON body) from a random source and symbol picker
+Request = Tuple[str, str, Optional[Any]]
+
+
+def route_requests(words: List[str]) -> Dict[str, Callable[[random.Random, Callable[[int], List[str]]], Request]]:
+    return {
+        "list": lambda rng, pick: ("GET", f"{API}/?limit=50&offset={rng.randrange(0, 20)}", None),
+        "search": lambda rng, pick: ("GET", f"{API}/search?q={rng.choice(words)}", None),
+        "categories": lambda rng, pick: ("GET", f"{API}/categories", None),
+        "history_batch": lambda rng, pick: ("GET", f"{API}/history/batch?symbols={','.join(pick(5))}&period=1y", None),
+        "nav_batch": lambda rng, pick: ("GET", f"{API}/nav/batch?symbols={','.join(pick(10))}", None),
+        "nav_batch_post": lambda rng, pick: ("POST", f"{API}/nav/batch", {"symbols": pick(10)}),
+        "detail": lambda rng, pick: ("GET", f"{API}/{pick(1)[0]}", None),
+        "nav": lambda rng, pick: ("GET", f"{API}/{pick(1)[0]}/nav", None),
+        "history": lambda rng, pick: ("GET", f"{API}/{pick(1)[0]}/history?period=1y", None),
+        "analytics": lambda rng, pick: ("GET", f"{API}/{pick(1)[0]}/analytics", None),
+        "portfolio": lambda rng, pick: ("POST", f"{API}/portfolio/calculate", [
+            {"symbol": symbol, "units": rng.randrange(1, 500), "avg_nav": round(rng.uniform(10, 900), 2)}
+            for symbol in pick(5)
+        ]),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def drive(client: httpx.AsyncClient, requests: List[Request], concurrency: int) -> Tuple[List[float], int]:
+    """Send requests with at most concurrency in flight; (latencies, errors)"""
+    queue = iter(requests)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for method, path, body in queue:
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 500
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+async def run_load(args: argparse.Namespace, symbols: List[str], words: List[str]) -> List[Dict[str, Any]]:
+    from main import app
+    from app.services import mutual_fund_service
+
+    upstream = install_stub_upstream(args.latency, args.error_rate)
+    factories = route_requests(words)
+    routes = args.routes or list(factories)
+    rng = random.Random(args.seed)
+    pick = lambda count: rng.sample(symbols, count)
+    results = []
+
+    print(f"{'route':<15} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'5xx':>5} {'upstream':>9} {'429s':>5} {'rss MB':>7}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for route in routes:
+            for concurrency in args.levels:
+                if args.cold:
+                    for cache in (mutual_fund_service._quotes, mutual_fund_service._history,
+                                  mutual_fund_service._metadata, mutual_fund_service._analytics):
+                        cache.clear()
+                requests = [factories[route](rng, pick) for _ in range(max(args.requests, concurrency))]
+                calls, rate_limited = upstream.total_calls, upstream.rate_limited
+                start = time.perf_counter()
+                latencies, errors = await drive(client, requests, concurrency)
+                elapsed = time.perf_counter() - start
+                stats = percentiles(latencies)
+                result = {
+                    "route": route,
+                    "concurrency": concurrency,
+                    "requests": len(latencies),
+                    "throughput": len(latencies) / elapsed,
+                    "p50_ms": stats["p50"],
+                    "p95_ms": stats["p95"],
+                    "p99_ms": stats["p99"],
+                    "errors": errors,
+                    "upstream_calls": upstream.total_calls - calls,
+                    "rate_limited": upstream.rate_limited - rate_limited,
+                    "peak_rss_mb": peak_rss_mb(),
+                }
+                results.append(result)
+                print(f"{route:<15} {concurrency:>5} {result['throughput']:>8.0f} {stats['p50']:>8.2f} "
+                      f"{stats['p95']:>8.2f} {stats['p99']:>8.2f} {errors:>5} {result['upstream_calls']:>9} "
+                      f"{result['rate_limited']:>5} {result['peak_rss_mb']:>7.0f}")
+        circuit = (await client.get("/health")).json()["upstream"]
+    print(f"\nupstream circuit: state={circuit['state']} opened={circuit['opened']} refused={circuit['refused']}")
+    return results
+
+
+def per_call(func: Callable[[], Any], number: int) -> float:
+    """Best-of-5 seconds per call"""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def run_micro(args: argparse.Namespace, directory: str) -> Dict[str, float]:
+    from app.services.catalogue import CatalogueLoader
+    from app.services import AsyncMutualFundService, MutualFundService
+    from app.services.serialization import closes_to_columns, format_history
+    from tests.helpers import StubUpstream, fresh_history_store
+
+    results = {}
+    print("\nmicrobenchmarks")
+
+    micro_directory = os.path.join(directory, "micro")
+    os.makedirs(micro_directory, exist_ok=True)
+    path = write_master_file(micro_directory, args.micro_funds)
+    service = MutualFundService(history_store=fresh_history_store(), catalogue=CatalogueLoader(path, {}, 3600))
+    for query in ("hdfc", "sbi small cap", "flexi", "axsi bluechp"):
+        seconds = per_call(lambda: service.search_funds(query), 200)
+        results[f"search_funds[{query}]"] = seconds
+        print(f"  search_funds {query!r:<16} {args.micro_funds} funds  {seconds * 1e6:9.1f}us")
+
+    columns = closes_to_columns(StubUpstream(latency=0).make_history("0P0000XW1B.BO", "5y")["Close"])
+    for shape in ("records", "columns"):
+        seconds = per_call(lambda: json.dumps(format_history(columns, shape)), 200)
+        results[f"history_serialization[{shape}]"] = seconds
+        print(f"  history 5y -> {shape:<8} + json  {len(columns['dates'])} points  {seconds * 1e6:9.1f}us")
+
+    install_stub_upstream(0)
+    symbols = service.get_catalogue_symbols()[:20]
+    holdings = [{"symbol": symbol, "units": 100 + i, "avg_nav": 50.0 + i} for i, symbol in enumerate(symbols)]
+    async_service = AsyncMutualFundService(service)
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(async_service.calculate_portfolio_value(holdings))  # Warm the quote cache
+        seconds = per_call(lambda: loop.run_until_complete(async_service.calculate_portfolio_value(holdings)), 500)
+    finally:
+        loop.close()
+        async_service.shutdown()
+    results["calculate_portfolio_value[20]"] = seconds
+    print(f"  calculate_portfolio_value {len(holdings)} holdings, cached quotes  {seconds * 1e6:9.1f}us")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=lambda s: [int(level) for level in s.split(",")], default=[1, 10, 50, 100, 500],
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--routes", type=lambda s: s.split(","), default=None, help="Comma-separated routes (default all)")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per route and level (at least the level)")
+    parser.add_argument("--funds", type=int, default=500, help="Funds in the synthetic catalogue")
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected upstream latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls answered with a 429")
+    parser.add_argument("--cold", action="store_true", help="Clear the caches before every route and level")
+    parser.add_argument("--min-interval", default="0", help="UPSTREAM_MIN_INTERVAL override")
+    parser.add_argument("--micro-funds", type=int, default=40000, help="Catalogue size for the search microbenchmark")
+    parser.add_argument("--micro-only", action="store_true", help="Only run the microbenchmarks")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_master_file(directory, args.funds)
+        # The app reads these when main is first imported
+        os.environ["CATALOGUE_PATH"] = path
+        os.environ["UPSTREAM_MIN_INTERVAL"] = args.min_interval
+        os.environ["DATA_PROVIDER"] = "yahoo"  # The provider the stub stands in for
+
+        from app.services.catalogue import read_rows
+
+        rows = read_rows(path)
+        symbols = [row["symbol"] for row in rows]
+        words = sorted({word.lower() for row in rows for word in row["name"].split() if len(word) > 3})
+        print(f"{len(symbols)} funds, upstream latency {args.latency}s, 429 rate {args.error_rate:.1%}, "
+              f"{'cold' if args.cold else 'warm'} caches\n")
+
+        results: Dict[str, Any] = {"args": vars(args)}
+        if not args.micro_only:
+            results["load"] = asyncio.run(run_load(args, symbols, words))
+        results["micro"] = run_micro(args, directory)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Upstream calls and wall time for the fund catalogue: per-symbol vs bulk fetch
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.batch_fetch --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from tests.helpers import fresh_history_store, install_stub_upstream
+
+
+async def measure(label: str, upstream, coro_factory) -> None:
+    for phase in ("cold", "warm"):
+        before = upstream.total_calls
+        start = time.perf_counter()
+        await coro_factory()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24} {phase:<5} {elapsed:7.3f}s  upstream calls={upstream.total_calls - before}")
+
+
+async def run(args: argparse.Namespace):
+    from app.services import AsyncMutualFundService, MutualFundService
+    from app.services.fund_service import POPULAR_INDIAN_MF
+
+    symbols = list(POPULAR_INDIAN_MF)
+    print(f"catalogue: {len(symbols)} funds, injected latency {args.latency}s\n")
+
+    # Per-symbol .info calls, concurrent under the shared limiter
+    upstream = install_stub_upstream(args.latency)
+    service = AsyncMutualFundService(MutualFundService(history_store=fresh_history_store()), fanout_deadline=600)
+
+    async def per_symbol():
+        await asyncio.gather(*(service.get_fund_info(symbol) for symbol in symbols))
+
+    await measure("quotes per-symbol", upstream, per_symbol)
+
+    # Bulk download path used by the fund list, portfolio and batch endpoints
+    upstream = install_stub_upstream(args.latency)
+    service = AsyncMutualFundService(MutualFundService(history_store=fresh_history_store()), fanout_deadline=600)
+    await measure("quotes bulk", upstream, lambda: service.get_fund_infos(symbols))
+
+    upstream = install_stub_upstream(args.latency)
+    service = AsyncMutualFundService(MutualFundService(history_store=fresh_history_store()), fanout_deadline=600)
+
+    async def history_per_symbol():
+        await asyncio.gather(*(service.get_historical_nav(symbol, args.period) for symbol in symbols))
+
+    await measure(f"history {args.period} per-symbol", upstream, history_per_symbol)
+
+    upstream = install_stub_upstream(args.latency)
+    service = AsyncMutualFundService(MutualFundService(history_store=fresh_history_store()), fanout_deadline=600)
+    await measure(f"history {args.period} bulk", upstream, lambda: service.get_batch_history(symbols, args.period))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.3, help="Injected upstream latency (seconds)")
+    parser.add_argument("--period", default="1y")
+    parser.add_argument("--min-interval", type=str, default="0.5", help="UPSTREAM_MIN_INTERVAL override")
+    args = parser.parse_args()
+
+    os.environ["UPSTREAM_MIN_INTERVAL"] = args.min_interval
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
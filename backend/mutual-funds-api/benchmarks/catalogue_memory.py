@@ -0,0 +1,121 @@
+"""
+Memory benchmark: fund catalogue as dict-of-dicts vs __slots__ records with interned strings
+
+Writes a synthetic scheme master file, then measures with tracemalloc the memory
+retained by each representation after loading it, plus load and hot-reload times.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.catalogue_memory --entries 40000
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.search import synthetic_catalogue
+
+COLUMNS = ["symbol", "name", "category", "family", "fallback_nav",
+           "one_year_return", "three_year_return", "five_year_return", "popular"]
+
+
+def write_master_file(directory: str, entries: int) -> str:
+    """A CSV scheme master with numeric columns and a handful of popular funds"""
+    rng = random.Random(11)
+    path = os.path.join(directory, "schemes.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for position, (symbol, fund) in enumerate(synthetic_catalogue(entries).items()):
+            writer.writerow([
+                symbol, fund["name"], fund["category"], fund["family"],
+                round(rng.uniform(10, 2000), 2), round(rng.uniform(-5, 35), 1),
+                round(rng.uniform(-5, 30), 1), round(rng.uniform(0, 28), 1),
+                "true" if position < 20 else "false",
+            ])
+    return path
+
+
+def dict_of_dicts(path: str) -> dict:
+    """The current representation: one dict of strings and floats per fund"""
+    with open(path, newline="", encoding="utf-8") as f:
+        return {
+            row["symbol"]: {
+                "name": row["name"], "category": row["category"], "family": row["family"],
+                "fallback_nav": float(row["fallback_nav"]),
+                "one_year_return": float(row["one_year_return"]),
+                "three_year_return": float(row["three_year_return"]),
+                "five_year_return": float(row["five_year_return"]),
+            }
+            for row in csv.DictReader(f)
+        }
+
+
+def records(path: str) -> dict:
+    from app.services.catalogue import FundRecord, read_rows
+
+    return {row["symbol"]: FundRecord.from_row(row) for row in read_rows(path)}
+
+
+def retained(load, path: str):
+    """Bytes still allocated after load(path) returns, with the result kept alive"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load(path)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def run(args: argparse.Namespace):
+    from app.services.catalogue import Catalogue, CatalogueLoader
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_master_file(directory, args.entries)
+        print(f"{args.entries} funds, master file {os.path.getsize(path) / 1e6:.1f} MB")
+
+        baseline, baseline_size, baseline_time = retained(dict_of_dicts, path)
+        compact, compact_size, compact_time = retained(records, path)
+        assert baseline.keys() == compact.keys()
+        print(f"{'dict-of-dicts':<24} {baseline_size / 1e6:7.1f} MB  {baseline_size / args.entries:6.0f} B/fund  "
+              f"load {baseline_time:.2f}s")
+        print(f"{'__slots__ + interned':<24} {compact_size / 1e6:7.1f} MB  {compact_size / args.entries:6.0f} B/fund  "
+              f"load {compact_time:.2f}s  ({baseline_size / compact_size:.1f}x smaller)")
+        del baseline, compact
+
+        _, catalogue_size, catalogue_time = retained(Catalogue.from_file, path)
+        print(f"{'catalogue + search index':<24} {catalogue_size / 1e6:7.1f} MB  "
+              f"{catalogue_size / args.entries:6.0f} B/fund  load {catalogue_time:.2f}s")
+
+        # Hot reload: touch the file and time until the new catalogue is serving
+        loader = CatalogueLoader(path, {}, check_interval=0)
+        before = loader.current()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("NEW.BO,New Scheme Fund,Flexi Cap,PPFAS,10,,,,true\n")
+        os.utime(path, (time.time() + 1, time.time() + 1))
+        start = time.perf_counter()
+        stalls = []
+        while loader.current() is before:
+            call = time.perf_counter()
+            loader.current()
+            stalls.append(time.perf_counter() - call)
+            time.sleep(0.001)
+        print(f"hot reload: new catalogue serving after {time.perf_counter() - start:.2f}s, "
+              f"{len(loader.current())} funds; slowest lookup meanwhile {max(stalls, default=0) * 1e3:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=40000)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Circuit breaker check: a rate-limit burst opens the circuit, and a probe closes it once upstream recovers
+
+Runs against the app with a stubbed upstream and a short backoff, and exits
+non-zero if any step does not behave as expected.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.circuit_breaker
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from tests.helpers import install_stub_upstream
+
+SYMBOLS = ["0P0000XVHO.BO", "0P0000XVLZ.BO", "0P0000XW2M.BO", "0P0000XVOF.BO", "0P0000XVAN.BO"]
+
+RATE_LIMITED = Exception("429 Client Error: Too Many Requests")
+
+
+async def nav(client: httpx.AsyncClient, symbol: str) -> dict:
+    response = await client.get(f"/api/mutual-funds/{symbol}/nav")
+    response.raise_for_status()
+    fund = await client.get(f"/api/mutual-funds/{symbol}")
+    return fund.json()["data"]["fund"]
+
+
+async def health(client: httpx.AsyncClient) -> dict:
+    return (await client.get("/health")).json()
+
+
+async def run(args: argparse.Namespace) -> bool:
+    from main import app
+    from app.services import mutual_fund_service
+
+    upstream = install_stub_upstream(args.latency)
+    transport = httpx.ASGITransport(app=app)
+    ok = True
+
+    def check(label: str, passed: bool, detail: str = ""):
+        nonlocal ok
+        ok &= passed
+        print(f"{label:<52} {'OK' if passed else 'FAIL'}  {detail}")
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        fund = await nav(client, SYMBOLS[0])
+        state = (await health(client))["upstream"]["state"]
+        check("healthy upstream: circuit closed, live data", state == "closed" and not fund["is_fallback"], state)
+
+        # A rate-limit burst: the first 429 opens the circuit
+        upstream.error = RATE_LIMITED
+        mutual_fund_service._quotes.clear()
+        fund = await nav(client, SYMBOLS[1])
+        status = await health(client)
+        check("429 from upstream: circuit opens, fallback served",
+              status["upstream"]["state"] == "open" and fund["is_fallback"],
+              f"status={status['status']} retry_in={status['upstream']['retry_in']}s")
+
+        calls = upstream.total_calls
+        await asyncio.gather(*(nav(client, symbol) for symbol in SYMBOLS))
+        check("while open: no upstream calls", upstream.total_calls == calls,
+              f"calls during open={upstream.total_calls - calls}")
+
+        # Still rate limited when the backoff ends: the probe fails and the backoff doubles
+        first_backoff = status["upstream"]["retry_in"]
+        await asyncio.sleep(first_backoff + 0.1)
+        await nav(client, SYMBOLS[2])
+        status = await health(client)
+        check("failed probe: circuit re-opens with a longer backoff",
+              status["upstream"]["state"] == "open" and status["upstream"]["retry_in"] > first_backoff,
+              f"retry_in={status['upstream']['retry_in']}s")
+
+        # Upstream recovers: the next probe closes the circuit
+        upstream.error = None
+        await asyncio.sleep(status["upstream"]["retry_in"] + 0.1)
+        start = time.perf_counter()
+        fund = await nav(client, SYMBOLS[3])
+        status = await health(client)
+        check("recovered upstream: probe closes circuit, live data",
+              status["upstream"]["state"] == "closed" and not fund["is_fallback"],
+              f"status={status['status']} probe took {time.perf_counter() - start:.2f}s")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected upstream latency (seconds)")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Base circuit backoff (seconds)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("UPSTREAM_MIN_INTERVAL", "0")
+    os.environ.setdefault("BREAKER_BASE_BACKOFF", str(args.backoff))
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
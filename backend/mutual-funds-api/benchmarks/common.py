@@ -0,0 +1,23 @@
+"""
+Shared helpers for benchmarks - latency stats; the stubbed yfinance upstream lives in tests.helpers
+"""
+from typing import Dict, List
+
+import numpy as np
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max of latency samples, in milliseconds"""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    arr = np.asarray(samples) * 1000
+    return {
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+    }
+
+
+def format_stats(label: str, stats: Dict[str, float]) -> str:
+    return f"{label:<28} " + "  ".join(f"{k}={v:8.2f}ms" for k, v in stats.items())
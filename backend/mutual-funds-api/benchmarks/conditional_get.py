@@ -0,0 +1,151 @@
+"""
+Conditional GET check: repeat polls of unchanged fund data are served from encoded bytes or answered 304
+
+Warms the caches against a stubbed upstream, then for large fund routes times
+a first request, repeat requests (identity and compressed) and revalidations
+with If-None-Match, and reports bytes on the wire. Checks the ETag is stable
+while the data is, differs per content coding, changes when the cached data
+is refreshed, compressed bodies decode to the identity body, and large
+responses of other routes are compressed by the middleware. Exits non-zero if any check fails.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.conditional_get --requests 500
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.common import format_stats, percentiles
+from tests.helpers import install_stub_upstream
+
+API = "/api/mutual-funds"
+SYMBOLS = ["0P0000XVHO.BO", "0P0000XVLZ.BO", "0P0000XW2M.BO", "0P0000XW1B.BO", "0P0000XVKR.BO"]
+ROUTES = {
+    "detail 5y": f"{API}/{SYMBOLS[0]}?period=5y",
+    "history 5y": f"{API}/{SYMBOLS[0]}/history?period=5y",
+    "history batch 1y": f"{API}/history/batch?symbols={','.join(SYMBOLS)}&period=1y",
+    "nav": f"{API}/{SYMBOLS[0]}/nav",
+}
+
+
+async def timed(client: httpx.AsyncClient, url: str, requests: int, headers: Dict[str, str]) -> Tuple[List[float], int]:
+    """Latencies of requests, and the bytes of the last body as sent"""
+    latencies = []
+    size = 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        size = len(response.content) if response.headers.get("content-encoding") is None else int(
+            response.headers.get("content-length", 0))
+    return latencies, size
+
+
+async def run(args: argparse.Namespace) -> bool:
+    from main import app
+    from app.responses import response_cache
+    from app.services import mutual_fund_service
+
+    ok = True
+
+    def check(label: str, passed: bool, detail: str = ""):
+        nonlocal ok
+        ok &= passed
+        print(f"{label:<52} {'OK' if passed else 'FAIL'}  {detail}")
+
+    install_stub_upstream(args.latency)
+    transport = httpx.ASGITransport(app=app)
+    # httpx would decode compressed bodies; ask for raw bytes to see what goes on the wire
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        identity = {"Accept-Encoding": "identity"}
+        compressed = {"Accept-Encoding": "gzip, br"}
+
+        print(f"{'route':<18} {'case':<22} {'p50 ms':>8} {'p95 ms':>8} {'bytes':>9}")
+        for label, url in ROUTES.items():
+            first = await client.get(url, headers=identity)
+            etag = first.headers.get("etag")
+            cases = {
+                "repeat, identity": identity,
+                "repeat, compressed": compressed,
+                "If-None-Match (304)": {**identity, "If-None-Match": etag or ""},
+            }
+            for case, headers in cases.items():
+                latencies, size = await timed(client, url, args.requests, headers)
+                stats = percentiles(latencies)
+                print(f"{label:<18} {case:<22} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {size:>9}")
+
+            # Without the encoded-body cache every request builds and encodes the payload again
+            latencies = []
+            for _ in range(args.requests):
+                response_cache.clear()
+                start = time.perf_counter()
+                await client.get(url, headers=identity)
+                latencies.append(time.perf_counter() - start)
+            stats = percentiles(latencies)
+            print(f"{label:<18} {'re-encoded each time':<22} {stats['p50']:>8.3f} {stats['p95']:>8.3f} "
+                  f"{len(first.content):>9}")
+
+        url = ROUTES["history 5y"]
+        first = await client.get(url, headers=identity)
+        etag = first.headers.get("etag")
+        again = await client.get(url, headers=identity)
+        check("ETag is stable while the data is", bool(etag) and again.headers.get("etag") == etag, etag or "")
+
+        revalidated = await client.get(url, headers={**identity, "If-None-Match": f'W/{etag}, "other"'})
+        check("If-None-Match answers 304 with no body", revalidated.status_code == 304 and not revalidated.content)
+
+        raw = await client.get(url, headers={"Accept-Encoding": "gzip"})
+        check("gzip body decodes to the identity body",
+              raw.headers.get("content-encoding") == "gzip" and raw.content == first.content,
+              f"{len(first.content)} -> {raw.headers.get('content-length')} bytes")
+
+        gzip_etag = raw.headers.get("etag")
+        check("each content coding has its own strong ETag",
+              bool(gzip_etag) and gzip_etag != etag and not gzip_etag.startswith("W/"), gzip_etag or "")
+        gzip_revalidated = await client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+        crossed = await client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        check("a tag only revalidates its own coding",
+              gzip_revalidated.status_code == 304 and crossed.status_code == 200)
+
+        # Refreshed data replaces the cache entry with a new object
+        key = (SYMBOLS[0], "5y")
+        columns = mutual_fund_service._history.peek(key)
+        mutual_fund_service._history.set(key, {"dates": columns["dates"], "nav": [nav + 1 for nav in columns["nav"]]})
+        refreshed = await client.get(url, headers={**identity, "If-None-Match": etag})
+        check("refreshed data gets a new body and ETag",
+              refreshed.status_code == 200 and refreshed.headers.get("etag") != etag)
+
+        posted = await client.post(f"{API}/nav/batch", json={"symbols": SYMBOLS},
+                                   headers={"If-None-Match": "*"})
+        check("POST is never answered 304", posted.status_code == 200)
+
+        listing = await client.get(f"{API}/?limit=100", headers={"Accept-Encoding": "gzip"})
+        plain = await client.get(f"{API}/?limit=100", headers=identity)
+        check("middleware compresses other large responses",
+              listing.headers.get("content-encoding") == "gzip"
+              and len(plain.content) > int(listing.headers.get("content-length", 0)),
+              f"{len(plain.content)} -> {listing.headers.get('content-length')} bytes")
+        small = await client.get(f"{API}/categories", headers={"Accept-Encoding": "gzip"})
+        check("small responses are left uncompressed",
+              small.headers.get("content-encoding") is None or len(small.content) >= 1024)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per route and case")
+    parser.add_argument("--latency", type=float, default=0.01, help="Injected upstream latency (seconds)")
+    args = parser.parse_args()
+
+    os.environ["UPSTREAM_MIN_INTERVAL"] = "0"
+    os.environ["DATA_PROVIDER"] = "yahoo"  # The provider the stub stands in for
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Downsampling check: chart-sized NAV history is smaller and cheaper to serve than the full series
+
+Warms the caches against a stubbed upstream, then for each period compares
+the full history route with points=300 (LTTB) and interval=1wk / 1mo (OHLC
+aggregation): points returned, bytes on the wire, and the time to build and
+encode the response when nothing is cached yet and when the downsampled
+series is. Checks the downsampled series keep the first and last point,
+never exceed the requested points, weekly points carry consistent OHLC
+values, repeat requests are served from the chart cache, and returns in the
+fund detail are unchanged by downsampling. Exits non-zero if any check fails.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.downsampling --requests 200
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.common import percentiles
+from tests.helpers import install_stub_upstream
+
+API = "/api/mutual-funds"
+SYMBOL = "0P0000XVHO.BO"
+PERIODS = ["1y", "2y", "5y"]
+CASES = {
+    "full": "",
+    "points=300": "&points=300",
+    "interval=1wk": "&interval=1wk",
+    "interval=1mo": "&interval=1mo",
+    "1wk, points=100": "&interval=1wk&points=100",
+}
+
+
+async def timed(client: httpx.AsyncClient, url: str, requests: int, clear) -> List[float]:
+    latencies = []
+    for _ in range(requests):
+        clear()
+        start = time.perf_counter()
+        await client.get(url, headers={"Accept-Encoding": "identity"})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run(args: argparse.Namespace) -> bool:
+    from main import app
+    from app.responses import response_cache
+    from app.services import mutual_fund_service
+
+    ok = True
+
+    def check(label: str, passed: bool, detail: str = ""):
+        nonlocal ok
+        ok &= passed
+        print(f"{label:<52} {'OK' if passed else 'FAIL'}  {detail}")
+
+    def clear_all():
+        response_cache.clear()
+        mutual_fund_service._charts.clear()
+
+    install_stub_upstream(args.latency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'period':<6} {'case':<17} {'points':>7} {'bytes':>9} {'gzip':>8} {'cold p50 ms':>12} {'cached p50 ms':>14}")
+        for period in PERIODS:
+            for case, query in CASES.items():
+                url = f"{API}/{SYMBOL}/history?period={period}{query}"
+                body = await client.get(url, headers={"Accept-Encoding": "identity"})
+                compressed = await client.get(url, headers={"Accept-Encoding": "gzip"})
+                gzip_size = compressed.headers.get("content-length", str(len(compressed.content)))
+                # Cold: chart and encoded body rebuilt each time; cached: only the encoded body is
+                cold = percentiles(await timed(client, url, args.requests, clear_all))
+                cached = percentiles(await timed(client, url, args.requests, response_cache.clear))
+                print(f"{period:<6} {case:<17} {body.json()['data']['count']:>7} {len(body.content):>9} {gzip_size:>8} "
+                      f"{cold['p50']:>12.3f} {cached['p50']:>14.3f}")
+
+        full = (await client.get(f"{API}/{SYMBOL}/history?period=5y&format=columns")).json()["data"]
+        chart = (await client.get(f"{API}/{SYMBOL}/history?period=5y&format=columns&points=300")).json()["data"]
+        dates, chart_dates = full["history"]["dates"], chart["history"]["dates"]
+        check("points=300 returns at most 300 points", chart["count"] <= 300, f"{full['count']} -> {chart['count']}")
+        check("first and last point are kept",
+              chart_dates[0] == dates[0] and chart_dates[-1] == dates[-1]
+              and chart["history"]["nav"][-1] == full["history"]["nav"][-1])
+        check("source_count reports the full series", chart["source_count"] == full["count"])
+
+        weekly = (await client.get(f"{API}/{SYMBOL}/history?period=5y&interval=1wk")).json()["data"]["history"]
+        check("weekly points carry consistent OHLC values",
+              all(p["low"] <= min(p["open"], p["nav"]) and p["high"] >= max(p["open"], p["nav"]) for p in weekly),
+              f"{len(weekly)} weeks")
+
+        stats = mutual_fund_service._charts.stats()
+        response_cache.clear()
+        await client.get(f"{API}/{SYMBOL}/history?period=5y&points=300")
+        check("repeat requests are served from the chart cache", mutual_fund_service._charts.stats()["hits"] > stats["hits"])
+
+        detail = (await client.get(f"{API}/{SYMBOL}?period=5y")).json()["data"]["fund"]
+        small = (await client.get(f"{API}/{SYMBOL}?period=5y&points=100")).json()["data"]["fund"]
+        check("fund detail returns are computed on the full history",
+              "one_year_return" in detail and all(detail.get(f) == small.get(f) for f in ("one_month_return", "three_month_return", "one_year_return")),
+              f"{len(detail['historical_data'])} -> {len(small['historical_data'])} points")
+
+        rejected = await client.get(f"{API}/{SYMBOL}/history?points=2")
+        check("points below the minimum are rejected", rejected.status_code == 422)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per period and case")
+    parser.add_argument("--latency", type=float, default=0.01, help="Injected upstream latency (seconds)")
+    args = parser.parse_args()
+
+    os.environ["UPSTREAM_MIN_INTERVAL"] = "0"
+    os.environ["DATA_PROVIDER"] = "yahoo"  # The provider the stub stands in for
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
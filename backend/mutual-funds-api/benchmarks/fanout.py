@@ -0,0 +1,60 @@
+"""
+Cold fund-list and portfolio latency with concurrent fan-out and a deadline
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.fanout --latency 0.5 --deadline 3
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from tests.helpers import install_stub_upstream
+
+
+async def timed(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> tuple:
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    response.raise_for_status()
+    return time.perf_counter() - start, response.json()["data"]
+
+
+async def run(args: argparse.Namespace):
+    from main import app
+    from app.services.fund_service import POPULAR_INDIAN_MF
+
+    upstream = install_stub_upstream(args.latency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for label in ("cold", "warm"):
+            elapsed, data = await timed(client, "GET", "/api/mutual-funds/")
+            fallbacks = sum(1 for fund in data["funds"] if fund.get("is_fallback"))
+            print(f"GET /  {label:<5} {elapsed:6.2f}s  funds={data['count']}  fallback={fallbacks}")
+            if label == "cold":
+                # Let the fetches that missed the deadline finish warming the cache
+                await asyncio.sleep(len(POPULAR_INDIAN_MF) * float(os.environ["UPSTREAM_MIN_INTERVAL"]) + args.latency)
+
+        holdings = [{"symbol": f"STUB{i:03d}.BO", "units": 10, "avg_nav": 100} for i in range(args.holdings)]
+        elapsed, data = await timed(client, "POST", "/api/mutual-funds/portfolio/calculate", json=holdings)
+        print(f"POST portfolio ({args.holdings} holdings) {elapsed:6.2f}s  total_current={data['summary']['total_current']}")
+
+    print(f"upstream calls: {dict(upstream.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Injected upstream latency (seconds)")
+    parser.add_argument("--deadline", type=str, default="3.0", help="FANOUT_DEADLINE override")
+    parser.add_argument("--min-interval", type=str, default="0.1", help="UPSTREAM_MIN_INTERVAL override")
+    parser.add_argument("--holdings", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ["FANOUT_DEADLINE"] = args.deadline
+    os.environ["UPSTREAM_MIN_INTERVAL"] = args.min_interval
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Load test: /health latency while slow fund requests are in flight
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.health_under_load --fund-requests 40 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.common import format_stats, percentiles
+from tests.helpers import install_stub_upstream
+
+
+async def sample_health(client: httpx.AsyncClient, samples: int, pause: float) -> list:
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        response = await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+        await asyncio.sleep(pause)
+    return latencies
+
+
+async def run(args: argparse.Namespace):
+    from main import app
+
+    upstream = install_stub_upstream(args.latency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        baseline = await sample_health(client, args.samples, args.pause)
+
+        # Distinct symbols so every request misses the cache and goes upstream
+        fund_requests = [
+            asyncio.create_task(client.get(f"/api/mutual-funds/STUB{i:04d}.BO"))
+            for i in range(args.fund_requests)
+        ]
+        await asyncio.sleep(0)
+        loaded = await sample_health(client, args.samples, args.pause)
+        in_flight = sum(not task.done() for task in fund_requests)
+
+        start = time.perf_counter()
+        await asyncio.gather(*fund_requests)
+        drain = time.perf_counter() - start
+
+    print(format_stats("/health idle", percentiles(baseline)))
+    print(format_stats("/health under fund load", percentiles(loaded)))
+    print(f"fund requests still in flight after sampling: {in_flight}/{args.fund_requests}")
+    print(f"upstream calls: {dict(upstream.calls)}  drain time: {drain:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fund-requests", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.5, help="Injected upstream latency (seconds)")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.005, help="Pause between /health samples (seconds)")
+    parser.add_argument("--min-interval", type=str, default="0.05", help="UPSTREAM_MIN_INTERVAL override")
+    args = parser.parse_args()
+
+    os.environ["UPSTREAM_MIN_INTERVAL"] = args.min_interval
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
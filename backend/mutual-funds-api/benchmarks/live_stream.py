@@ -0,0 +1,136 @@
+"""
+Live stream check: many subscribers to the NAV stream are served by one upstream fetch per symbol
+
+Subscribes N clients, each to a few catalogue funds, plus one client that
+never reads, against a stubbed upstream whose NAVs move on every fetch. Runs
+the refresh loop for a number of intervals and checks every interval made one
+bulk upstream call per chunk of subscribed symbols, every reading client got
+every change of its funds, and the client that never reads kept one pending
+quote per fund until it was disconnected. Exits non-zero if any check fails.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.live_stream --subscribers 1000 --rounds 5
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.common import percentiles
+from tests.helpers import install_stub_upstream
+
+
+async def consume(subscription, received: Dict[str, int], latencies: List[float], published: Dict[str, float]):
+    """Read a subscription until it closes, counting quotes per symbol"""
+    while not subscription.closed:
+        quotes = await subscription.next(1.0)
+        now = time.perf_counter()
+        for quote in quotes:
+            received[quote["symbol"]] += 1
+            latencies.append(now - published.get(quote["symbol"], now))
+
+
+async def run(args: argparse.Namespace) -> bool:
+    from app.config import BATCH_CHUNK_SIZE
+    from app.services import async_mutual_fund_service, mutual_fund_service
+    from app.services.live import NavStream
+
+    ok = True
+
+    def check(label: str, passed: bool, detail: str = ""):
+        nonlocal ok
+        ok &= passed
+        print(f"{label:<56} {'OK' if passed else 'FAIL'}  {detail}")
+
+    upstream = install_stub_upstream(args.latency)
+    # Every bulk download moves every NAV, so every refresh is a change to fan out
+    make_history = upstream.make_history
+    upstream.make_history = lambda symbol, period="1y", start=None: make_history(symbol, period, start) * (
+        1 + 0.001 * upstream.calls["download"])
+
+    symbols = mutual_fund_service.get_catalogue_symbols()
+    rng = random.Random(11)
+    stream = NavStream(
+        async_mutual_fund_service, interval=args.interval,
+        max_subscribers=args.subscribers + 1, max_lag=args.interval * (args.rounds - 1.5),
+    )
+
+    # Time each symbol's quote was handed to the stream, for fan-out latency
+    published: Dict[str, float] = {}
+    publish = stream._publish
+
+    def timed_publish(fund_infos):
+        now = time.perf_counter()
+        published.update((symbol, now) for symbol in fund_infos)
+        publish(fund_infos)
+
+    stream._publish = timed_publish
+
+    subscriptions = [
+        stream.subscribe(rng.sample(symbols, rng.randint(1, min(5, len(symbols)))))
+        for _ in range(args.subscribers)
+    ]
+    slow = stream.subscribe(symbols[:3])
+    received = [{symbol: 0 for symbol in subscription.symbols} for subscription in subscriptions]
+    latencies: List[float] = []
+    consumers = [
+        asyncio.ensure_future(consume(subscription, counts, latencies, published))
+        for subscription, counts in zip(subscriptions, received)
+    ]
+
+    start = time.perf_counter()
+    while stream.refreshes < 1:
+        await asyncio.sleep(args.interval / 10)
+    initial_calls = upstream.total_calls
+    check("slow client holds one pending quote per fund", len(slow._pending) == len(slow.symbols),
+          f"{len(slow._pending)} pending, {slow.skipped} skipped")
+
+    while stream.refreshes < args.rounds:
+        await asyncio.sleep(args.interval / 10)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(args.interval / 2)  # Let consumers read the last refresh
+
+    followed = {symbol for subscription in subscriptions for symbol in subscription.symbols}
+    chunks = math.ceil(len(followed) / BATCH_CHUNK_SIZE)
+    refresh_calls = upstream.total_calls - initial_calls
+    print(f"{args.subscribers} subscribers on {len(followed)} funds, {stream.refreshes} refreshes in {elapsed:.2f}s, "
+          f"upstream calls {dict(upstream.calls)}")
+    check("one upstream fetch per symbol per refresh",
+          refresh_calls == (stream.refreshes - 1) * chunks,
+          f"{refresh_calls} calls over {stream.refreshes - 1} refreshes, {chunks} chunk(s) each")
+    expected = stream.refreshes + 1  # The first quote, then one change per refresh
+    check("every subscriber got every change",
+          all(count == expected for counts in received for count in counts.values()),
+          f"{sum(sum(counts.values()) for counts in received)} quotes delivered")
+    stats = percentiles(latencies)
+    print(f"fan-out latency  p50={stats['p50']:.2f}ms  p95={stats['p95']:.2f}ms  max={stats['max']:.2f}ms")
+    check("slow client was disconnected", slow.closed and stream.lagged_out == 1, str(stream.stats()))
+
+    for subscription in subscriptions:
+        stream.unsubscribe(subscription)
+    await asyncio.gather(*consumers)
+    await asyncio.sleep(args.interval / 10)
+    check("refresh loop stops with the last subscriber", not stream.running, str(stream.stats()))
+    await stream.stop()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5, help="Refresh intervals to run")
+    parser.add_argument("--interval", type=float, default=0.5, help="Stream refresh interval (seconds)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected upstream latency (seconds)")
+    args = parser.parse_args()
+
+    os.environ["UPSTREAM_MIN_INTERVAL"] = "0"
+    os.environ["DATA_PROVIDER"] = "yahoo"  # The provider the stub stands in for
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Offline provider check: the API with DATA_PROVIDER=offline serves reproducible data at full speed without network access
+
+Sends the same requests to two separate app processes running offline and checks
+the responses match, checks a NAV snapshot file is replayed as stored, then times
+requests against one app. Exits non-zero if any check fails.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.offline_provider --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import httpx
+import pandas as pd
+
+from benchmarks.common import format_stats, percentiles
+
+SNAPSHOT_SYMBOL = "0P0000XVHO.BO"
+SNAPSHOT_NAVS = [100.0, 101.5, 99.25]
+PATHS = [
+    "/api/mutual-funds/?limit=20",
+    "/api/mutual-funds/0P0000XVLZ.BO",
+    "/api/mutual-funds/0P0000XVLZ.BO/nav",
+    "/api/mutual-funds/0P0000XVLZ.BO/history?period=1y",
+    "/api/mutual-funds/0P0000XVLZ.BO/analytics",
+    f"/api/mutual-funds/{SNAPSHOT_SYMBOL}/history?period=1mo",
+]
+
+
+def write_snapshot(directory: str) -> str:
+    """A small CSV snapshot with a fixed recent history for one fund"""
+    path = os.path.join(directory, "snapshot.csv")
+    days = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=len(SNAPSHOT_NAVS))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("symbol,date,nav\n")
+        for day, nav in zip(days.strftime("%Y-%m-%d"), SNAPSHOT_NAVS):
+            f.write(f"{SNAPSHOT_SYMBOL},{day},{nav}\n")
+    return path
+
+
+def _responses(args: argparse.Namespace, results) -> None:
+    """Bodies of PATHS from a fresh app in this process, plus request timings"""
+    async def fetch():
+        from main import app
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            bodies = [(await client.get(path)).json() for path in PATHS]
+            latencies = []
+            for index in range(args.requests):
+                start = time.perf_counter()
+                response = await client.get(PATHS[index % len(PATHS)])
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+            return bodies, latencies
+
+    try:
+        results.put(asyncio.run(fetch()))
+    except Exception as e:
+        results.put(e)
+
+
+def run(args: argparse.Namespace) -> bool:
+    ok = True
+
+    def check(label: str, passed: bool, detail: str = ""):
+        nonlocal ok
+        ok &= passed
+        print(f"{label:<44} {'OK' if passed else 'FAIL'}  {detail}")
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["OFFLINE_SNAPSHOT_PATH"] = write_snapshot(directory)
+        runs = []
+        for worker in range(2):
+            os.environ["DATA_DIR"] = os.path.join(directory, f"worker{worker}")
+            results = context.Queue()
+            process = context.Process(target=_responses, args=(args, results))
+            process.start()
+            outcome = results.get()
+            process.join()
+            if isinstance(outcome, Exception):
+                print(f"offline app failed: {outcome}")
+                return False
+            runs.append(outcome)
+
+    (first, latencies), (second, _) = runs
+    # Timestamps differ between runs; everything else must not
+    same = [
+        json.dumps({k: v for k, v in a.items() if k != "timestamp"}, sort_keys=True)
+        == json.dumps({k: v for k, v in b.items() if k != "timestamp"}, sort_keys=True)
+        for a, b in zip(first, second)
+    ]
+    check("identical responses from two processes", all(same), f"{sum(same)}/{len(same)} endpoints")
+
+    history = first[-1].get("data", {}).get("history") or []
+    navs = [point["nav"] for point in history] if history and isinstance(history[0], dict) else []
+    check("snapshot history replayed as stored", navs == SNAPSHOT_NAVS, f"navs={navs}")
+
+    fund = first[1].get("data", {}).get("fund") or {}
+    check("offline data is not flagged as fallback", fund.get("is_fallback") is False)
+
+    stats = percentiles(latencies)
+    print(format_stats(f"{args.requests} offline requests", stats))
+    print(f"throughput {len(latencies) / sum(latencies):.0f} req/s (sequential, in-process client)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ["DATA_PROVIDER"] = "offline"
+    if not run(args):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
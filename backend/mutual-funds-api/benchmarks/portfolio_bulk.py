@@ -0,0 +1,181 @@
+"""
+Bulk portfolio valuation: 10k portfolios x 20 holdings valued in one pass, each fund quoted once
+
+Builds a book of synthetic portfolios over a synthetic catalogue, each holding
+either units at an average NAV or 1-4 dated purchase lots. Times the engine
+(book building and valuation, with and without per-holding rows), valuing the
+same portfolios one calculate_portfolio_value call at a time, and the
+/portfolio/bulk endpoint. Checks quotes are fetched once per distinct fund
+and a sample of XIRRs against a scalar bisection. Exits non-zero if a check
+fails.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.portfolio_bulk --portfolios 10000 --holdings 20 --funds 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.catalogue_memory import write_master_file
+from tests.helpers import install_stub_upstream
+
+
+def make_portfolios(symbols: List[str], portfolios: int, holdings: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    today = date.today()
+    result = []
+    for index in range(portfolios):
+        rows = []
+        for symbol in rng.sample(symbols, holdings):
+            if rng.random() < 0.5:
+                rows.append({"symbol": symbol, "units": round(rng.uniform(1, 500), 3),
+                             "avg_nav": round(rng.uniform(10, 900), 2),
+                             "purchase_date": (today - timedelta(days=rng.randrange(30, 2000))).isoformat()})
+            else:
+                rows.append({"symbol": symbol, "lots": [
+                    {"date": (today - timedelta(days=rng.randrange(30, 2000))).isoformat(),
+                     "units": round(rng.uniform(1, 200), 3), "nav": round(rng.uniform(10, 900), 2)}
+                    for _ in range(rng.randint(1, 4))
+                ]})
+        result.append({"id": f"user-{index}", "holdings": rows})
+    return result
+
+
+def scalar_xirr(flows: List[tuple], today: date) -> Optional[float]:
+    """Reference XIRR by bisection over (date, amount) flows"""
+    def npv(rate: float) -> float:
+        return sum(amount * (1 + rate) ** ((today - day).days / 365.0) for day, amount in flows)
+
+    low, high = -0.9999, 100.0
+    if npv(low) * npv(high) > 0:
+        return None
+    for _ in range(200):
+        middle = (low + high) / 2
+        if npv(low) * npv(middle) <= 0:
+            high = middle
+        else:
+            low = middle
+    return (low + high) / 2
+
+
+def portfolio_flows(portfolio: Dict[str, Any], navs: Dict[str, float], today: date) -> List[tuple]:
+    flows = []
+    for holding in portfolio["holdings"]:
+        lots = holding.get("lots") or [
+            {"date": holding["purchase_date"], "units": holding["units"], "nav": holding["avg_nav"]}
+        ]
+        for lot in lots:
+            flows.append((date.fromisoformat(lot["date"]), -lot["units"] * lot["nav"]))
+            flows.append((today, lot["units"] * navs[holding["symbol"]]))
+    return flows
+
+
+def run(args: argparse.Namespace, symbols: List[str]) -> bool:
+    from main import app
+    from app.config import BATCH_CHUNK_SIZE
+    from app.services import async_mutual_fund_service as service
+    from app.services.portfolio import PortfolioBook, value_portfolios
+
+    ok = True
+
+    def check(label: str, passed: bool, detail: str = ""):
+        nonlocal ok
+        ok &= passed
+        print(f"{label:<44} {'OK' if passed else 'FAIL'}  {detail}")
+
+    def timed(label: str, func) -> Any:
+        start = time.perf_counter()
+        result = func()
+        print(f"{label:<44} {time.perf_counter() - start:8.3f}s")
+        return result
+
+    upstream = install_stub_upstream(args.latency)
+    portfolios = make_portfolios(symbols, args.portfolios, args.holdings, args.seed)
+    total = args.portfolios * args.holdings
+    print(f"{args.portfolios} portfolios x {args.holdings} holdings = {total} holdings over {len(symbols)} funds\n")
+
+    valued = timed("cold: quote funds + value (service)", lambda: asyncio.run(service.value_portfolios(portfolios)))
+    distinct = len({holding["symbol"] for portfolio in portfolios for holding in portfolio["holdings"]})
+    quoted = upstream.total_calls
+    check("each distinct fund quoted once", quoted <= -(-distinct // BATCH_CHUNK_SIZE),
+          f"{distinct} funds in {quoted} upstream calls")
+
+    book = timed("build book", lambda: PortfolioBook(portfolios))
+    fund_infos = asyncio.run(service.get_fund_infos(book.symbols))
+    timed("value, summaries only", lambda: value_portfolios(book, fund_infos, include_holdings=False))
+    timed("value, with holdings", lambda: value_portfolios(book, fund_infos))
+    sample = portfolios[: args.loop_sample]
+
+    async def one_at_a_time():
+        return [await service.calculate_portfolio_value(portfolio["holdings"]) for portfolio in sample]
+
+    timed(f"per-portfolio calls, first {len(sample)}", lambda: asyncio.run(one_at_a_time()))
+
+    today = date.today()
+    navs = {symbol: (fund_infos.get(symbol) or {}).get("nav") for symbol in book.symbols}
+    errors = []
+    for portfolio, result in list(zip(portfolios, valued))[:200]:
+        expected = scalar_xirr(portfolio_flows(portfolio, navs, today), today)
+        actual = result["summary"]["xirr"]
+        if expected is not None and actual is not None:
+            errors.append(abs(actual - expected * 100))
+        elif expected is not None or actual is not None:
+            errors.append(float("inf"))
+    check("XIRR matches scalar bisection (200 portfolios)", max(errors) < 0.01, f"max error {max(errors):.2e} pct pts")
+
+    # Encoded up front so the timing is the server's, not the client's
+    payload = json.dumps({"portfolios": portfolios}).encode("utf-8")
+
+    async def endpoint():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+            response = await client.post("/api/mutual-funds/portfolio/bulk", content=payload,
+                                         headers={"Content-Type": "application/json"})
+            elapsed = time.perf_counter() - start
+            return response, elapsed
+
+    response, elapsed = asyncio.run(endpoint())
+    print(f"{'POST /portfolio/bulk, summaries':<44} {elapsed:8.3f}s  "
+          f"{len(payload) / 1e6:.1f}MB in, {len(response.content) / 1e6:.1f}MB out")
+    body = response.json()
+    check("endpoint values every portfolio", response.status_code == 200 and body["data"]["count"] == len(portfolios))
+    check("endpoint matches the service",
+          body["data"]["portfolios"][0]["summary"] == valued[0]["summary"])
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--portfolios", type=int, default=10000)
+    parser.add_argument("--holdings", type=int, default=20)
+    parser.add_argument("--funds", type=int, default=2000, help="Funds in the synthetic catalogue")
+    parser.add_argument("--loop-sample", type=int, default=1000, help="Portfolios valued one call at a time")
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected upstream latency (seconds)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_master_file(directory, args.funds)
+        # The app reads these when main is first imported
+        os.environ["CATALOGUE_PATH"] = path
+        os.environ["UPSTREAM_MIN_INTERVAL"] = "0"
+        os.environ["DATA_PROVIDER"] = "yahoo"  # The provider the stub stands in for
+
+        from app.services.catalogue import read_rows
+
+        symbols = [row["symbol"] for row in read_rows(path)]
+        if not run(args, symbols):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Profiling check: flagged and slow requests leave a span tree and sampled stacks; others pay next to nothing
+
+Runs the app with PROFILE_MODE=header against a slow stubbed upstream. Checks a
+request sending X-Profile gets an X-Profile-Id whose profile (from
+/debug/profiles and the profile directory) shows the upstream fetch, that
+requests without the header are not profiled, and that under mode "all" only
+requests over the threshold are kept. Then compares the latency of cached
+requests with and without profiling. Exits non-zero if any check fails.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.profiling --latency 0.2 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import timeit
+from typing import Any, Dict, Iterator, List
+
+import httpx
+
+from benchmarks.common import format_stats, percentiles
+from tests.helpers import install_stub_upstream
+
+SYMBOL = "0P0000XVHO.BO"
+OTHER_SYMBOL = "0P0000XVKR.BO"
+
+
+def span_names(node: Dict[str, Any]) -> Iterator[str]:
+    yield node["name"]
+    for child in node.get("children", ()):
+        yield from span_names(child)
+
+
+async def timed(client: httpx.AsyncClient, url: str, requests: int, headers: Dict[str, str]) -> List[float]:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+async def run(args: argparse.Namespace, directory: str) -> bool:
+    from main import app
+    from app import profiling
+    from app.profiling import profiler
+
+    ok = True
+
+    def check(label: str, passed: bool, detail: str = ""):
+        nonlocal ok
+        ok &= passed
+        print(f"{label:<48} {'OK' if passed else 'FAIL'}  {detail}")
+
+    install_stub_upstream(args.latency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        url = f"/api/mutual-funds/{SYMBOL}"
+        response = await client.get(url, headers={"X-Profile": "1"})
+        profile_id = response.headers.get("X-Profile-Id")
+        check("flagged request gets a profile id", response.status_code == 200 and bool(profile_id), f"id={profile_id}")
+
+        profile = (await client.get(f"/debug/profiles/{profile_id}")).json()
+        names = set(span_names(profile.get("spans", {"name": ""})))
+        wanted = {"fund_detail", "rate_limit_wait", "upstream_fetch", "render_json"}
+        check("profile has the request's spans", wanted <= names, f"missing={sorted(wanted - names)}")
+        check("profile accounts for the upstream latency", profile.get("ms", 0) >= args.latency * 1e3,
+              f"{profile.get('ms', 0):.1f}ms")
+        if profiler.sampler:
+            fetching = sum(count for stack, count in profile["stacks"].items() if "history (helpers.py" in stack)
+            check("sampled stacks show the stubbed fetch", fetching > 0,
+                  f"{fetching}/{profile['samples']} samples")
+        profiler.flush()
+        written = os.listdir(directory)
+        check("profile written to the profile directory", any(name.startswith(profile_id + "-") for name in written),
+              f"{len(written)} files")
+
+        before = len(profiler.recent())
+        await client.get(url)
+        check("unflagged request is not profiled", len(profiler.recent()) == before)
+
+        # Under "all", keep only requests slower than the threshold
+        profiler.mode, profiler.threshold = "all", args.latency / 2
+        await client.get(f"/api/mutual-funds/{OTHER_SYMBOL}/nav")  # Upstream fetch, slow
+        await client.get(f"/api/mutual-funds/{OTHER_SYMBOL}/nav")  # Cached, fast
+        kept = profiler.recent()[: len(profiler.recent()) - before]
+        check("mode all keeps only the slow request", len(kept) == 1 and kept[0]["ms"] >= args.latency * 1e3,
+              f"kept {[round(p['ms'], 1) for p in kept]}ms")
+        profiler.mode = "header"
+
+        # Cached requests: not profiled, then every one profiled
+        nav = f"/api/mutual-funds/{OTHER_SYMBOL}/nav"
+        plain = percentiles(await timed(client, nav, args.requests, {}))
+        flagged = percentiles(await timed(client, nav, args.requests, {"X-Profile": "1"}))
+        print(format_stats("cached nav, not profiled", plain))
+        print(format_stats("cached nav, profiled", flagged))
+
+    stage_cost = min(timeit.repeat(lambda: profiling.span("stage").__enter__(), number=100000, repeat=5)) / 100000
+    print(f"span() outside a profile: {stage_cost * 1e9:.0f}ns")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Injected upstream latency (seconds)")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per latency comparison")
+    parser.add_argument("--sample-interval", default="0.005", help="PROFILE_SAMPLE_INTERVAL override")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The app reads these when main is first imported
+        os.environ["PROFILE_MODE"] = "header"
+        os.environ["PROFILE_DIR"] = directory
+        os.environ["PROFILE_KEEP"] = str(args.requests + 10)
+        os.environ["PROFILE_SAMPLE_INTERVAL"] = args.sample_interval
+        os.environ["UPSTREAM_MIN_INTERVAL"] = "0"
+        os.environ["DATA_PROVIDER"] = "yahoo"  # The provider the stub stands in for
+        if not asyncio.run(run(args, directory)):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
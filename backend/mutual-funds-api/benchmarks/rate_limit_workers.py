@@ -0,0 +1,122 @@
+"""
+Rate limit check: worker processes sharing one upstream token bucket stay within its rate, and interactive calls jump background ones
+
+Starts several processes that take upstream tokens as fast as the bucket allows,
+first with the shared file backend and then with per-process buckets, and counts
+the calls made in aggregate. Then floods one bucket with background callers and
+measures how long interactive callers wait. Exits non-zero if the shared bucket
+lets through more than its rate plus burst, or interactive waits exceed one
+token interval.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.rate_limit_workers --workers 8 --rate 20 --burst 5 --duration 3
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import threading
+import time
+from typing import List
+
+from app.services.rate_limiter import BACKGROUND, INTERACTIVE, LocalBucketState, TokenBucket
+from tests.helpers import take_tokens
+
+
+def run_workers(path: str, args: argparse.Namespace) -> List[float]:
+    """Call times across all workers, sorted"""
+    results = multiprocessing.Queue()
+    start = time.time() + 0.5  # Let every worker start before the clock runs
+    processes = [
+        multiprocessing.Process(target=take_tokens, args=(path, args.rate, args.burst, start, args.duration, results))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    calls = []
+    for _ in processes:
+        calls.extend(results.get())
+    for process in processes:
+        process.join()
+    return sorted(calls)
+
+
+def busiest_second(calls: List[float]) -> int:
+    """Most calls in any one-second window"""
+    most, first = 0, 0
+    for last, at in enumerate(calls):
+        while at - calls[first] >= 1.0:
+            first += 1
+        most = max(most, last - first + 1)
+    return most
+
+
+def interactive_waits(args: argparse.Namespace, priority: str) -> List[float]:
+    """Waits of callers at the given priority while background callers drain the bucket"""
+    bucket = TokenBucket(args.rate, 1, LocalBucketState())
+    stop = threading.Event()
+
+    def flood():
+        while not stop.is_set():
+            bucket.acquire(BACKGROUND)
+
+    flooders = [threading.Thread(target=flood, daemon=True) for _ in range(args.workers)]
+    for thread in flooders:
+        thread.start()
+    time.sleep(0.2)
+    waits = []
+    for _ in range(args.samples):
+        time.sleep(1 / args.rate * 1.5)
+        waits.append(bucket.acquire(priority))
+    stop.set()
+    for thread in flooders:
+        thread.join()
+    return waits
+
+
+def run(args: argparse.Namespace) -> bool:
+    ok = True
+
+    def check(label: str, passed: bool, detail: str = ""):
+        nonlocal ok
+        ok &= passed
+        print(f"{label:<48} {'OK' if passed else 'FAIL'}  {detail}")
+
+    allowed = args.rate * args.duration + args.burst
+    per_second = args.rate + args.burst
+    print(f"{args.workers} workers, {args.rate:g} calls/s with burst {args.burst:g}, {args.duration:g}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        shared = run_workers(os.path.join(directory, "upstream_rate.bucket"), args)
+    check("shared file bucket: aggregate within rate + burst",
+          len(shared) <= allowed + 1 and busiest_second(shared) <= per_second + 1,
+          f"{len(shared)} calls ({len(shared) / args.duration:.1f}/s), busiest second {busiest_second(shared)}, "
+          f"allowed {allowed:g}")
+
+    local = run_workers("", args)
+    print(f"{'per-process buckets (for comparison)':<48} --  {len(local)} calls ({len(local) / args.duration:.1f}/s), "
+          f"busiest second {busiest_second(local)}")
+
+    interactive = interactive_waits(args, INTERACTIVE)
+    background = interactive_waits(args, BACKGROUND)
+    check("interactive calls under a background flood",
+          max(interactive) <= 1 / args.rate * 1.05,
+          f"wait p50 {statistics.median(interactive) * 1e3:.0f}ms max {max(interactive) * 1e3:.0f}ms; "
+          f"as background p50 {statistics.median(background) * 1e3:.0f}ms max {max(background) * 1e3:.0f}ms")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=20, help="Bucket rate (calls per second)")
+    parser.add_argument("--burst", type=float, default=5, help="Bucket burst size")
+    parser.add_argument("--duration", type=float, default=3, help="Seconds each worker runs")
+    parser.add_argument("--samples", type=int, default=20, help="Interactive calls measured under the flood")
+    if not run(parser.parse_args()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
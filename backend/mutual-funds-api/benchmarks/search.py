@@ -0,0 +1,110 @@
+"""
+Microbenchmark: fund search over a synthetic catalogue the size of the Indian MF universe
+
+Compares the indexed search against the original per-query substring scan.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.search --entries 40000
+"""
+import argparse
+import itertools
+import random
+import time
+
+from benchmarks.common import format_stats, percentiles
+
+FAMILIES = [
+    "HDFC Mutual Fund", "ICICI Prudential", "SBI Mutual Fund", "Axis Mutual Fund", "Mirae Asset",
+    "PPFAS", "UTI Mutual Fund", "Kotak Mahindra", "Nippon India", "Aditya Birla Sun Life",
+    "DSP Mutual Fund", "Franklin Templeton", "Tata Mutual Fund", "Invesco India", "Canara Robeco",
+    "Edelweiss", "Motilal Oswal", "Quant Mutual Fund", "Bandhan Mutual Fund", "Sundaram",
+]
+STRATEGIES = [
+    ("Bluechip", "Large Cap"), ("Top 100", "Large Cap"), ("Large & Mid Cap", "Large & Mid Cap"),
+    ("Flexi Cap", "Flexi Cap"), ("Multi Cap", "Multi Cap"), ("Mid-Cap Opportunities", "Mid Cap"),
+    ("Emerging Equity", "Mid Cap"), ("Small Cap", "Small Cap"), ("Long Term Equity", "ELSS"),
+    ("Tax Saver", "ELSS"), ("Nifty 50 Index", "Index Fund"), ("Nifty Next 50 Index", "Index Fund"),
+    ("Corporate Bond", "Debt"), ("Short Duration", "Debt"), ("Liquid", "Debt"), ("Gilt", "Debt"),
+    ("Balanced Advantage", "Hybrid"), ("Equity Savings", "Hybrid"), ("Arbitrage", "Hybrid"),
+    ("Banking & PSU Debt", "Debt"), ("Value Discovery", "Value"), ("Focused Equity", "Focused"),
+]
+PLANS = ["Direct Plan Growth", "Regular Plan Growth", "Direct Plan IDCW", "Regular Plan IDCW"]
+
+QUERIES = {
+    "token": ["hdfc", "bluechip", "liquid", "nifty", "arbitrage"],
+    "multi-token": ["hdfc flexi cap", "axis small cap direct", "sbi tax saver growth"],
+    "prefix": ["kot", "mot", "parag par", "blue", "emer"],
+    "typo": ["parag parik", "kotac emerging", "bluchip", "nipon small", "mirae asest"],
+}
+
+
+def synthetic_catalogue(entries: int, seed: int = 7) -> dict:
+    """Fund entries with realistic names, one per scheme/plan/series variant"""
+    rng = random.Random(seed)
+    catalogue = {"0P0000XW1B.BO": {"name": "Parag Parikh Flexi Cap Fund", "category": "Flexi Cap", "family": "PPFAS"}}
+    for series in itertools.count(1):
+        for family, (strategy, category), plan in itertools.product(FAMILIES, STRATEGIES, PLANS):
+            if len(catalogue) >= entries:
+                return catalogue
+            amc = family.replace(" Mutual Fund", "")
+            name = f"{amc} {strategy} Fund {plan}"
+            if series > 1:
+                name += f" Series {series}"
+            catalogue[f"{rng.randrange(10 ** 6, 10 ** 7)}{len(catalogue):06d}"] = {
+                "name": name, "category": category, "family": family,
+            }
+
+
+def substring_search(catalogue: dict, query: str) -> list:
+    """The original linear scan, kept here as the baseline"""
+    query_lower = query.lower()
+    results = []
+    for symbol, preset in catalogue.items():
+        name = preset.get("name", "").lower()
+        category = preset.get("category", "").lower()
+        family = preset.get("family", "").lower()
+        if query_lower in name or query_lower in category or query_lower in family:
+            results.append({"symbol": symbol, "name": preset.get("name")})
+    return results
+
+
+def timed(func, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(args: argparse.Namespace):
+    from app.services.search_index import SearchIndex
+
+    catalogue = synthetic_catalogue(args.entries)
+    start = time.perf_counter()
+    index = SearchIndex(catalogue)
+    print(f"{len(index)} entries, index built in {time.perf_counter() - start:.2f}s")
+    print()
+
+    for kind, queries in QUERIES.items():
+        samples = []
+        for query in queries:
+            samples += timed(lambda: index.search(query, args.limit), args.repeat)
+        baseline = []
+        for query in queries:
+            baseline += timed(lambda: substring_search(catalogue, query), max(1, args.repeat // 20))
+        print(format_stats(f"{kind} indexed", percentiles(samples)))
+        print(format_stats(f"{kind} substring", percentiles(baseline)))
+        print(f"  e.g. {queries[0]!r} -> {[result['name'] for result in index.search(queries[0], 3)]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=40000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Microbenchmark: NAV history serialization, per-row iterrows vs column-wise
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.serialization
+"""
+import argparse
+import json
+import timeit
+
+from tests.helpers import StubUpstream
+
+
+def iterrows_records(hist):
+    """The original per-row conversion, kept here as the baseline"""
+    data = []
+    for date, row in hist.iterrows():
+        data.append({
+            "date": date.strftime("%Y-%m-%d"),
+            "nav": round(row["Close"], 2)
+        })
+    return data
+
+
+def run(args: argparse.Namespace):
+    from app.services.serialization import closes_to_columns, columns_to_records
+
+    upstream = StubUpstream(latency=0)
+    print(f"{'period':<6} {'points':>6}  {'iterrows':>10}  {'vectorized':>10}  {'+records':>10}  "
+          f"{'speedup':>7}  {'records bytes':>13}  {'columns bytes':>13}")
+    for period in args.periods:
+        hist = upstream.make_history("0P0000XW1B.BO", period)
+
+        def vectorized():
+            return closes_to_columns(hist["Close"])
+
+        def vectorized_records():
+            return columns_to_records(closes_to_columns(hist["Close"]))
+
+        assert iterrows_records(hist) == vectorized_records()
+        baseline = min(timeit.repeat(lambda: iterrows_records(hist), number=args.number, repeat=5)) / args.number
+        columns = min(timeit.repeat(vectorized, number=args.number, repeat=5)) / args.number
+        records = min(timeit.repeat(vectorized_records, number=args.number, repeat=5)) / args.number
+        records_bytes = len(json.dumps(vectorized_records()))
+        columns_bytes = len(json.dumps(vectorized()))
+        print(f"{period:<6} {len(hist):>6}  {baseline * 1e3:>8.3f}ms  {columns * 1e3:>8.3f}ms  "
+              f"{records * 1e3:>8.3f}ms  {baseline / records:>6.1f}x  {records_bytes:>13}  {columns_bytes:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--periods", nargs="+", default=["1y", "5y"])
+    parser.add_argument("--number", type=int, default=20)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Shared cache check: upstream calls and in-process cache memory as worker processes are added, per-process vs shared cache tier
+
+Each worker process serves the same quotes and histories in its own random
+order against a stubbed upstream, once with CACHE_BACKEND=memory and once
+with CACHE_BACKEND=shared. Exits non-zero if the shared tier does not keep
+upstream calls near one per key regardless of the worker count.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.shared_cache_workers --workers 4 --symbols 400
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import percentiles
+
+
+def _worker(worker: int, args: argparse.Namespace, results) -> None:
+    from tests.helpers import install_stub_upstream
+    from app.services import AsyncMutualFundService, MutualFundService
+    from app.services.cache import TieredCache, approximate_size, flush_shared_writes
+
+    upstream = install_stub_upstream(args.latency)
+    service = MutualFundService()
+    async_service = AsyncMutualFundService(service)
+    symbols = [f"SYN{index:05d}.BO" for index in range(args.symbols)]
+    random.Random(worker).shuffle(symbols)
+
+    async def serve():
+        latencies = []
+        for symbol in symbols:
+            start = time.perf_counter()
+            await async_service.get_fund_info(symbol)
+            await async_service.get_history_columns(symbol, "1y")
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    latencies = asyncio.run(serve())
+    flush_shared_writes()
+    async_service.shutdown()
+
+    caches = (service._quotes, service._history)
+    local = [cache.local if isinstance(cache, TieredCache) else cache for cache in caches]
+    held = sum(approximate_size(entry.value) for cache in local for entry in cache._entries.values())
+    results.put((upstream.total_calls, held, latencies))
+
+
+def run_workers(backend: str, args: argparse.Namespace, directory: str):
+    """(upstream calls, in-process cache bytes per worker, latencies) for one cache backend"""
+    # Spawned workers read the cache settings from the environment when they import the app
+    os.environ["CACHE_BACKEND"] = backend
+    os.environ["DATA_DIR"] = os.path.join(directory, backend)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(worker, args, results)) for worker in range(args.workers)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    calls = sum(outcome[0] for outcome in outcomes)
+    held = sum(outcome[1] for outcome in outcomes) / len(outcomes)
+    latencies = [latency for outcome in outcomes for latency in outcome[2]]
+    return calls, held, latencies
+
+
+def run(args: argparse.Namespace) -> bool:
+    keys = args.symbols * 2
+    print(f"{args.workers} workers, {args.symbols} funds (quote + 1y history each = {keys} keys), "
+          f"injected latency {args.latency}s\n")
+    measured = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in ("memory", "shared"):
+            calls, held, latencies = run_workers(backend, args, directory)
+            measured[backend] = calls
+            stats = percentiles(latencies)
+            print(f"{backend:<8} upstream calls={calls:5d} ({calls / keys:.2f} per key)  "
+                  f"in-process cache {held / 1e6:6.2f} MB/worker  "
+                  f"request p50={stats['p50']:.1f}ms p99={stats['p99']:.1f}ms")
+
+    # Workers that miss the same key at the same moment both fetch it; allow for that overlap
+    passed = measured["shared"] <= keys * 1.5 and measured["shared"] < measured["memory"]
+    print(f"\nshared tier keeps upstream calls near one per key: {'OK' if passed else 'FAIL'}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--symbols", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.005, help="Injected upstream latency (seconds)")
+    args = parser.parse_args()
+
+    os.environ["UPSTREAM_MIN_INTERVAL"] = "0"
+    os.environ["HISTORY_STORE_ENABLED"] = "false"
+    if not run(args):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
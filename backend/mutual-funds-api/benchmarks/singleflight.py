@@ -0,0 +1,65 @@
+"""
+Thundering-herd check: N concurrent cache misses for one fund cause one upstream call
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.singleflight --clients 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from tests.helpers import install_stub_upstream
+
+# One fund per scenario, so history persisted by one scenario does not serve the next
+SYMBOLS = {"quote": "0P0000XW1B.BO", "history": "0P0000XVHO.BO", "detail": "0P0000XVKR.BO"}
+
+
+async def herd(client: httpx.AsyncClient, url: str, clients: int) -> float:
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.get(url) for _ in range(clients)))
+    assert all(response.status_code == 200 for response in responses)
+    return time.perf_counter() - start
+
+
+async def run(args: argparse.Namespace) -> bool:
+    from main import app
+    from app.services import mutual_fund_service
+
+    transport = httpx.ASGITransport(app=app)
+    scenarios = [
+        ("quote", f"/api/mutual-funds/{SYMBOLS['quote']}/nav", {"info": 1}),
+        ("history", f"/api/mutual-funds/{SYMBOLS['history']}/history?period=1y", {"history": 1}),
+        ("detail", f"/api/mutual-funds/{SYMBOLS['detail']}?period=6mo", {"info": 1, "history": 1}),
+    ]
+    ok = True
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for label, url, expected in scenarios:
+            # Start every scenario from an expired cache
+            for cache in (mutual_fund_service._quotes, mutual_fund_service._history):
+                cache.clear()
+            upstream = install_stub_upstream(args.latency)
+            elapsed = await herd(client, url, args.clients)
+            calls = dict(upstream.calls)
+            passed = calls == expected
+            ok &= passed
+            print(f"{label:<8} {args.clients} concurrent misses  {elapsed:6.3f}s  "
+                  f"upstream calls={calls}  {'OK' if passed else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="Injected upstream latency (seconds)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("UPSTREAM_MIN_INTERVAL", "0.5")
+    if not asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Startup check: import time of the app, and time from process start to the first fast fund response
+
+Import time is measured in fresh interpreters, as shipped (pandas and
+yfinance imported on first use) and with both imported up front, as every
+worker did before they were made lazy. Time to first fast response starts
+uvicorn on the offline provider and polls a 5y history route until one
+answers within --fast-ms, for three starts:
+
+    eager, cold       heavy imports up front, empty caches (the old startup)
+    lazy, cold        heavy imports on first use, empty caches
+    lazy, warm start  heavy imports on first use, caches restored from the
+                      snapshot the previous worker saved on shutdown
+
+Exits non-zero if the warm start is not faster than the eager, cold start.
+
+Usage (from backend/mutual-funds-api):
+    python -m benchmarks.startup --repeat 5
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+API = "/api/mutual-funds"
+SYMBOLS = ["0P0000XVHO.BO", "0P0000XVLZ.BO", "0P0000XW2M.BO", "0P0000XW1B.BO", "0P0000XVKR.BO"]
+PROBE = f"{API}/{SYMBOLS[0]}/history?period=5y"
+EAGER = "import pandas, yfinance; "
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env(data_dir: str, warm_start: bool) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "DATA_DIR": data_dir,
+        "DATA_PROVIDER": "offline",
+        "WARM_START_ENABLED": "true" if warm_start else "false",
+        "BACKGROUND_REFRESH_ENABLED": "false",
+        "PROFILE_MODE": "off",
+    }
+
+
+def import_seconds(eager: bool, data_dir: str) -> Tuple[float, bool]:
+    """Seconds to import main in a fresh interpreter, and whether that imported pandas"""
+    code = (
+        "import sys, time; start = time.perf_counter(); "
+        + (EAGER if eager else "")
+        + "import main; print(time.perf_counter() - start, 'pandas' in sys.modules)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=HERE, env=_env(data_dir, False), capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(out[0]), out[1] == "True"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(eager: bool, data_dir: str, warm_start: bool) -> Tuple[subprocess.Popen, str, float]:
+    port = _free_port()
+    code = (
+        (EAGER if eager else "")
+        + f"import uvicorn; uvicorn.run('main:app', host='127.0.0.1', port={port}, log_level='warning')"
+    )
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=HERE, env=_env(data_dir, warm_start))
+    return process, f"http://127.0.0.1:{port}", started
+
+
+def stop_server(process: subprocess.Popen):
+    """Graceful stop, so the lifespan shutdown saves the warm-start snapshot"""
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def first_fast_response(base_url: str, started: float, fast: float, timeout: float) -> Dict[str, Optional[float]]:
+    """Seconds from process start to the first answer, and to the first answer within fast seconds"""
+    result: Dict[str, Optional[float]] = {"first_response": None, "first_latency": None, "first_fast": None}
+    with httpx.Client(base_url=base_url, timeout=timeout) as client:
+        while time.perf_counter() - started < timeout:
+            sent = time.perf_counter()
+            try:
+                response = client.get(PROBE)
+            except httpx.TransportError:
+                time.sleep(0.005)
+                continue
+            now = time.perf_counter()
+            if response.status_code != 200:
+                continue
+            if result["first_response"] is None:
+                result["first_response"] = now - started
+                result["first_latency"] = now - sent
+            if now - sent <= fast:
+                result["first_fast"] = now - started
+                break
+    return result
+
+
+def populate(data_dir: str):
+    """Serve the probed funds once and stop gracefully, leaving a warm-start snapshot behind"""
+    process, base_url, started = start_server(False, data_dir, True)
+    try:
+        first_fast_response(base_url, started, float("inf"), 60)
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            for symbol in SYMBOLS:
+                client.get(f"{API}/{symbol}/history?period=5y")
+                client.get(f"{API}/{symbol}")
+    finally:
+        stop_server(process)
+
+
+def measure_start(eager: bool, warm_start: bool, args: argparse.Namespace) -> List[Dict[str, Optional[float]]]:
+    runs = []
+    for _ in range(args.repeat):
+        data_dir = tempfile.mkdtemp(prefix="mf-bench-startup-")
+        if warm_start:
+            populate(data_dir)
+        process, base_url, started = start_server(eager, data_dir, warm_start)
+        try:
+            runs.append(first_fast_response(base_url, started, args.fast_ms / 1000, args.timeout))
+        finally:
+            stop_server(process)
+    return runs
+
+
+def _median(runs: List[Dict[str, Optional[float]]], field: str) -> Optional[float]:
+    values = [run[field] for run in runs if run[field] is not None]
+    return statistics.median(values) if values else None
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--fast-ms", type=float, default=50, help="Latency a response must beat to count as fast")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for a fast response")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="mf-bench-startup-")
+    print(f"{'import main':<20} {'median ms':>9} {'pandas imported':>16}")
+    for label, eager in (("eager", True), ("lazy", False)):
+        samples = [import_seconds(eager, data_dir) for _ in range(args.repeat)]
+        print(f"{label:<20} {_ms(statistics.median(s for s, _ in samples))} {str(samples[-1][1]):>16}")
+
+    print(f"\n{'start':<20} {'1st resp':>9} {'its ms':>9} {'1st fast':>9}   (ms from process start, medians)")
+    results = {}
+    for label, eager, warm_start in (
+        ("eager, cold", True, False),
+        ("lazy, cold", False, False),
+        ("lazy, warm start", False, True),
+    ):
+        runs = measure_start(eager, warm_start, args)
+        results[label] = _median(runs, "first_fast")
+        print(f"{label:<20} {_ms(_median(runs, 'first_response'))} {_ms(_median(runs, 'first_latency'))} "
+              f"{_ms(results[label])}")
+
+    before, after = results["eager, cold"], results["lazy, warm start"]
+    if before is None or after is None or after >= before:
+        print("FAIL: the warm start did not serve a fast response sooner than the eager, cold start")
+        raise SystemExit(1)
+    print(f"OK: first fast response {before / after:.1f}x sooner")
+
+
+if __name__ == "__main__":
+    main()
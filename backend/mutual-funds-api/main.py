@@ -2,10 +2,61 @@
 Optivo Mutual Funds API
 FastAPI application for fetching Indian mutual fund data
 """
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import API_TITLE, API_VERSION, API_DESCRIPTION, CORS_ORIGINS
-from app.routes import funds_router
+from app.config import (
+    API_TITLE,
+    API_VERSION,
+    API_DESCRIPTION,
+    CORS_ORIGINS,
+    BACKGROUND_REFRESH_ENABLED,
+    BACKGROUND_REFRESH_INTERVAL,
+    COMPRESSION_ENABLED,
+    PRELOAD_IMPORTS,
+)
+from app import lazy
+from app.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, breaker_metrics, cache_metrics
+from app.profiling import ProfilingMiddleware, profiler
+from app.responses import CompressionMiddleware, FastJSONResponse, response_cache
+from app.routes import debug_router, funds_router
+from app.services import async_mutual_fund_service, mutual_fund_service, nav_stream, build_warm_start, CatalogueRefresher
+from app.services.cache import flush_shared_writes
+
+refresher = CatalogueRefresher(async_mutual_fund_service, BACKGROUND_REFRESH_INTERVAL)
+# Cache contents carried across restarts, so a new worker's first requests are not cold
+warm_start = build_warm_start(mutual_fund_service.caches())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown"""
+    if warm_start:
+        warm_start.load()
+        warm_start.start()
+    if PRELOAD_IMPORTS:
+        # Off the event loop, so requests served from cache do not wait for it
+        preload = asyncio.get_running_loop().run_in_executor(None, lazy.preload)
+    if BACKGROUND_REFRESH_ENABLED:
+        refresher.start()
+    yield
+    await nav_stream.stop()
+    await refresher.stop()
+    if warm_start:
+        await warm_start.stop()
+        try:
+            warm_start.save()
+        except Exception as e:
+            print(f"Error saving warm-start snapshot: {e}")
+    if PRELOAD_IMPORTS:
+        await preload
+    async_mutual_fund_service.shutdown()
+    # Values fetched just before shutdown still reach the other workers
+    await asyncio.get_running_loop().run_in_executor(None, flush_shared_writes)
+    # Profiles of the last requests still reach the profile directory
+    await asyncio.get_running_loop().run_in_executor(None, profiler.flush)
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -13,7 +64,9 @@ app = FastAPI(
     version=API_VERSION,
     description=API_DESCRIPTION,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Configure CORS
@@ -25,8 +78,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def cache_stats():
+    """Data cache counters, plus the encoded response cache"""
+    return {**mutual_fund_service.cache_stats(), "responses": response_cache.stats()}
+
+
+# Compress large responses not already compressed by their route
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Request counts, latency and in-flight requests for /metrics
+app.add_middleware(MetricsMiddleware)
+REGISTRY.collector(cache_metrics(cache_stats))
+REGISTRY.collector(breaker_metrics(mutual_fund_service.upstream_stats))
+
+# Span trees and sampled stacks of slow or flagged requests, when profiling is on
+if profiler.enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
 # Include routes
 app.include_router(funds_router)
+if profiler.enabled:
+    app.include_router(debug_router)
 
 
 @app.get("/")
@@ -44,15 +118,40 @@ async def root():
             "fund_detail": "/api/mutual-funds/{symbol}",
             "fund_nav": "/api/mutual-funds/{symbol}/nav",
             "fund_history": "/api/mutual-funds/{symbol}/history",
-            "portfolio": "/api/mutual-funds/portfolio/calculate"
-        }
+            "fund_analytics": "/api/mutual-funds/{symbol}/analytics",
+            "batch_nav": "/api/mutual-funds/nav/batch?symbols=",
+            "batch_history": "/api/mutual-funds/history/batch?symbols=",
+            "nav_stream": "/api/mutual-funds/stream?symbols=",
+            "portfolio": "/api/mutual-funds/portfolio/calculate",
+            "portfolio_bulk": "/api/mutual-funds/portfolio/bulk"
+        },
+        "metrics": "/metrics"
     }
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    upstream = mutual_fund_service.upstream_stats()
+    return {
+        # Still serving, from cache and fallback data, while the upstream circuit is not closed
+        "status": "healthy" if upstream["state"] == "closed" else "degraded",
+        "upstream": upstream,
+        "cache": cache_stats(),
+        "catalogue": mutual_fund_service.catalogue_stats(),
+        "background_refresh": refresher.running,
+        "stream": nav_stream.stats(),
+        "startup": {
+            "warm_start": warm_start.stats() if warm_start else None,
+            "imports": lazy.import_stats()
+        }
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 
 if __name__ == "__main__":
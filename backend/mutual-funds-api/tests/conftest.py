@@ -0,0 +1,34 @@
+"""
+Shared fixtures: a stubbed Yahoo Finance upstream and a service with empty caches
+"""
+import os
+import tempfile
+
+# Settings are read when app.config is imported, so these come first
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="mf-tests-")
+os.environ["DATA_PROVIDER"] = "yahoo"  # The provider the stub stands in for
+os.environ["UPSTREAM_MIN_INTERVAL"] = "0"
+os.environ["RATE_LIMIT_BACKEND"] = "local"
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["WARM_START_ENABLED"] = "false"
+os.environ["BACKGROUND_REFRESH_ENABLED"] = "false"
+os.environ["PROFILE_MODE"] = "off"
+
+import pytest
+
+from tests.helpers import fresh_history_store, install_stub_upstream
+
+
+@pytest.fixture
+def upstream():
+    return install_stub_upstream(latency=0.05)
+
+
+@pytest.fixture
+def service(upstream):
+    from app.services.async_fund_service import AsyncMutualFundService
+    from app.services.fund_service import MutualFundService
+
+    service = AsyncMutualFundService(MutualFundService(history_store=fresh_history_store()))
+    yield service
+    service.shutdown()
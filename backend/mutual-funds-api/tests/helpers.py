@@ -0,0 +1,144 @@
+"""
+Test helpers shared with the benchmarks: a stubbed yfinance upstream, an empty
+history store, and a worker process taking upstream tokens
+
+The app is imported inside the helpers, so callers can set its environment first.
+"""
+import functools
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+PERIOD_DAYS = {"5d": 7, "1mo": 30, "3mo": 91, "6mo": 182, "1y": 365, "2y": 730, "5y": 1826}
+
+
+class StubTicker:
+    """Stand-in for yf.Ticker that serves synthetic data after a blocking delay"""
+
+    def __init__(self, upstream: "StubUpstream", symbol: str):
+        self._upstream = upstream
+        self.ticker = symbol
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        self._upstream._call("info")
+        nav = self._upstream.base_nav(self.ticker)
+        return {
+            "regularMarketPrice": nav,
+            "previousClose": round(nav * 0.995, 2),
+            "currency": "INR",
+            "longName": f"Stub Fund {self.ticker}",
+            "annualReportExpenseRatio": 0.0075,
+        }
+
+    def history(self, period: str = "1y", start: Any = None, **kwargs: Any) -> pd.DataFrame:
+        self._upstream._call("history")
+        return self._upstream.make_history(self.ticker, period, start)
+
+
+@functools.lru_cache(maxsize=4)
+def _business_days(end: pd.Timestamp) -> pd.DatetimeIndex:
+    """Five years of business days up to end, shared by every stub series"""
+    return pd.bdate_range(end=end, periods=PERIOD_DAYS["5y"] * 5 // 7)
+
+
+class StubUpstream:
+    """Drop-in replacement for the yfinance module with injected latency.
+
+    Set error to an exception to make every call fail with it (after the
+    latency), e.g. to simulate Yahoo Finance rate limiting, or error_rate
+    to fail that fraction of calls with a 429.
+    """
+
+    def __init__(self, latency: float = 0.2, error_rate: float = 0.0, seed: int = 7):
+        self.latency = latency
+        self.error: Optional[Exception] = None
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _call(self, kind: str):
+        with self._lock:
+            self.calls[kind] += 1
+            rate_limited = self.error_rate > 0 and self._rng.random() < self.error_rate
+            self.rate_limited += rate_limited
+        # Blocking sleep, like the real HTTP round trip inside yfinance
+        time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        if rate_limited:
+            raise Exception("429 Client Error: Too Many Requests")
+
+    def base_nav(self, symbol: str) -> float:
+        return round(50 + (sum(map(ord, symbol)) % 500) + 0.37, 2)
+
+    def make_history(self, symbol: str, period: str = "1y", start: Any = None) -> pd.DataFrame:
+        # One deterministic 5y series per symbol, sliced, so overlapping fetches agree
+        end = pd.Timestamp.today().normalize()
+        dates = _business_days(end)
+        rng = np.random.default_rng(sum(map(ord, symbol)))
+        closes = self.base_nav(symbol) * np.cumprod(1 + rng.normal(0.0004, 0.01, len(dates)))
+        frame = pd.DataFrame({"Close": closes}, index=dates)
+        if start is not None:
+            return frame[frame.index >= pd.Timestamp(start)]
+        return frame[frame.index > end - pd.Timedelta(days=PERIOD_DAYS.get(period, 365))]
+
+    def Ticker(self, symbol: str) -> StubTicker:
+        return StubTicker(self, symbol)
+
+    def download(self, tickers: Any, period: str = "1y", start: Any = None, **kwargs: Any) -> pd.DataFrame:
+        symbols = tickers.split() if isinstance(tickers, str) else list(tickers)
+        self._call("download")
+        closes = pd.concat(
+            {symbol: self.make_history(symbol, period, start)["Close"] for symbol in symbols}, axis=1
+        )
+        closes.columns = pd.MultiIndex.from_product([["Close"], closes.columns], names=["Price", "Ticker"])
+        return closes
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+def install_stub_upstream(latency: float = 0.2, error_rate: float = 0.0) -> StubUpstream:
+    """Route every Yahoo Finance provider call to a fresh stub"""
+    from app.services import providers
+
+    upstream = StubUpstream(latency, error_rate)
+    providers.yf = upstream
+    return upstream
+
+
+def fresh_history_store():
+    """An empty persistent history store in its own temporary directory"""
+    from app.config import HISTORY_CACHE_TTL
+    from app.services.history_store import HistoryStore
+
+    return HistoryStore(os.path.join(tempfile.mkdtemp(prefix="mf-tests-"), "nav_history.sqlite3"), HISTORY_CACHE_TTL)
+
+
+def take_tokens(path: str, rate: float, burst: float, start: float, duration: float, results) -> None:
+    """Take tokens until the deadline, recording when each call would have gone upstream"""
+    from app.services.rate_limiter import FileBucketState, LocalBucketState, TokenBucket
+
+    state = FileBucketState(path) if path else LocalBucketState()
+    bucket = TokenBucket(rate, burst, state)
+    while time.time() < start:
+        time.sleep(0.001)
+    calls = []
+    while True:
+        bucket.acquire()
+        now = time.time()
+        if now >= start + duration:
+            break
+        calls.append(now)
+    results.put(calls)
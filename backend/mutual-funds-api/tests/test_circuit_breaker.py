@@ -0,0 +1,125 @@
+"""
+Circuit breaker: which upstream errors count toward opening the circuit
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    UpstreamNoDataError,
+    is_upstream_failure,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class HTTPError(Exception):
+    """Stands in for requests' HTTPError, which carries the response"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"{status_code} error")
+        self.response = type("Response", (), {"status_code": status_code})()
+
+
+class ReadTimeout(Exception):
+    pass
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("test", window=60, min_calls=5, error_threshold=0.5,
+                          base_backoff=10, max_backoff=60, jitter=0, clock=clock)
+
+
+@pytest.mark.parametrize("error", [
+    Exception("429 Client Error: Too Many Requests"),
+    Exception("HTTP Error 503: Service Unavailable"),
+    Exception("500 Server Error: Internal Server Error for url: https://query2.finance.yahoo.com"),
+    HTTPError(502),
+    TimeoutError("timed out"),
+    ConnectionResetError("reset by peer"),
+    ReadTimeout("read timed out"),
+    UpstreamNoDataError("No closes returned for any of 40 symbols"),
+])
+def test_upstream_failures(error):
+    assert is_upstream_failure(error)
+
+
+@pytest.mark.parametrize("error", [
+    Exception("No data found, symbol may be delisted"),
+    KeyError("regularMarketPrice"),
+    ValueError("Period '7y' is invalid, must be one of 1d, 5d, 1mo"),
+    Exception("Nifty 500 Index Fund: no price data found"),
+    HTTPError(404),
+])
+def test_client_errors_are_not_upstream_failures(error):
+    assert not is_upstream_failure(error)
+
+
+def test_client_errors_do_not_open_the_circuit(breaker):
+    for _ in range(10):
+        assert breaker.allow()
+        breaker.record_failure(Exception("No data found, symbol may be delisted"))
+
+    stats = breaker.stats()
+    assert stats["state"] == CLOSED
+    assert stats["error_rate"] == 0
+
+
+def test_upstream_errors_open_the_circuit(breaker):
+    for _ in range(2):
+        breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure(Exception("HTTP Error 503: Service Unavailable"))
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_rate_limit_opens_the_circuit_at_once(breaker):
+    breaker.record_failure(Exception("429 Client Error: Too Many Requests"))
+
+    assert breaker.state == OPEN
+
+
+def test_client_error_from_the_probe_closes_the_circuit(breaker, clock):
+    breaker.record_failure(Exception("429 Client Error: Too Many Requests"))
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+    # The upstream answered, so it has recovered even though the symbol was unknown
+    breaker.record_failure(Exception("No data found, symbol may be delisted"))
+
+    assert breaker.state == CLOSED
+
+
+def test_empty_bulk_download_counts_as_an_upstream_failure(service, upstream):
+    # yfinance swallows per-ticker errors and returns columns of NaN
+    download = upstream.download
+    upstream.download = lambda *args, **kwargs: download(*args, **kwargs) * np.nan
+    symbols = service._service.get_catalogue_symbols()[:5]
+
+    fund_infos = asyncio.run(service.get_fund_infos(symbols))
+
+    assert upstream.calls["download"] == 1
+    stats = service._service._breaker.stats()
+    assert stats["window_calls"] == 1 and stats["error_rate"] == 1
+    assert "No closes returned" in stats["last_error"]
+    assert all(fund_infos[symbol] for symbol in symbols)  # Served from fallback data
@@ -0,0 +1,55 @@
+"""
+Response compression: large bodies are compressed off the event loop
+"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app import responses
+from app.config import COMPRESS_MIN_BYTES, COMPRESS_THREAD_MIN_BYTES
+from app.responses import CompressionMiddleware
+
+
+@pytest.fixture
+def compress_threads(monkeypatch):
+    """Names of the threads each compression ran on"""
+    threads = []
+    compress = responses.compress
+
+    def recording_compress(body, encoding):
+        threads.append(threading.current_thread().name)
+        return compress(body, encoding)
+
+    monkeypatch.setattr(responses, "compress", recording_compress)
+    return threads
+
+
+def json_app(body: bytes):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+def get(app) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/", headers={"Accept-Encoding": "gzip"})
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size, off_loop", [
+    (COMPRESS_MIN_BYTES, False),
+    (COMPRESS_THREAD_MIN_BYTES, True),
+])
+def test_middleware_compresses_large_bodies_on_a_thread(compress_threads, size, off_loop):
+    body = b"[" + b"1," * (size // 2) + b"1]"
+    response = get(CompressionMiddleware(json_app(body)))
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == body  # Decoded by httpx
+    assert (compress_threads[0] != threading.main_thread().name) == off_loop
@@ -0,0 +1,25 @@
+"""
+Persistent NAV history: symbols with no data upstream are checked once, not on every request
+"""
+import asyncio
+
+import pandas as pd
+
+DELISTED = "0P0000DEAD.BO"
+
+
+def test_delisted_symbol_is_not_refetched(service, upstream):
+    make_history = upstream.make_history
+    upstream.make_history = lambda symbol, period="1y", start=None: (
+        pd.DataFrame() if symbol == DELISTED else make_history(symbol, period, start))
+
+    async def run():
+        first = await service.get_history_columns(DELISTED, "1y")
+        service._service._history.clear()
+        second = await service.get_history_columns(DELISTED, "1y")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert not (first or {}).get("dates") and not (second or {}).get("dates")
+    assert upstream.calls["history"] == 1
+    assert service._service._store.fetch_plan(DELISTED) is None
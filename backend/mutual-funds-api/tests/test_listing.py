@@ -0,0 +1,43 @@
+"""
+Fund listings: sorted by a quote field once, then paged from the held order;
+metadata bulk quotes lack is filled in by the catalogue refresh
+"""
+import asyncio
+
+
+def test_quote_order_is_reused_across_pages(service, upstream, monkeypatch):
+    funds = service._service
+    symbols = funds.get_catalogue_symbols()
+    for rank, symbol in enumerate(symbols):
+        funds._quotes.set(symbol, {"symbol": symbol, "nav": float(rank)})
+
+    peeks = []
+    peek = funds._quotes.peek
+    monkeypatch.setattr(funds._quotes, "peek", lambda symbol: peeks.append(symbol) or peek(symbol))
+
+    first = asyncio.run(service.list_funds(sort="nav", offset=0, limit=5))
+    second = asyncio.run(service.list_funds(sort="nav", offset=5, limit=5))
+    assert len(peeks) == len(symbols)
+    assert [fund["symbol"] for fund in first["funds"]] == symbols[::-1][:5]
+    assert [fund["symbol"] for fund in second["funds"]] == symbols[::-1][5:10]
+
+
+def test_quote_order_is_held_per_direction(service, upstream):
+    funds = service._service
+    order = funds._listing_symbols(sort="nav")
+    assert funds._listing_symbols(sort="nav") is order
+    assert funds._listing_symbols(sort="nav", descending=False) is not order
+
+
+def test_catalogue_refresh_fills_in_listing_metadata(service, upstream):
+    symbols = service._service.get_catalogue_symbols()
+
+    asyncio.run(service.refresh_catalogue(metadata_batch=3))
+    assert upstream.calls["info"] == 3
+    listed = asyncio.run(service.list_funds(limit=len(symbols)))["funds"]
+    assert [fund["expense_ratio"] for fund in listed[:3]] == [0.0075] * 3
+    assert all(fund["expense_ratio"] is None for fund in listed[3:])
+
+    # The next pass moves on to funds whose metadata is still missing
+    asyncio.run(service.refresh_catalogue(metadata_batch=3))
+    assert upstream.calls["info"] == 6
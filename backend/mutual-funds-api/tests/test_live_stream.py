@@ -0,0 +1,170 @@
+"""
+Live NAV stream: one refresh serves every subscriber
+"""
+import asyncio
+
+import pytest
+
+from app.services.async_fund_service import AsyncMutualFundService
+from app.services.cache import SharedCache, TieredCache, TTLCache, build_default_caches, flush_shared_writes
+from app.services.fund_service import MutualFundService
+from app.services.live import NavStream, StreamCoordinator, StreamFullError
+from app.services.rate_limiter import BACKGROUND, upstream_priority
+from tests.helpers import fresh_history_store
+
+SUBSCRIBERS = 50
+INTERVAL = 0.2
+
+
+@pytest.fixture
+def moving_upstream(upstream):
+    # Every bulk download moves every NAV, so every refresh is a change to fan out
+    make_history = upstream.make_history
+    upstream.make_history = lambda symbol, period="1y", start=None: make_history(symbol, period, start) * (
+        1 + 0.001 * upstream.calls["download"])
+    return upstream
+
+
+def test_one_refresh_fans_out_to_every_subscriber(service, moving_upstream):
+    symbols = service._service.get_catalogue_symbols()[:3]
+
+    async def run():
+        stream = NavStream(service, interval=INTERVAL, max_subscribers=SUBSCRIBERS, max_lag=10)
+        subscriptions = [stream.subscribe(symbols) for _ in range(SUBSCRIBERS)]
+        received = [{symbol: 0 for symbol in symbols} for _ in subscriptions]
+
+        async def consume(subscription, counts):
+            while not subscription.closed:
+                for quote in await subscription.next(1.0):
+                    counts[quote["symbol"]] += 1
+
+        consumers = [asyncio.ensure_future(consume(s, counts)) for s, counts in zip(subscriptions, received)]
+        while stream.refreshes < 1:
+            await asyncio.sleep(INTERVAL / 10)
+        calls = moving_upstream.calls["download"]
+        while stream.refreshes < 4:
+            await asyncio.sleep(INTERVAL / 10)
+        refresh_calls = moving_upstream.calls["download"] - calls
+        await asyncio.sleep(INTERVAL / 2)  # Let consumers read the last refresh
+        refreshes = stream.refreshes
+        await stream.stop()
+        await asyncio.gather(*consumers)
+        return refreshes, refresh_calls, received, stream
+
+    refreshes, refresh_calls, received, stream = asyncio.run(run())
+    # One bulk call per refresh for all three symbols, however many subscribers follow them
+    assert refresh_calls == 3
+    # The first quote, then one change per refresh
+    assert all(count == refreshes + 1 for counts in received for count in counts.values())
+    assert stream.updates == SUBSCRIBERS * len(symbols) * (refreshes + 1)
+    assert not stream.running
+
+
+def test_refresh_loop_stops_with_the_last_subscriber(service, upstream):
+    symbol = service._service.get_catalogue_symbols()[0]
+
+    async def run():
+        stream = NavStream(service, interval=INTERVAL)
+        subscription = stream.subscribe([symbol])
+        quotes = await subscription.next(5.0)
+        stream.unsubscribe(subscription)
+        await asyncio.sleep(INTERVAL / 10)
+        return quotes, subscription, stream
+
+    quotes, subscription, stream = asyncio.run(run())
+    assert [quote["symbol"] for quote in quotes] == [symbol]
+    assert subscription.closed and not stream.running
+
+
+def test_subscriber_limit(service, upstream):
+    symbol = service._service.get_catalogue_symbols()[0]
+
+    async def run():
+        stream = NavStream(service, interval=INTERVAL, max_subscribers=1)
+        stream.subscribe([symbol])
+        try:
+            with pytest.raises(StreamFullError):
+                stream.subscribe([symbol])
+        finally:
+            await stream.stop()
+
+    asyncio.run(run())
+
+
+def test_refresh_loop_fetches_at_background_priority(service, upstream):
+    symbol = service._service.get_catalogue_symbols()[0]
+    priorities = []
+    get_fund_infos = service.get_fund_infos
+
+    async def recording_get_fund_infos(*args, **kwargs):
+        priorities.append(upstream_priority.get())
+        return await get_fund_infos(*args, **kwargs)
+
+    service.get_fund_infos = recording_get_fund_infos
+
+    async def run():
+        stream = NavStream(service, interval=INTERVAL)
+        subscription = stream.subscribe([symbol])
+        await subscription.next(5.0)
+        await stream.stop()
+
+    asyncio.run(run())
+    assert priorities == [BACKGROUND]
+
+
+def test_one_worker_refreshes_for_all(tmp_path):
+    first = StreamCoordinator(str(tmp_path), INTERVAL, worker="first")
+    second = StreamCoordinator(str(tmp_path), INTERVAL, worker="second")
+    assert first.check_in(["A", "B"]) == ["A", "B"]
+    assert second.check_in(["B", "C"]) is None
+    assert first.check_in(["A", "B"]) == ["A", "B", "C"]
+
+    first.leave()
+    assert second.check_in(["B", "C"]) == ["B", "C"]
+    assert second.leading and not first.leading
+    second.leave()
+
+
+def test_follower_reads_quotes_from_the_shared_tier(tmp_path, moving_upstream):
+    def worker():
+        # Each service stands in for a worker process; the quotes tier is shared through one database
+        caches = build_default_caches()
+        shared = SharedCache("quotes", str(tmp_path / "shared.sqlite3"), 60)
+        caches["quotes"] = TieredCache(TTLCache("quotes", 60), shared)
+        return AsyncMutualFundService(MutualFundService(caches=caches, history_store=fresh_history_store()))
+
+    leader_service, follower_service = worker(), worker()
+    symbols = leader_service._service.get_catalogue_symbols()[:3]
+    coordination = str(tmp_path / "nav_stream")
+
+    async def run():
+        leader = NavStream(leader_service, interval=INTERVAL,
+                           coordinator=StreamCoordinator(coordination, INTERVAL, worker="leader"))
+        follower = NavStream(follower_service, interval=INTERVAL,
+                             coordinator=StreamCoordinator(coordination, INTERVAL, worker="follower"))
+        leader.subscribe(symbols[:1])
+        await asyncio.sleep(INTERVAL / 2)  # The leader's first refresh comes before the follower's
+        subscription = follower.subscribe(symbols)
+        while follower.refreshes < 3:
+            await asyncio.sleep(INTERVAL / 10)
+        calls = moving_upstream.calls["download"]
+        while follower.refreshes < 5:
+            await asyncio.sleep(INTERVAL / 10)
+        refresh_calls = moving_upstream.calls["download"] - calls
+        quotes = await subscription.next(1.0)
+        stats = leader.stats(), follower.stats()
+        await follower.stop()
+        await leader.stop()
+        return refresh_calls, quotes, stats
+
+    try:
+        refresh_calls, quotes, (leader_stats, follower_stats) = asyncio.run(run())
+    finally:
+        flush_shared_writes()
+        leader_service.shutdown()
+        follower_service.shutdown()
+    assert leader_stats["refreshing_for_all"] and not follower_stats["refreshing_for_all"]
+    # Only the leader fetches, once per refresh, for the funds both workers follow
+    assert 1 <= refresh_calls <= 3
+    # Including the funds only the follower's subscribers follow
+    assert {quote["symbol"] for quote in quotes} == set(symbols)
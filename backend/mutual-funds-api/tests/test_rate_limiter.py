@@ -0,0 +1,88 @@
+"""
+Upstream token bucket: one budget shared by every worker process, interactive calls first
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from app.services.rate_limiter import (
+    BACKGROUND,
+    INTERACTIVE,
+    AsyncRateLimiter,
+    FileBucketState,
+    LocalBucketState,
+    TokenBucket,
+)
+from tests.helpers import take_tokens
+
+RATE = 20.0
+BURST = 5.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def bucket_path(tmp_path):
+    return str(tmp_path / "upstream_rate.bucket")
+
+
+def test_burst_then_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(RATE, BURST, LocalBucketState(), clock=clock)
+    assert [bucket.reserve() for _ in range(int(BURST))] == [(True, 0.0)] * int(BURST)
+    taken, delay = bucket.reserve()
+    assert taken and delay == pytest.approx(1 / RATE)
+    clock.now += 1.0
+    assert bucket.reserve() == (True, 0.0)
+
+
+def test_background_never_takes_a_reserved_token():
+    clock = FakeClock()
+    bucket = TokenBucket(RATE, 1, LocalBucketState(), clock=clock)
+    assert bucket.reserve(INTERACTIVE) == (True, 0.0)
+    taken, delay = bucket.reserve(INTERACTIVE)  # Waits for the next token, leaving the bucket in debt
+    assert taken and delay == pytest.approx(1 / RATE)
+    taken, retry = bucket.reserve(BACKGROUND)
+    assert not taken and retry == pytest.approx(2 / RATE)
+
+
+def test_buckets_on_one_file_share_a_budget(bucket_path):
+    clock = FakeClock()
+    buckets = [TokenBucket(RATE, BURST, FileBucketState(bucket_path), clock=clock) for _ in range(4)]
+    free = [bucket.reserve()[1] == 0.0 for _ in range(3) for bucket in buckets]
+    assert sum(free) == BURST
+
+
+def test_worker_processes_stay_within_rate_and_burst(bucket_path):
+    workers, duration = 4, 1.5
+    results = multiprocessing.Queue()
+    start = time.time() + 0.5  # Let every worker start before the clock runs
+    processes = [
+        multiprocessing.Process(target=take_tokens, args=(bucket_path, RATE, BURST, start, duration, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    calls = [call for _ in processes for call in results.get(timeout=30)]
+    for process in processes:
+        process.join()
+    # One extra call for the token due exactly at the deadline
+    assert len(calls) <= RATE * duration + BURST + 1
+    assert len(calls) >= RATE * duration * 0.8
+
+
+def test_async_limiter_reserves_file_tokens_off_the_event_loop(bucket_path):
+    limiter = AsyncRateLimiter(TokenBucket(RATE, 1, FileBucketState(bucket_path)))
+    waits = asyncio.run(limiter.acquire()), asyncio.run(limiter.acquire())
+    assert waits[0] == 0.0 and waits[1] > 0.0
+    assert limiter._executor is not None
+    assert AsyncRateLimiter(TokenBucket(RATE, 1, LocalBucketState()))._executor is None
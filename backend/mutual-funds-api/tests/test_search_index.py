@@ -0,0 +1,35 @@
+"""
+Fund search ranking: tokens matched, then match quality, then shorter name
+"""
+from app.services.search_index import SearchIndex
+
+
+def symbols(index: SearchIndex, query: str, limit=20):
+    return [result["symbol"] for result in index.search(query, limit)]
+
+
+def test_more_tokens_matched_ranks_first():
+    index = SearchIndex({
+        "A": {"name": "Alpha Growth Fund"},
+        "B": {"name": "Alpha Bluechip Growth Fund Direct Plan"},
+    })
+    assert symbols(index, "bluechip growth") == ["B", "A"]
+
+
+def test_exact_match_outranks_shorter_prefix_match():
+    index = SearchIndex({
+        "LONG": {"name": "Growth " + "Long Name " * 80},
+        "SHORT": {"name": "Growthy Fund"},
+    })
+    assert symbols(index, "growth") == ["LONG", "SHORT"]
+    assert symbols(index, "growth", limit=1) == ["LONG"]
+
+
+def test_shorter_name_breaks_ties_at_the_limit():
+    index = SearchIndex({
+        "A": {"name": "Index Fund Regular Plan"},
+        "B": {"name": "Index Fund"},
+        "C": {"name": "Index Fund Direct"},
+    })
+    assert symbols(index, "index", limit=2) == ["B", "C"]
+    assert symbols(index, "nothing") == []
@@ -0,0 +1,33 @@
+"""
+Shared cache tier: JSON rows, and expired rows kept while they may be served stale
+"""
+import time
+
+from app.services.cache import CacheEntry, SharedCache
+
+
+def test_values_round_trip_as_json(tmp_path):
+    cache = SharedCache("quotes", str(tmp_path / "shared.sqlite3"), ttl=60)
+    value = {"symbol": "0P0000XVHO.BO", "nav": 101.25, "history": {"dates": ["2024-01-01"], "nav": [100.0]}}
+    cache.set(("0P0000XVHO.BO", "1y"), value)
+    assert cache.get(("0P0000XVHO.BO", "1y")) == value
+
+
+def test_undecodable_row_reads_as_a_miss(tmp_path):
+    cache = SharedCache("quotes", str(tmp_path / "shared.sqlite3"), ttl=60)
+    cache._execute(
+        "INSERT INTO cache_entries (cache, key, value, expires_at) VALUES (?, ?, ?, ?)",
+        ("quotes", repr("fund"), b"\x80\x05not json", time.time() + 60),
+    )
+    assert cache.get("fund") is None
+    assert cache.errors == 1
+
+
+def test_prune_keeps_rows_within_stale_retention(tmp_path):
+    cache = SharedCache("quotes", str(tmp_path / "shared.sqlite3"), ttl=60, stale_retention=3600)
+    cache.set_entry("stale", CacheEntry({"nav": 1.0}, time.time() - 600))
+    cache.set_entry("gone", CacheEntry({"nav": 2.0}, time.time() - 7200))
+    for i in range(SharedCache._PRUNE_EVERY):
+        cache.set(f"fund-{i}", {"nav": float(i)})
+    assert cache.get_stale("stale", max_stale=3600) == {"nav": 1.0}
+    assert cache.get_stale("gone") is None
@@ -0,0 +1,82 @@
+"""
+Single-flight: concurrent cache misses share one upstream call
+"""
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+CLIENTS = 50
+SYMBOL = "0P0000XVHO.BO"
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    started = 0
+
+    async def fetch():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.01)
+        return {"nav": 1.0}
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(CLIENTS)))
+
+    results = asyncio.run(run())
+    assert started == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"in_flight": 0, "calls": 1, "coalesced": CLIENTS - 1}
+
+
+def test_error_is_shared_then_retried():
+    flight = SingleFlight()
+    attempts = 0
+
+    async def fetch():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        if attempts == 1:
+            raise RuntimeError("upstream down")
+        return attempts
+
+    async def run():
+        first = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)), return_exceptions=True)
+        return first, await flight.do("key", fetch)
+
+    first, retried = asyncio.run(run())
+    assert all(isinstance(error, RuntimeError) for error in first)
+    assert retried == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        leaver = asyncio.ensure_future(flight.do("key", fetch))
+        stayer = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        leaver.cancel()
+        return await stayer
+
+    assert asyncio.run(run()) == "done"
+
+
+@pytest.mark.parametrize("fetch, expected", [
+    (lambda service: service.get_fund_info(SYMBOL), {"info": 1}),
+    (lambda service: service.get_history_columns(SYMBOL, "1y"), {"history": 1}),
+    (lambda service: service.get_fund_detail_parts(SYMBOL, "6mo"), {"info": 1, "history": 1}),
+])
+def test_concurrent_misses_make_one_upstream_call(service, upstream, fetch, expected):
+    async def run():
+        return await asyncio.gather(*(fetch(service) for _ in range(CLIENTS)))
+
+    results = asyncio.run(run())
+    assert all(result is not None for result in results)
+    assert dict(upstream.calls) == expected